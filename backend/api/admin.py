@@ -1,11 +1,13 @@
 from django.contrib import admin
 from .submodels.models_employee import *
 from .submodels.models_timesheet import *
+from .submodels.models_payroll import *
 
 # Register your models here.
 admin.site.register(Department)
 admin.site.register(Position)
 admin.site.register(Employee)
+admin.site.register(UserAuthVersion)
 admin.site.register(WorkingShift)
 admin.site.register(TimeSheet)
 admin.site.register(OvertimeRequest)
@@ -13,3 +15,7 @@ admin.site.register(LeaveRequest)
 admin.site.register(LeaveBalance)
 admin.site.register(SalaryRecord)
 admin.site.register(EmployeeEvaluation)
+admin.site.register(PayrollRun)
+admin.site.register(PayrollDirtyEmployee)
+admin.site.register(MonthlyAttendance)
+admin.site.register(AttendanceImport)
@@ -8,3 +8,5 @@ class ApiConfig(AppConfig):
     def ready(self):
         import api.employee.signals
         import api.salary.signals
+        import api.timesheet.signals
+        import api.login.signals
@@ -0,0 +1,129 @@
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .submodels.models_employee import Employee, UserAuthVersion
+
+
+def get_auth_version(user_id):
+    # User chưa từng bị revoke thì chưa có dòng UserAuthVersion, coi như version 0
+    version = UserAuthVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first()
+    return version or 0
+
+def revoke_user_tokens(user_ids):
+    """
+    Bump the stored auth version of each user, so access tokens carrying
+    old groups or employee claims are rejected by every worker and the
+    client has to refresh them.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    UserAuthVersion.objects.bulk_create(
+        [UserAuthVersion(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+    UserAuthVersion.objects.filter(user_id__in=user_ids).update(version=F('version') + 1)
+
+def add_user_claims(token, user, groups=None):
+    """
+    Put the user's group names, employee pk and department id on the token
+    so permissions and views can read them without querying the DB.
+    """
+    if groups is None:
+        groups = list(user.groups.values_list('name', flat=True))
+    employee = Employee.objects.filter(user=user).values('id', 'department_id').first()
+    token['groups'] = groups
+    token['employee_id'] = employee['id'] if employee else None
+    token['department_id'] = employee['department_id'] if employee else None
+    token['auth_version'] = get_auth_version(user.id)
+    return token
+
+def get_tokens_for_user(user, groups=None):
+    refresh = RefreshToken.for_user(user)
+    add_user_claims(refresh, user, groups)
+    return refresh
+
+def get_token_claim(request, name):
+    # None khi request không có token mang claim (vd. token cũ, force_authenticate)
+    token = request.auth
+    if token is None or not hasattr(token, 'payload'):
+        return None
+    return token.payload.get(name)
+
+def get_request_employee(request):
+    """
+    Employee profile of the authenticated user with department and position
+    selected, looked up by the employee_id claim when the token carries it.
+    """
+    employee_id = get_token_claim(request, 'employee_id')
+    employees = Employee.objects.select_related('department', 'position')
+    if employee_id is not None:
+        employee = employees.get(id=employee_id)
+    else:
+        employee = employees.get(user=request.user)
+    # Dùng lại user đã xác thực, tránh thêm một truy vấn khi cần employee.user
+    if employee.user_id == request.user.id:
+        employee.user = request.user
+    return employee
+
+def get_request_employee_id(request):
+    employee_id = get_token_claim(request, 'employee_id')
+    if employee_id is None:
+        employee = request.employee if hasattr(request, 'employee') else get_request_employee(request)
+        employee_id = employee.id
+    return employee_id
+
+
+class EmployeeRequestMixin:
+    """
+    View mixin exposing request.employee: loaded on first access and at
+    most once per request, then shared by the view and its serializers.
+    """
+    def initial(self, request, *args, **kwargs):
+        request.employee = SimpleLazyObject(lambda: get_request_employee(request))
+        super().initial(request, *args, **kwargs)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that rejects tokens whose auth_version claim is older
+    than the user's current version, so role or employee changes take
+    effect before the access token expires. The version is stored in the
+    DB and read in the same query as the user.
+    """
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is None:
+            return None
+        user, token = result
+        auth_version = token.payload.get('auth_version')
+        if auth_version is not None and auth_version != user.current_auth_version:
+            raise AuthenticationFailed('Token has been revoked, please refresh it.', code='token_revoked')
+        return user, token
+
+    def get_user(self, validated_token):
+        # Như JWTAuthentication.get_user, thêm LEFT JOIN lấy auth version trong cùng truy vấn
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as error:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from error
+
+        try:
+            user = self.user_model.objects.annotate(
+                current_auth_version=Coalesce('auth_version__version', Value(0))
+            ).get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as error:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from error
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
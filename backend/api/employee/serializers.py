@@ -94,7 +94,7 @@ class UpdateEmployeeProfileSerializer(serializers.ModelSerializer):
             gender = self.validated_data['gender']
             address = self.validated_data['address']
             phone_number = self.validated_data['phone_number']
-            profile = Employee.objects.get(user=request.user)
+            profile = request.employee
             user = request.user
             profile.full_name = full_name
             profile.date_of_birth = date_of_birth
@@ -169,7 +169,7 @@ class UploadEmployeeAvatarSerializer(serializers.ModelSerializer):
     def update_avatar(self, request):
         try:
             avatar = self.validated_data['avatar']
-            profile = Employee.objects.get(user=request.user)
+            profile = request.employee
             profile.avatar = avatar
             profile.save()
             return profile
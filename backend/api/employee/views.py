@@ -8,6 +8,7 @@ from django.contrib.auth.models import User
 from ..submodels.models_employee import Department, Position, Employee
 from .serializers import *
 from ..permissions import IsManager, IsEmployee
+from ..authentication import EmployeeRequestMixin
 
 
 class EmployeeListPagination(PageNumberPagination):
@@ -68,7 +69,7 @@ class EmployeeAccountMVS(viewsets.ModelViewSet):
             print("create_employee_account_error:", error)
             return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-class UpdateEmployeeProfileView(APIView):
+class UpdateEmployeeProfileView(EmployeeRequestMixin, APIView):
     serializer_class = UpdateEmployeeProfileSerializer
     permission_classes = [IsAuthenticated, IsEmployee]
 
@@ -83,19 +84,19 @@ class UpdateEmployeeProfileView(APIView):
             print("update_employee_profile_error:", error)
             return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-class EmployeeProfileView(APIView):
+class EmployeeProfileView(EmployeeRequestMixin, APIView):
     serializer_class = EmployeeProfileSerializer
     permission_classes = [IsAuthenticated, IsEmployee]
 
     def get(self, request):
         try:
-            profile = Employee.objects.get(user=request.user)
+            profile = request.employee
             serializer = self.serializer_class(profile, context={'request': request})
             return Response(serializer.data)
         except Employee.DoesNotExist:
             return Response({"error": "Employee not found."}, status=status.HTTP_404_NOT_FOUND)
 
-class UploadEmployeeAvatarView(APIView):
+class UploadEmployeeAvatarView(EmployeeRequestMixin, APIView):
     serializer_class = UploadEmployeeAvatarSerializer
     permission_classes = [IsAuthenticated, IsEmployee]
 
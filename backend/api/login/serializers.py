@@ -3,6 +3,9 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.utils import timezone
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from ..authentication import add_user_claims
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -75,3 +78,17 @@ class ChangePasswordSerializer(serializers.Serializer):
         user.set_password(new_password)
         user.save()
         return user
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # Cấp access token mới với claim lấy lại từ DB, không sao chép claim cũ của refresh token
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(
+            id=refresh[api_settings.USER_ID_CLAIM],
+            is_active=True
+        ).first()
+        if not user:
+            raise AuthenticationFailed('User not found or inactive.')
+        access = refresh.access_token
+        add_user_claims(access, user)
+        return {'access': str(access)}
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from ..submodels.models_employee import Employee
+from ..authentication import revoke_user_tokens
+
+@receiver(m2m_changed, sender=User.groups.through)
+def revoke_tokens_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            revoke_user_tokens([instance.pk])
+    elif action in ['post_add', 'post_remove']:
+        revoke_user_tokens(pk_set or [])
+    elif action == 'pre_clear':
+        # Sau khi clear không còn biết user nào thuộc group nên revoke trước
+        revoke_user_tokens(instance.user_set.values_list('id', flat=True))
+
+@receiver(pre_save, sender=Employee)
+def detect_employee_claims_change(sender, instance, **kwargs):
+    instance._claims_changed = False
+    if not instance.pk:
+        return
+    previous = Employee.objects.filter(pk=instance.pk).values('user_id', 'department_id').first()
+    if previous and (previous['user_id'] != instance.user_id or previous['department_id'] != instance.department_id):
+        instance._claims_changed = previous['user_id']
+
+@receiver(post_save, sender=Employee)
+def revoke_tokens_on_employee_change(sender, instance, created, **kwargs):
+    # Token lưu employee_id/department_id, cần cấp lại khi hồ sơ được tạo hoặc đổi phòng ban
+    if created:
+        revoke_user_tokens([instance.user_id])
+    elif instance._claims_changed:
+        revoke_user_tokens([instance.user_id, instance._claims_changed])
+
+@receiver(post_delete, sender=Employee)
+def revoke_tokens_on_employee_delete(sender, instance, origin=None, **kwargs):
+    # Xóa user kéo theo xóa employee: user không còn nên token đã vô hiệu, không ghi version mới
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    revoke_user_tokens([instance.user_id])
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_user_deactivate(sender, instance, created, **kwargs):
+    if not created and not instance.is_active:
+        revoke_user_tokens([instance.pk])
@@ -4,9 +4,9 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView
-from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.contrib.auth.models import User, Group
 from .serializers import *
+from ..authentication import get_tokens_for_user
 
 
 class RegisterView(APIView):
@@ -18,7 +18,7 @@ class RegisterView(APIView):
             if serializer.is_valid():
                 user = serializer.save(request=request) 
 
-                refresh = RefreshToken.for_user(user)
+                refresh = get_tokens_for_user(user)
                 
                 tokens = {
                     'refresh': str(refresh),
@@ -44,7 +44,8 @@ class LoginView(APIView):
                 _groups = []
                 for g in groups:
                     _groups.append(g.name)
-                refresh = RefreshToken.for_user(user)
+                # Access token mang theo group, employee, department để không phải truy vấn ở mỗi request
+                refresh = get_tokens_for_user(user, _groups)
                 return Response(
                     {
                         'refresh': str(refresh),
@@ -75,7 +76,7 @@ class ChangePasswordView(APIView):
             return Response({"message": "An error occurred on the server.", "details": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
 class CustomTokenRefreshView(TokenRefreshView):
-    serializer_class = TokenRefreshSerializer
+    serializer_class = CustomTokenRefreshSerializer
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.salary.payroll import months_between
+from api.shifts import get_shift_by_id, get_timesheet_minutes
+from api.submodels.models_timesheet import TimeSheet
+from api.timesheet.counters import rebuild_monthly_attendance, get_month_range
+from .run_payroll import parse_month
+
+
+MINUTE_FIELDS = ['worked_minutes', 'late_minutes', 'early_minutes']
+
+
+class Command(BaseCommand):
+    help = 'Fill TimeSheet worked, late and early minutes from check-in/out times, then rebuild attendance counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='from_month',
+            help='First month to backfill (YYYY-MM). Defaults to the current month.'
+        )
+        parser.add_argument(
+            '--to',
+            dest='to_month',
+            help='Last month to backfill (YYYY-MM). Defaults to --from.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows read and written per bulk_update.'
+        )
+
+    def handle(self, *args, **options):
+        current_date = timezone.localtime(timezone.now()).date()
+        from_date = parse_month(options['from_month']) if options['from_month'] else current_date.replace(day=1)
+        to_date = parse_month(options['to_month']) if options['to_month'] else from_date
+        if to_date < from_date:
+            raise CommandError("--to cannot be before --from.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        for month, year in months_between(from_date, to_date):
+            with transaction.atomic():
+                updated_count = self.backfill_month(month, year, options['batch_size'])
+                rebuild_monthly_attendance(month, year)
+            self.stdout.write(f"Updated {updated_count} timesheets for {month}/{year}.")
+
+    def backfill_month(self, month, year, batch_size):
+        timesheets = TimeSheet.objects.filter(date__range=get_month_range(month, year)).only(
+            'id', 'shift_id', 'check_in_time', 'check_out_time', *MINUTE_FIELDS
+        )
+        changed, updated_count = [], 0
+        for timesheet in timesheets.iterator(chunk_size=batch_size):
+            shift = get_shift_by_id(timesheet.shift_id) if timesheet.shift_id else None
+            minutes = get_timesheet_minutes(shift, timesheet.check_in_time, timesheet.check_out_time)
+            if all(getattr(timesheet, field) == value for field, value in minutes.items()):
+                continue
+            for field, value in minutes.items():
+                setattr(timesheet, field, value)
+            changed.append(timesheet)
+            if len(changed) >= batch_size:
+                TimeSheet.objects.bulk_update(changed, MINUTE_FIELDS)
+                updated_count += len(changed)
+                changed = []
+        if changed:
+            TimeSheet.objects.bulk_update(changed, MINUTE_FIELDS)
+            updated_count += len(changed)
+        return updated_count
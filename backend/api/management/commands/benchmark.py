@@ -0,0 +1,312 @@
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from unittest import mock
+from decimal import Decimal
+from dateutil.rrule import rrule, DAILY
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from api.submodels.models_employee import Employee, Position
+from api.submodels.models_timesheet import SalaryRecord, EmployeeEvaluation
+from api.salary.serializers import calculate_monthly_salaries
+from api.workdays import batch_count_leave_days
+from api.authentication import get_tokens_for_user
+from api.submodels.models_timesheet import TimeSheet, MonthlyAttendance
+from api.submodels.models_payroll import PayrollDirtyEmployee
+from api.timesheet.counters import get_month_range
+from api.timesheet.journal import CHECK_IN_INGESTION_SYNC, CHECK_IN_INGESTION_BUFFERED, flush_check_in_journal
+from api.timesheet.attendance_import import import_attendance_logs
+
+
+# Thứ hai xa trong tương lai, không trùng dữ liệu thật
+CHECK_IN_BENCHMARK_DATE = date(2100, 1, 4)
+SALARY_RECORD_RESULT_FIELDS = ['base_salary', 'overtime_pay', 'attendance_bonus', 'other_bonus', 'gross_salary', 'note']
+
+
+def build_synthetic_payroll_inputs(size, is_year_end, seed=0):
+    # Dữ liệu giả lập trong bộ nhớ, không cần DB
+    rng = random.Random(seed)
+    positions = [
+        Position(
+            id=index,
+            salary_base=Decimal(rng.randint(2000000, 9000000)).scaleb(-2),
+            salary_insufficient_work=Decimal(rng.randint(1500000, 8000000)).scaleb(-2),
+            salary_overtime=Decimal(rng.randint(3000000, 12000000)).scaleb(-2),
+            attendance_bonus=Decimal(rng.randint(20000000, 90000000)).scaleb(-2)
+        )
+        for index in range(1, 11)
+    ]
+    timesheet_summary = []
+    salary_records = {}
+    employee_evaluations = {}
+    leave_days = {}
+    used_leaves = {}
+    for employee_id in range(1, size + 1):
+        employee = Employee(id=employee_id, position=rng.choice(positions))
+        timesheet_summary.append({
+            'employee': employee_id,
+            'total_regular_minutes': Decimal(rng.randint(150 * 6000, 215 * 6000)).scaleb(-2),
+            'total_overtime_hours': Decimal(rng.randint(0, 3000)).scaleb(-2),
+        })
+        salary_records[employee_id] = SalaryRecord(employee=employee, month=12, year=2024)
+        employee_evaluations[employee_id] = EmployeeEvaluation(employee_id=employee_id, month=12, year=2024)
+        if rng.random() < 0.3:
+            leave_days[employee_id] = rng.randint(1, 12) / 2
+        used_leaves[employee_id] = rng.randint(0, 10)
+    return {
+        'end_of_period': None,
+        'timesheet_summary': timesheet_summary,
+        'salary_records': salary_records,
+        'employee_evaluations': employee_evaluations,
+        'leave_days': leave_days,
+        'used_leaves': used_leaves,
+        'is_year_end': is_year_end,
+    }
+
+def rrule_count_leave_days(intervals, start_of_month, end_of_month):
+    # Cách đếm cũ: duyệt từng ngày bằng rrule
+    leave_days = {}
+    for employee_id, from_date, to_date in intervals:
+        weekdays_count = 0
+        saturday_count = 0
+        for single_date in rrule(DAILY, dtstart=max(from_date, start_of_month), until=min(to_date, end_of_month)):
+            weekday = single_date.weekday()
+            if weekday == 6:
+                continue
+            elif weekday == 5:
+                saturday_count += 1
+            else:
+                weekdays_count += 1
+        leave_days[employee_id] = leave_days.get(employee_id, 0) + weekdays_count + saturday_count / 2
+    return leave_days
+
+def remove_month_rows(month, year):
+    # Dọn dữ liệu do benchmark ghi thật (không rollback được khi chạy nhiều thread)
+    start_of_month, end_of_month = get_month_range(month, year)
+    TimeSheet.objects.filter(date__range=(start_of_month, end_of_month)).delete()
+    for model in (MonthlyAttendance, SalaryRecord, EmployeeEvaluation, PayrollDirtyEmployee):
+        model.objects.filter(month=month, year=year).delete()
+
+def payroll_results(salary_records, employee_evaluations):
+    return [
+        [getattr(salary_record, field) for field in SALARY_RECORD_RESULT_FIELDS] + [employee_evaluation.content]
+        for salary_record, employee_evaluation in zip(salary_records, employee_evaluations)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'target',
+            choices=['payroll_engines', 'workdays', 'daily_timesheet', 'check_in', 'attendance_import'],
+            help='What to benchmark.'
+        )
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Problem sizes to benchmark (employees, leave intervals or log rows).'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Concurrent clients for endpoint benchmarks.'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=400,
+            help='Total requests for endpoint benchmarks.'
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"benchmark_{options['target']}")(options)
+
+    def benchmark_payroll_engines(self, options):
+        from api.salary.vectorized import calculate_monthly_salaries_vectorized
+
+        self.stdout.write(f"{'employees':>10} {'decimal (s)':>12} {'numpy (s)':>10} {'speedup':>8}  match")
+        for size in options['sizes']:
+            timings = {}
+            results = {}
+            for name, calculate in [
+                ('decimal', calculate_monthly_salaries),
+                ('numpy', calculate_monthly_salaries_vectorized),
+            ]:
+                payroll_inputs = build_synthetic_payroll_inputs(size, is_year_end=True)
+                started = time.perf_counter()
+                salary_records, employee_evaluations = calculate(payroll_inputs)
+                timings[name] = time.perf_counter() - started
+                results[name] = payroll_results(salary_records, employee_evaluations)
+
+            self.stdout.write(
+                f"{size:>10} {timings['decimal']:>12.3f} {timings['numpy']:>10.3f} "
+                f"{timings['decimal'] / timings['numpy']:>7.1f}x  {results['decimal'] == results['numpy']}"
+            )
+
+    def benchmark_workdays(self, options):
+        # Đơn nghỉ dài nhiều tháng, tính trong khoảng 1 năm
+        rng = random.Random(0)
+        start_of_period = date(2024, 1, 1)
+        end_of_period = date(2024, 12, 31)
+        self.stdout.write(f"{'intervals':>10} {'rrule (s)':>10} {'closed-form (s)':>16} {'speedup':>8}  match")
+        for size in options['sizes']:
+            intervals = []
+            for employee_id in range(size):
+                from_date = start_of_period + timedelta(days=rng.randint(0, 300))
+                intervals.append((employee_id, from_date, from_date + timedelta(days=rng.randint(30, 180))))
+
+            started = time.perf_counter()
+            expected = rrule_count_leave_days(intervals, start_of_period, end_of_period)
+            rrule_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            actual = batch_count_leave_days(intervals, start_of_period, end_of_period)
+            closed_form_seconds = time.perf_counter() - started
+
+            self.stdout.write(
+                f"{size:>10} {rrule_seconds:>10.3f} {closed_form_seconds:>16.3f} "
+                f"{rrule_seconds / closed_form_seconds:>7.1f}x  {expected == actual}"
+            )
+
+    def benchmark_daily_timesheet(self, options):
+        # Gọi endpoint trang chủ của nhân viên song song, dùng dữ liệu thật trong DB
+        users = list(User.objects.filter(employee_profile__is_active=True)[:options['concurrency']])
+        if not users:
+            raise CommandError("No active employee to benchmark with.")
+        url = '/api/timesheet/get_daily_timesheet_employee/'
+        # Dùng access token thật để đi qua đúng luồng xác thực bằng claim
+        access_tokens = [str(get_tokens_for_user(user).access_token) for user in users]
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_tokens[0]}")
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        self.stdout.write(f"queries per request: {len(queries)} (including authentication)")
+
+        def call(index):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_tokens[index % len(access_tokens)]}")
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f"Unexpected status {response.status_code}: {response.content[:200]}")
+            return elapsed
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            timings = sorted(executor.map(call, range(options['requests'])))
+        total_seconds = time.perf_counter() - started
+
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f"{options['requests']} requests, concurrency {options['concurrency']}: "
+            f"p50 {percentiles[49] * 1000:.1f} ms, p99 {percentiles[98] * 1000:.1f} ms, "
+            f"{options['requests'] / total_seconds:.0f} req/s"
+        )
+
+    def benchmark_check_in(self, options):
+        """
+        Morning check-in storm: every active employee checks in once through
+        the API from --concurrency threads, first with the synchronous path,
+        then buffered (journal + flush). Each thread has its own DB
+        connection, so the check-ins are committed on a Monday in 2100 and
+        removed afterwards.
+        """
+        users = list(User.objects.filter(employee_profile__is_active=True))
+        if not users:
+            raise CommandError("No active employee to benchmark with.")
+        access_tokens = [str(get_tokens_for_user(user).access_token) for user in users]
+        check_in_at = timezone.make_aware(datetime.combine(CHECK_IN_BENCHMARK_DATE, datetime.min.time()).replace(hour=8, minute=5))
+
+        def call(access_token):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+            started = time.perf_counter()
+            response = client.post('/api/timesheet/check_in/', {'shift_type': 'MORNING'}, format='json')
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f"Unexpected status {response.status_code}: {response.content[:200]}")
+            return elapsed
+
+        self.stdout.write(
+            f"{'mode':>10} {'check-ins':>10} {'threads':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} "
+            f"{'requests (s)':>13} {'req/s':>8} {'flush (s)':>10}"
+        )
+        for mode in [CHECK_IN_INGESTION_SYNC, CHECK_IN_INGESTION_BUFFERED]:
+            with tempfile.TemporaryDirectory() as journal_dir, \
+                    override_settings(CHECK_IN_INGESTION_MODE=mode, CHECK_IN_JOURNAL_DIR=journal_dir), \
+                    mock.patch('django.utils.timezone.now', return_value=check_in_at):
+                try:
+                    started = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                        timings = sorted(executor.map(call, access_tokens))
+                    request_seconds = time.perf_counter() - started
+
+                    started = time.perf_counter()
+                    if mode == CHECK_IN_INGESTION_BUFFERED:
+                        flush_check_in_journal()
+                    flush_seconds = time.perf_counter() - started
+                    created = TimeSheet.objects.filter(date=CHECK_IN_BENCHMARK_DATE, check_in_time__isnull=False).count()
+                finally:
+                    remove_month_rows(CHECK_IN_BENCHMARK_DATE.month, CHECK_IN_BENCHMARK_DATE.year)
+
+            percentiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+            self.stdout.write(
+                f"{mode:>10} {created:>10} {options['concurrency']:>8} {percentiles[49] * 1000:>9.1f} "
+                f"{percentiles[98] * 1000:>9.1f} {request_seconds:>13.3f} {len(timings) / request_seconds:>8.0f} "
+                f"{flush_seconds:>10.3f}"
+            )
+
+    def benchmark_attendance_import(self, options):
+        """
+        Import synthetic device logs of --sizes rows: four punches a day per
+        active employee (in and out of both shifts) over consecutive days.
+        Runs inside a rolled back transaction.
+        """
+        employee_codes = list(Employee.objects.filter(is_active=True, employee_id__isnull=False).values_list('employee_id', flat=True))
+        if not employee_codes:
+            raise CommandError("No active employee to benchmark with.")
+        punch_times = ['07:55:10', '11:58:40', '13:07:05', '17:02:30']
+        start_date = date(2000, 1, 3)
+
+        self.stdout.write(f"{'rows':>10} {'upserts':>10} {'rejected':>10} {'seconds':>10} {'rows/s':>10}")
+        for size in options['sizes']:
+            with tempfile.TemporaryFile('w+', newline='') as log_file:
+                log_file.write('employee_id,timestamp\n')
+                row_count, day = 0, 0
+                while row_count < size:
+                    single_date = start_date + timedelta(days=day)
+                    day += 1
+                    if single_date.weekday() >= 5:
+                        continue
+                    for employee_code in employee_codes:
+                        for punch_time in punch_times:
+                            if row_count < size:
+                                log_file.write(f"{employee_code},{single_date.isoformat()} {punch_time}\n")
+                                row_count += 1
+                log_file.seek(0)
+
+                with transaction.atomic():
+                    started = time.perf_counter()
+                    result = import_attendance_logs(log_file)
+                    seconds = time.perf_counter() - started
+                    transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{size:>10} {result['upserted_count']:>10} {result['reject_count']:>10} "
+                f"{seconds:>10.2f} {size / seconds:>10.0f}"
+            )
@@ -0,0 +1,128 @@
+import re
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api.authentication import get_tokens_for_user
+from api.submodels.models_employee import Employee
+from api.submodels.models_timesheet import (
+    TimeSheet, LeaveRequest, OvertimeRequest, SalaryRecord, EmployeeEvaluation, MonthlyAttendance
+)
+from api.salary.serializers import load_payroll_inputs
+from api.shifts import get_shifts, is_shift_day
+from api.timesheet.absences import find_unrecorded_shifts
+from api.timesheet.counters import rebuild_monthly_attendance
+
+
+# Các bảng lớn lên theo số nhân viên x số ngày, không được quét toàn bộ
+LARGE_TABLES = {
+    model._meta.db_table
+    for model in (Employee, TimeSheet, LeaveRequest, OvertimeRequest, SalaryRecord, EmployeeEvaluation, MonthlyAttendance)
+}
+EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+# Dòng quét toàn bảng trong kết quả EXPLAIN; SCAN ... USING INDEX của SQLite là quét index
+SEQUENTIAL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'^SCAN (\w+)(?: AS \w+)?$'),
+}
+# Bảng con trong subquery được đặt alias (U0, T3...), SQLite chỉ in alias trong plan
+TABLE_ALIAS_PATTERN = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)"?')
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN every query issued by the hot endpoints and jobs and fail if a large table "
+        "is read with a sequential scan. On PostgreSQL sequential scans are disabled while "
+        "explaining, so a seq scan in the plan means no index can serve the query."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAIN_PREFIXES:
+            raise CommandError(f"Query plans cannot be checked on {connection.vendor}.")
+
+        employee_user = User.objects.filter(employee_profile__is_active=True).select_related('employee_profile').first()
+        manager_user = User.objects.filter(groups__name=settings.GROUP_NAME['MANAGER']).first()
+        if not employee_user or not manager_user:
+            raise CommandError("The database needs an active employee and a manager to check query plans.")
+        employee = employee_user.employee_profile
+        department = employee.department.name
+
+        current_date = timezone.localtime(timezone.now()).date()
+        month, year = current_date.month, current_date.year
+        period = f"month={month}&year={year}"
+        checks = [
+            ('daily timesheet', employee_user, '/api/timesheet/get_daily_timesheet_employee/'),
+            ('month timesheet', employee_user, '/api/timesheet/get_current_month_timesheet_employee/'),
+            ('employee leave requests', employee_user, '/api/timesheet/list_leave_requests_employee/'),
+            ('employee leave count', employee_user, '/api/timesheet/get_leave_count_in_current_month/'),
+            ('employee overtime requests', employee_user, '/api/timesheet/list_overtime_requests_employee/'),
+            ('manager leave queue', manager_user, '/api/timesheet/list_leave_requests_manager/'),
+            ('manager overtime queue', manager_user, '/api/timesheet/list_overtime_requests_manager/'),
+            ('tracking report', manager_user, f'/api/timesheet/get_tracking_time_employee/?{period}'),
+            ('team calendar', manager_user, f'/api/timesheet/get_team_calendar/?department={department}&{period}'),
+            ('salary records', manager_user, f'/api/salary/get_current_month_salary_records/?{period}'),
+            ('department employees', manager_user, f'/api/employee/get_all_employees_of_deparment/?department={department}'),
+            ('payroll inputs', None, lambda: load_payroll_inputs(month, year)),
+            ('attendance rollup rebuild', None, lambda: rebuild_monthly_attendance(month, year)),
+            ('absence materialisation', None, lambda: find_unrecorded_shifts(
+                current_date - timedelta(days=1),
+                [shift for shift in get_shifts().values() if is_shift_day(shift.shift_type, current_date - timedelta(days=1))]
+            )),
+        ]
+
+        failures = []
+        for name, user, target in checks:
+            statements = self.capture_statements(user, target)
+            scanned = set()
+            for sql in statements:
+                scanned.update(self.sequential_scans(sql))
+            if scanned:
+                failures.append(name)
+                self.stdout.write(f"FAIL {name}: sequential scan on {', '.join(sorted(scanned))}")
+            else:
+                self.stdout.write(f"ok   {name}: {len(statements)} queries")
+
+        if failures:
+            raise CommandError(f"{len(failures)} check(s) read a large table with a sequential scan.")
+
+    def capture_statements(self, user, target):
+        # Chạy endpoint/job rồi rollback, chỉ giữ các câu SELECT chạm tới bảng lớn
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            if user is None:
+                target()
+            else:
+                client = APIClient()
+                client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(user).access_token}")
+                response = client.get(target)
+                if response.status_code != 200:
+                    raise CommandError(f"GET {target} returned {response.status_code}: {response.content[:200]}")
+            transaction.set_rollback(True)
+        return [
+            query['sql'] for query in queries
+            if query['sql'].lstrip().upper().startswith('SELECT')
+            and any(table in query['sql'] for table in LARGE_TABLES)
+        ]
+
+    def sequential_scans(self, sql):
+        pattern = SEQUENTIAL_SCAN_PATTERNS[connection.vendor]
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(EXPLAIN_PREFIXES[connection.vendor] + sql)
+            plan = [str(row[-1]).strip() for row in cursor.fetchall()]
+            transaction.set_rollback(True)
+        aliases = {alias: table for table, alias in TABLE_ALIAS_PATTERN.findall(sql)}
+        tables = {
+            aliases.get(match.group(1), match.group(1))
+            for line in plan
+            for match in [pattern.search(line)]
+            if match
+        }
+        return tables & LARGE_TABLES
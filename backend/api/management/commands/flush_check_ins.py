@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from api.timesheet.journal import flush_check_in_journal
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered check-ins from the journal into TimeSheet (CHECK_IN_INGESTION_MODE=buffered).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep flushing every --interval seconds instead of flushing once.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Seconds between flushes with --loop.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='bulk_create batch size (defaults to settings.CHECK_IN_FLUSH_BATCH_SIZE).'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            flushed = flush_check_in_journal(options['batch_size'])
+            if flushed or not options['loop']:
+                self.stdout.write(f"Flushed {flushed} check-ins in {time.perf_counter() - started:.2f}s.")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,91 @@
+import csv
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.submodels.models_timesheet import AttendanceImport
+from api.timesheet.attendance_import import AttendanceImportError, import_attendance_logs, execute_queued_attendance_imports
+
+
+class Command(BaseCommand):
+    help = 'Import a fingerprint terminal CSV log (employee_id, timestamp or date/time) into TimeSheet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV file exported by the attendance device.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='(employee, date, shift) keys per upsert batch (defaults to settings.ATTENDANCE_IMPORT_BATCH_SIZE).'
+        )
+        parser.add_argument(
+            '--rejects',
+            help='Write every rejected row (line, employee_id, error) to this CSV file.'
+        )
+        parser.add_argument(
+            '--process-queue',
+            action='store_true',
+            help='Import the files uploaded through the API (import_attendance_logs) instead of path.'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='With --process-queue, keep polling the queue every --interval seconds.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between queue polls with --loop.'
+        )
+
+    def handle(self, *args, **options):
+        if options['process_queue']:
+            return self.process_queue(options)
+        if not options['path']:
+            raise CommandError("path is required without --process-queue.")
+
+        rejects_file = open(options['rejects'], 'w', newline='', encoding='utf-8') if options['rejects'] else None
+        try:
+            on_reject = None
+            if rejects_file:
+                writer = csv.DictWriter(rejects_file, fieldnames=['line', 'employee_id', 'error'])
+                writer.writeheader()
+                on_reject = writer.writerow
+
+            started = time.perf_counter()
+            with open(options['path'], newline='', encoding='utf-8-sig') as log_file:
+                result = import_attendance_logs(log_file, options['batch_size'], on_reject)
+        except AttendanceImportError as error:
+            raise CommandError(str(error))
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        if not rejects_file:
+            for rejected in result['rejects']:
+                self.stderr.write(f"line {rejected['line']} ({rejected['employee_id']}): {rejected['error']}")
+        for incomplete in result['incompletes']:
+            self.stderr.write(f"{incomplete['date']} {incomplete['shift']} ({incomplete['employee_id']}): {incomplete['error']}")
+        self.stdout.write(
+            f"Imported {result['punch_count']}/{result['row_count']} punches into {result['upserted_count']} "
+            f"timesheet upserts, {result['incomplete_count']} incomplete, {result['reject_count']} rejected, "
+            f"in {time.perf_counter() - started:.2f}s."
+        )
+
+    def process_queue(self, options):
+        # Worker chạy ngoài web server, file upload được import ở đây thay vì trong request
+        while True:
+            attendance_imports = execute_queued_attendance_imports(options['batch_size'])
+            for attendance_import in attendance_imports:
+                message = (
+                    f"Attendance import {attendance_import.id}: {attendance_import.status}, "
+                    f"{attendance_import.punch_count}/{attendance_import.row_count} punches, "
+                    f"{attendance_import.incomplete_count} incomplete, {attendance_import.reject_count} rejected."
+                )
+                if attendance_import.status == AttendanceImport.Status.FAILED:
+                    self.stderr.write(f"{message} - error: {attendance_import.error}")
+                else:
+                    self.stdout.write(message)
+            if not attendance_imports and not options['loop']:
+                self.stdout.write("No queued attendance imports.")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
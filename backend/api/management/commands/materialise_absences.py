@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.timesheet.absences import materialise_absences
+from api.timesheet.journal import is_buffered_check_in, flush_check_in_journal
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = 'Insert ABSENT/LEAVE TimeSheet rows for shifts nobody checked in to and close rows without check-out. Run nightly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='from_date',
+            help='First day to process (YYYY-MM-DD). Defaults to yesterday.'
+        )
+        parser.add_argument(
+            '--to',
+            dest='to_date',
+            help='Last day to process (YYYY-MM-DD). Defaults to --from.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='bulk_create batch size.'
+        )
+
+    def handle(self, *args, **options):
+        current_date = timezone.localtime(timezone.now()).date()
+        from_date = parse_date(options['from_date']) if options['from_date'] else current_date - timedelta(days=1)
+        to_date = parse_date(options['to_date']) if options['to_date'] else from_date
+        if to_date < from_date:
+            raise CommandError("--to cannot be before --from.")
+        if to_date >= current_date:
+            # Ca của hôm nay chưa kết thúc, nhân viên vẫn có thể check-in/check-out
+            raise CommandError("Only days before today can be processed.")
+
+        if is_buffered_check_in():
+            # Ghi check-in còn nằm trong journal trước, để ca đã check-in không bị tính là ABSENT
+            flush_check_in_journal()
+
+        single_date = from_date
+        while single_date <= to_date:
+            absent_count, leave_count, closed_count = materialise_absences(single_date, options['batch_size'])
+            self.stdout.write(
+                f"{single_date}: {absent_count} absent, {leave_count} on leave, {closed_count} closed without check-out."
+            )
+            single_date += timedelta(days=1)
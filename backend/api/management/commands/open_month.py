@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.salary.payroll import months_between, provision_month
+from .run_payroll import parse_month
+
+
+class Command(BaseCommand):
+    help = 'Create the SalaryRecord/EmployeeEvaluation rows of a month for every active employee (run at month start).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='from_month',
+            help='First month to open (YYYY-MM). Defaults to the current month.'
+        )
+        parser.add_argument(
+            '--to',
+            dest='to_month',
+            help='Last month to open (YYYY-MM). Defaults to --from.'
+        )
+
+    def handle(self, *args, **options):
+        current_date = timezone.localtime(timezone.now()).date()
+        from_date = parse_month(options['from_month']) if options['from_month'] else current_date.replace(day=1)
+        to_date = parse_month(options['to_month']) if options['to_month'] else from_date
+        if to_date < from_date:
+            raise CommandError("--to cannot be before --from.")
+
+        for month, year in months_between(from_date, to_date):
+            employee_count = provision_month(month, year)
+            self.stdout.write(f"Opened {month}/{year} for {employee_count} active employees.")
@@ -0,0 +1,154 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.submodels.models_payroll import PayrollRun
+from api.salary.serializers import PAYROLL_ENGINES, diff_monthly_salaries
+from api.salary.payroll import (
+    PayrollRunInProgress, months_between, start_payroll_runs, execute_payroll_runs, execute_queued_payroll_runs
+)
+
+
+def parse_month(value):
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f"Invalid month '{value}', expected YYYY-MM.")
+
+
+class Command(BaseCommand):
+    help = 'Compute payroll for one or more months and persist SalaryRecord/EmployeeEvaluation results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='from_month',
+            help='First month to compute (YYYY-MM). Defaults to the current month.'
+        )
+        parser.add_argument(
+            '--to',
+            dest='to_month',
+            help='Last month to compute (YYYY-MM). Defaults to --from.'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every employee instead of only those whose inputs changed.'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=PAYROLL_ENGINES,
+            help='Payroll engine to use (defaults to settings.PAYROLL_ENGINE).'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes; each month (or department shard) runs in its own process.'
+        )
+        parser.add_argument(
+            '--by-department',
+            action='store_true',
+            help='Split each month into one shard per department.'
+        )
+        parser.add_argument(
+            '--process-queue',
+            action='store_true',
+            help='Execute the runs queued through the API (run_payroll/run_payroll_range) instead of --from/--to.'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='With --process-queue, keep polling the queue every --interval seconds.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between queue polls with --loop.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute every employee and print what would change without saving anything.'
+        )
+
+    def handle(self, *args, **options):
+        if options['process_queue']:
+            return self.process_queue(options)
+
+        current_date = timezone.localtime(timezone.now()).date()
+        from_date = parse_month(options['from_month']) if options['from_month'] else current_date.replace(day=1)
+        to_date = parse_month(options['to_month']) if options['to_month'] else from_date
+        if to_date < from_date:
+            raise CommandError("--to cannot be before --from.")
+
+        if options['dry_run']:
+            for month, year in months_between(from_date, to_date):
+                self.print_payroll_diff(diff_monthly_salaries(month, year, engine=options['engine']))
+            return
+
+        try:
+            runs = start_payroll_runs(months_between(from_date, to_date), is_incremental=not options['full'])
+        except PayrollRunInProgress as error:
+            raise CommandError(str(error))
+
+        runs = execute_payroll_runs(
+            runs,
+            workers=options['workers'],
+            by_department=options['by_department'],
+            engine=options['engine'],
+            on_progress=self.print_progress
+        )
+        self.print_runs(runs)
+
+    def process_queue(self, options):
+        # Worker chạy ngoài web server (service/cron), pool tiến trình chỉ được tạo ở đây
+        while True:
+            runs = execute_queued_payroll_runs(on_progress=self.print_progress)
+            if runs:
+                self.print_runs(runs, raise_on_failure=not options['loop'])
+            elif not options['loop']:
+                self.stdout.write("No queued payroll runs.")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def print_progress(self, run, shard_result):
+        department = shard_result['department_id'] or 'all'
+        message = (
+            f"[{run.month}/{run.year} department={department}] shard {run.shards_done}/{run.shards_total}: "
+            f"{shard_result['employee_count']} employees in {shard_result.get('seconds', 0):.2f}s"
+        )
+        if shard_result.get('error'):
+            self.stderr.write(f"{message} - error: {shard_result['error']}")
+        else:
+            self.stdout.write(message)
+
+    def print_runs(self, runs, raise_on_failure=True):
+        failed_runs = [run for run in runs if run.status == PayrollRun.Status.FAILED]
+        for run in runs:
+            self.stdout.write(
+                f"Payroll run {run.id} for {run.month}/{run.year}: {run.status}, "
+                f"{run.employee_count} employees in {run.duration:.2f}s."
+            )
+        if failed_runs and raise_on_failure:
+            raise CommandError(f"{len(failed_runs)} payroll run(s) failed.")
+        self.stdout.write(self.style.SUCCESS(f"{len(runs)} payroll run(s) finished."))
+
+    def print_payroll_diff(self, diff):
+        self.stdout.write(
+            f"Dry run {diff['month']}/{diff['year']}: "
+            f"{diff['changed_count']}/{diff['employee_count']} employees would change."
+        )
+        for change in diff['changes']:
+            employee = change['employee']
+            fields = ', '.join(
+                f"{field}: {values['old']} -> {values['new']}" for field, values in change['changes'].items()
+            )
+            self.stdout.write(f"  {employee['employee_id']} ({employee['department']}): {fields}")
+        for totals in diff['departments']:
+            self.stdout.write(
+                f"  [{totals['department']}] {totals['changed_count']}/{totals['employee_count']} changed, "
+                f"gross {totals['old_gross_salary']} -> {totals['new_gross_salary']} ({totals['difference']})"
+            )
@@ -0,0 +1,196 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+import api.submodels.models_employee
+import api.submodels.models_timesheet
+from decimal import Decimal
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Department',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100, null=True)),
+                ('code', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('manager', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='managed_department', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_id', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('full_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('gender', models.CharField(choices=[('M', 'Male'), ('F', 'Female'), ('O', 'Other')], default='M', max_length=1)),
+                ('address', models.CharField(blank=True, max_length=150, null=True)),
+                ('phone_number', models.CharField(blank=True, max_length=20, null=True)),
+                ('avatar', models.ImageField(blank=True, null=True, upload_to=api.submodels.models_employee.upload_to_avatars_folder)),
+                ('join_date', models.DateField(blank=True, null=True)),
+                ('contract_end_date', models.DateField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.department')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Position',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100, null=True)),
+                ('code', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('salary_base', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('salary_insufficient_work', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('salary_overtime', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('attendance_bonus', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0'))])),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkingShift',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shift_type', models.CharField(choices=[('MORNING', 'Morning Shift'), ('AFTERNOON', 'Afternoon Shift')], max_length=10)),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('break_start', models.TimeField(blank=True, null=True)),
+                ('break_end', models.TimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OvertimeRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(blank=True, null=True)),
+                ('from_time', models.TimeField(blank=True, null=True)),
+                ('to_time', models.TimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('CANCELLED', 'Cancelled')], default='PENDING', max_length=10)),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approved_overtimes', to=settings.AUTH_USER_MODEL)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overtime_requests', to='api.employee')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeaveRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leave_type', models.CharField(choices=[('ANNUAL', 'Annual Leave'), ('SICK', 'Sick Leave'), ('UNPAID', 'Unpaid Leave'), ('OTHER', 'Other')], default='ANNUAL', max_length=10)),
+                ('from_date', models.DateField(blank=True, null=True)),
+                ('to_date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('APPROVED', 'Approved'), ('REJECTED', 'Rejected'), ('CANCELLED', 'Cancelled')], default='PENDING', max_length=10)),
+                ('approved_at', models.DateTimeField(blank=True, null=True)),
+                ('attachments', models.FileField(blank=True, null=True, upload_to=api.submodels.models_timesheet.upload_to_employee_folder)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approved_leaves', to=settings.AUTH_USER_MODEL)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_requests', to='api.employee')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='position',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.position'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='employee_profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='TimeSheet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(blank=True, null=True)),
+                ('check_in_time', models.TimeField(blank=True, null=True)),
+                ('check_out_time', models.TimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('PRESENT', 'Present'), ('LATE', 'Late'), ('EARLY_LEAVE', 'Early Leave'), ('ABSENT', 'Absent'), ('LEAVE', 'On Leave'), ('INCOMPLETE', 'Incomplete Check')], max_length=15)),
+                ('is_overtime', models.BooleanField(default=False)),
+                ('overtime_hours', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=4, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))])),
+                ('note', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.employee')),
+                ('shift', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='api.workingshift')),
+            ],
+            options={
+                'unique_together': {('employee', 'date', 'shift')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SalaryRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('year', models.PositiveIntegerField()),
+                ('base_salary', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('position_allowance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('overtime_pay', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('attendance_bonus', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('other_bonus', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('gross_salary', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='salary', to='api.employee')),
+            ],
+            options={
+                'unique_together': {('employee', 'month', 'year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('total_leaves', models.PositiveIntegerField(default=6)),
+                ('used_leaves', models.PositiveIntegerField(default=0)),
+                ('remaining_leaves', models.PositiveIntegerField(default=6)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_balance', to='api.employee')),
+            ],
+            options={
+                'unique_together': {('employee', 'year')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EmployeeEvaluation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evaluated_at', models.DateTimeField(blank=True, null=True)),
+                ('month', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('year', models.PositiveIntegerField()),
+                ('content', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evaluations', to='api.employee')),
+                ('evaluated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='evaluated_employees', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('employee', 'month', 'year')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_payrollrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollrun',
+            name='is_incremental',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='PayrollDirtyEmployee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('year', models.PositiveIntegerField()),
+                ('marked_at', models.DateTimeField()),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payroll_dirty_marks', to='api.employee')),
+            ],
+            options={
+                'unique_together': {('employee', 'month', 'year')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_payrolldirtyemployee'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollrun',
+            name='shard_timings',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='payrollrun',
+            name='shards_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payrollrun',
+            name='shards_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
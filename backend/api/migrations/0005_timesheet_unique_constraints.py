@@ -0,0 +1,44 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def remove_duplicate_overtime_rows(apps, schema_editor):
+    # unique_together cũ chứa shift (NULL với tăng ca) nên một ngày có thể có nhiều dòng tăng ca:
+    # giữ dòng đã check-out (rồi tới dòng check-in sớm nhất), xóa các dòng còn lại
+    TimeSheet = apps.get_model('api', 'TimeSheet')
+    duplicates = TimeSheet.objects.filter(is_overtime=True).values('employee_id', 'date').annotate(
+        row_count=Count('id')
+    ).filter(row_count__gt=1)
+    for duplicate in duplicates:
+        rows = TimeSheet.objects.filter(
+            is_overtime=True,
+            employee_id=duplicate['employee_id'],
+            date=duplicate['date']
+        ).order_by(F('check_out_time').desc(nulls_last=True), F('check_in_time').asc(nulls_last=True), 'id')
+        kept = rows.first()
+        rows.exclude(id=kept.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_payrollrun_shards'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_overtime_rows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='timesheet',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='timesheet',
+            constraint=models.UniqueConstraint(condition=models.Q(('shift__isnull', False)), fields=('employee', 'date', 'shift'), name='unique_timesheet_shift'),
+        ),
+        migrations.AddConstraint(
+            model_name='timesheet',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_overtime', True)), fields=('employee', 'date'), name='unique_timesheet_overtime'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_timesheet_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('year', models.PositiveIntegerField()),
+                ('early_leave_count', models.IntegerField(default=0)),
+                ('late_count', models.IntegerField(default=0)),
+                ('present_count', models.IntegerField(default=0)),
+                ('worked_minutes', models.IntegerField(default=0)),
+                ('overtime_minutes', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_attendances', to='api.employee')),
+            ],
+            options={
+                'unique_together': {('employee', 'month', 'year')},
+            },
+        ),
+    ]
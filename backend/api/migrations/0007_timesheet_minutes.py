@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_monthlyattendance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timesheet',
+            name='early_minutes',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=7),
+        ),
+        migrations.AddField(
+            model_name='timesheet',
+            name='late_minutes',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=7),
+        ),
+        migrations.AddField(
+            model_name='timesheet',
+            name='worked_minutes',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=7),
+        ),
+        migrations.AlterField(
+            model_name='monthlyattendance',
+            name='overtime_minutes',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=9),
+        ),
+        migrations.AlterField(
+            model_name='monthlyattendance',
+            name='worked_minutes',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=9),
+        ),
+    ]
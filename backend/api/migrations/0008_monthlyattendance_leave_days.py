@@ -0,0 +1,19 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_timesheet_minutes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlyattendance',
+            name='leave_days',
+            field=models.DecimalField(decimal_places=1, default=Decimal('0.0'), max_digits=4),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_monthlyattendance_leave_days'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['department'], name='employee_active_department'),
+        ),
+        migrations.AddIndex(
+            model_name='employeeevaluation',
+            index=models.Index(fields=['year', 'month'], name='evaluation_period'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['employee', 'status', 'from_date', 'to_date'], name='leave_employee_status_dates'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-created_at'], name='leave_pending_created'),
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(condition=models.Q(('status', 'APPROVED')), fields=['from_date', 'to_date'], name='leave_approved_dates'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlyattendance',
+            index=models.Index(fields=['year', 'month'], name='monthly_attendance_period'),
+        ),
+        migrations.AddIndex(
+            model_name='overtimerequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-created_at'], name='overtime_pending_created'),
+        ),
+        migrations.AddIndex(
+            model_name='overtimerequest',
+            index=models.Index(fields=['employee', 'date'], name='overtime_employee_date'),
+        ),
+        migrations.AddIndex(
+            model_name='salaryrecord',
+            index=models.Index(fields=['year', 'month'], name='salary_record_period'),
+        ),
+        migrations.AddIndex(
+            model_name='timesheet',
+            index=models.Index(fields=['employee', 'date', 'status'], name='timesheet_employee_date_status'),
+        ),
+        migrations.AddIndex(
+            model_name='timesheet',
+            index=models.Index(fields=['date', 'status'], name='timesheet_date_status'),
+        ),
+    ]
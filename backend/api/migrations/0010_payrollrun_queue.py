@@ -0,0 +1,41 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_add_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='payrollrun',
+            name='unique_running_payroll_run',
+        ),
+        migrations.AddField(
+            model_name='payrollrun',
+            name='by_department',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='payrollrun',
+            name='engine',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='payrollrun',
+            name='workers',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='payrollrun',
+            name='status',
+            field=models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('SUCCESS', 'Success'), ('FAILED', 'Failed')], default='RUNNING', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='payrollrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['QUEUED', 'RUNNING'])), fields=('month', 'year'), name='unique_active_payroll_run'),
+        ),
+    ]
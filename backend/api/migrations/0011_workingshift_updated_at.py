@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_payrollrun_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workingshift',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
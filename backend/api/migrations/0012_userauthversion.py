@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('api', '0011_workingshift_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAuthVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='auth_version', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
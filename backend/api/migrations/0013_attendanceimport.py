@@ -0,0 +1,38 @@
+# Generated by Django 4.2.16 on 2026-10-18 00:22
+
+import api.submodels.models_timesheet
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0012_userauthversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to=api.submodels.models_timesheet.upload_to_attendance_imports_folder)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('SUCCESS', 'Success'), ('FAILED', 'Failed')], default='QUEUED', max_length=10)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('punch_count', models.PositiveIntegerField(default=0)),
+                ('upserted_count', models.PositiveIntegerField(default=0)),
+                ('incomplete_count', models.PositiveIntegerField(default=0)),
+                ('reject_count', models.PositiveIntegerField(default=0)),
+                ('rejects', models.JSONField(blank=True, default=list)),
+                ('incompletes', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('triggered_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -3,3 +3,4 @@ from django.db import models
 # Create your models here.
 from .submodels.models_employee import *
 from .submodels.models_timesheet import *
+from .submodels.models_payroll import *
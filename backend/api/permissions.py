@@ -1,6 +1,15 @@
 from rest_framework.permissions import BasePermission
 from django.contrib.auth.models import User, Group
 from django.conf import settings
+from .authentication import get_token_claim
+
+
+def has_group(request, group_name):
+    # Đọc group từ claim của access token, chỉ truy vấn DB khi token không có claim
+    groups = get_token_claim(request, 'groups')
+    if groups is None:
+        return request.user.groups.filter(name=group_name).exists()
+    return group_name in groups
 
 
 class IsManager(BasePermission):
@@ -8,7 +17,7 @@ class IsManager(BasePermission):
     Allows access only to managers.
     """
     def has_permission(self, request, view):
-        is_manager = request.user.groups.filter(name=settings.GROUP_NAME['MANAGER']).exists()
+        is_manager = has_group(request, settings.GROUP_NAME['MANAGER'])
         return is_manager
     
     def has_object_permission(self, request, view, obj):
@@ -19,7 +28,7 @@ class IsEmployee(BasePermission):
     Allows access only to employees.
     """
     def has_permission(self, request, view):
-        is_employee = request.user.groups.filter(name=settings.GROUP_NAME['EMPLOYEE']).exists()
+        is_employee = has_group(request, settings.GROUP_NAME['EMPLOYEE'])
         return is_employee
     
     def has_object_permission(self, request, view, obj):
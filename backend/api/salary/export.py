@@ -0,0 +1,163 @@
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+from ..submodels.models_timesheet import SalaryRecord
+
+
+EXPORT_FILE_TYPE_CSV = 'csv'
+EXPORT_FILE_TYPE_XLSX = 'xlsx'
+EXPORT_FILE_TYPES = [EXPORT_FILE_TYPE_CSV, EXPORT_FILE_TYPE_XLSX]
+EXPORT_CONTENT_TYPES = {
+    EXPORT_FILE_TYPE_CSV: 'text/csv; charset=utf-8',
+    EXPORT_FILE_TYPE_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+EXPORT_CHUNK_SIZE = 2000
+
+# (cột trong values(), tiêu đề cột, là số)
+SALARY_EXPORT_COLUMNS = [
+    ('employee__employee_id', 'Employee ID', False),
+    ('employee__full_name', 'Full name', False),
+    ('employee__department__name', 'Department', False),
+    ('month', 'Month', True),
+    ('year', 'Year', True),
+    ('base_salary', 'Base salary', True),
+    ('overtime_pay', 'Overtime pay', True),
+    ('attendance_bonus', 'Attendance bonus', True),
+    ('other_bonus', 'Other bonus', True),
+    ('gross_salary', 'Gross salary', True),
+    ('note', 'Note', False),
+]
+
+
+def get_salary_export_rows(month=None, year=None, department=None):
+    """
+    Flat salary rows for export. values() joins employee and department in
+    the same query and iterator() streams them in chunks (a server-side
+    cursor on PostgreSQL), so memory does not grow with the row count.
+    """
+    salary_records = SalaryRecord.objects.filter(employee__is_active=True)
+    if department:
+        salary_records = salary_records.filter(employee__department=department)
+    if month and year:
+        salary_records = salary_records.filter(month=month, year=year)
+    return salary_records.order_by('employee__employee_id', 'year', 'month').values_list(
+        *[column for column, _, _ in SALARY_EXPORT_COLUMNS]
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class Echo:
+    # File giả: write() trả lại chính giá trị để csv.writer sinh ra từng dòng
+    def write(self, value):
+        return value
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    # BOM để Excel đọc đúng tiếng Việt
+    yield '\ufeff' + writer.writerow([title for _, title, _ in SALARY_EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+class StreamBuffer:
+    # File chỉ ghi, không seek được: zipfile ghi vào, generator lấy dữ liệu ra
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Salary" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+def xlsx_row(values, numeric_columns):
+    cells = []
+    for value, is_numeric in zip(values, numeric_columns):
+        if value is None or value == '':
+            cells.append('<c/>')
+        elif is_numeric:
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+def stream_xlsx(rows):
+    """
+    Minimal single-sheet XLSX written straight into a streamed zip, so the
+    workbook is never held in memory. Strings are inline, no styles.
+    """
+    buffer = StreamBuffer()
+    numeric_columns = [is_numeric for _, _, is_numeric in SALARY_EXPORT_COLUMNS]
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + xlsx_row([title for _, title, _ in SALARY_EXPORT_COLUMNS], [False] * len(numeric_columns))
+            ).encode('utf-8'))
+            lines = []
+            for row in rows:
+                lines.append(xlsx_row(row, numeric_columns))
+                if len(lines) >= EXPORT_CHUNK_SIZE:
+                    sheet.write(''.join(lines).encode('utf-8'))
+                    lines = []
+                    yield buffer.drain()
+            sheet.write((''.join(lines) + '</sheetData></worksheet>').encode('utf-8'))
+        yield buffer.drain()
+    yield buffer.drain()
+
+def stream_salary_export(rows, file_type):
+    if file_type == EXPORT_FILE_TYPE_XLSX:
+        return stream_xlsx(rows)
+    return stream_csv(rows)
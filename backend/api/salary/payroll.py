@@ -0,0 +1,386 @@
+import os
+import time
+import django
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction, connections
+from django.utils import timezone
+from ..submodels.models_employee import Employee, Department
+from ..submodels.models_payroll import PayrollRun, PayrollDirtyEmployee
+from ..submodels.models_timesheet import SalaryRecord, EmployeeEvaluation
+from ..timesheet.counters import rebuild_monthly_attendance
+from .serializers import batch_calculate_monthly_salaries, append_to_note, invalidate_department_salary_summary
+
+
+class PayrollRunInProgress(Exception):
+    pass
+
+
+def months_between(from_date, to_date):
+    # Các cặp (month, year) mà khoảng [from_date, to_date] đi qua
+    months = []
+    month, year = from_date.month, from_date.year
+    while (year, month) <= (to_date.year, to_date.month):
+        months.append((month, year))
+        month += 1
+        if month > 12:
+            month = 1
+            year += 1
+    return months
+
+def mark_payroll_dirty(employee_ids, month, year):
+    """
+    Flag employees whose payroll inputs changed for (month, year) so the next
+    incremental payroll run recomputes them. Re-marking refreshes marked_at,
+    so a change that lands while a run is in progress is kept for the next run.
+    """
+    marked_at = timezone.now()
+    dirty_marks = [
+        PayrollDirtyEmployee(employee_id=employee_id, month=month, year=year, marked_at=marked_at)
+        for employee_id in set(employee_ids)
+    ]
+    if dirty_marks:
+        PayrollDirtyEmployee.objects.bulk_create(
+            dirty_marks,
+            update_conflicts=True,
+            unique_fields=['employee', 'month', 'year'],
+            update_fields=['marked_at']
+        )
+
+def get_open_payroll_months():
+    """
+    (month, year) of the months whose payroll can still change: the current
+    month and the settings.PAYROLL_OPEN_MONTHS - 1 months before it. Older
+    months are considered paid and are not recomputed by rate changes.
+    """
+    current_date = timezone.localtime(timezone.now()).date()
+    month, year = current_date.month, current_date.year
+    months = []
+    for _ in range(max(settings.PAYROLL_OPEN_MONTHS, 1)):
+        months.append((month, year))
+        month, year = (12, year - 1) if month == 1 else (month - 1, year)
+    return months
+
+# (employee_id, month, year) đã chắc chắn có SalaryRecord và EmployeeEvaluation, lưu theo từng tiến trình
+ensured_monthly_records = set()
+# Các tháng đã nạp sẵn danh sách trên từ DB
+loaded_record_months = set()
+
+def remember_monthly_records(employee_months, months=()):
+    # Chỉ ghi nhớ sau khi transaction commit, rollback thì lần sau tạo lại
+    def remember():
+        ensured_monthly_records.update(employee_months)
+        loaded_record_months.update(months)
+    transaction.on_commit(remember)
+
+def forget_monthly_record(employee_id, month, year):
+    ensured_monthly_records.discard((employee_id, month, year))
+
+def load_ensured_monthly_records(months):
+    # Một lần mỗi tháng mỗi tiến trình: nạp các nhân viên đã có đủ bảng lương và đánh giá
+    for month, year in set(months) - loaded_record_months:
+        salary_employee_ids = set(SalaryRecord.objects.filter(month=month, year=year).values_list('employee_id', flat=True))
+        evaluation_employee_ids = set(EmployeeEvaluation.objects.filter(month=month, year=year).values_list('employee_id', flat=True))
+        remember_monthly_records(
+            {(employee_id, month, year) for employee_id in salary_employee_ids & evaluation_employee_ids},
+            [(month, year)]
+        )
+
+def create_monthly_records(employee_months):
+    SalaryRecord.objects.bulk_create(
+        [SalaryRecord(employee_id=employee_id, month=month, year=year) for employee_id, month, year in employee_months],
+        ignore_conflicts=True
+    )
+    EmployeeEvaluation.objects.bulk_create(
+        [EmployeeEvaluation(employee_id=employee_id, month=month, year=year) for employee_id, month, year in employee_months],
+        ignore_conflicts=True
+    )
+    for month, year in {(month, year) for _, month, year in employee_months}:
+        invalidate_department_salary_summary(month, year)
+    remember_monthly_records(employee_months)
+
+def ensure_monthly_records(employee_months):
+    """
+    Make sure each (employee_id, month, year) has its SalaryRecord and
+    EmployeeEvaluation. Months are normally provisioned up front by
+    provision_month, so this only writes for late joiners and is a set
+    lookup otherwise.
+    """
+    employee_months = set(employee_months) - ensured_monthly_records
+    if not employee_months:
+        return
+    load_ensured_monthly_records({(month, year) for _, month, year in employee_months})
+    employee_months -= ensured_monthly_records
+    if employee_months:
+        create_monthly_records(employee_months)
+
+def provision_month(month, year):
+    """
+    Month-open step: bulk-create SalaryRecord, EmployeeEvaluation and
+    MonthlyAttendance rows of (month, year) for every active employee.
+    Safe to re-run: existing salary rows are left untouched and counters
+    are recomputed from TimeSheet. Returns the number of active employees.
+    """
+    employee_ids = list(Employee.objects.filter(is_active=True).values_list('id', flat=True))
+    with transaction.atomic():
+        create_monthly_records({(employee_id, month, year) for employee_id in employee_ids})
+        # Tạo sẵn bộ đếm chấm công để check-in/check-out chỉ cần một câu UPDATE
+        rebuild_monthly_attendance(month, year, employee_ids)
+    return len(employee_ids)
+
+def record_timesheet_changes(employee_dates):
+    # Thay cho các signal post_save của TimeSheet khi ghi hàng loạt: tạo bảng lương tháng và đánh dấu tính lại lương
+    employee_months = {(employee_id, single_date.month, single_date.year) for employee_id, single_date in employee_dates}
+    ensure_monthly_records(employee_months)
+    employees_by_month = {}
+    for employee_id, month, year in employee_months:
+        employees_by_month.setdefault((month, year), []).append(employee_id)
+    for (month, year), employee_ids in employees_by_month.items():
+        mark_payroll_dirty(employee_ids, month, year)
+
+def expire_stale_payroll_runs():
+    """
+    Release the lock of runs that will never finish: a RUNNING run whose
+    process died (worker recycled, killed mid-run) and made no progress for
+    PAYROLL_RUN_TIMEOUT_MINUTES, or a QUEUED run that no worker
+    (run_payroll --process-queue) picked up within that time, is marked
+    FAILED. Its dirty marks are kept, so the next incremental run
+    recomputes those employees.
+    """
+    current = timezone.now()
+    timeout = timedelta(minutes=settings.PAYROLL_RUN_TIMEOUT_MINUTES)
+    # updated_at được cập nhật mỗi khi một shard xong nên là mốc tiến độ gần nhất
+    expired_count = PayrollRun.objects.filter(
+        status=PayrollRun.Status.RUNNING,
+        updated_at__lt=current - timeout
+    ).update(
+        status=PayrollRun.Status.FAILED,
+        finished_at=current,
+        error="Payroll run timed out.",
+        updated_at=current
+    )
+    # Không có worker nào nhận: nếu không hủy thì tháng bị khóa (409) mãi mãi
+    expired_count += PayrollRun.objects.filter(
+        status=PayrollRun.Status.QUEUED,
+        updated_at__lt=current - timeout
+    ).update(
+        status=PayrollRun.Status.FAILED,
+        finished_at=current,
+        error="Payroll run was not picked up by a worker in time.",
+        updated_at=current
+    )
+    return expired_count
+
+def start_payroll_run(month, year, triggered_by=None, is_incremental=False, queued=False,
+                      workers=1, by_department=False, engine=None):
+    """
+    Create a RUNNING (or, with queued, a QUEUED) payroll run for the month.
+    The partial unique constraint on PayrollRun acts as the lock: a second
+    run for the same month fails with PayrollRunInProgress until the first
+    one finishes.
+    """
+    expire_stale_payroll_runs()
+    try:
+        with transaction.atomic():
+            return PayrollRun.objects.create(
+                month=month,
+                year=year,
+                status=PayrollRun.Status.QUEUED if queued else PayrollRun.Status.RUNNING,
+                triggered_by=triggered_by,
+                is_incremental=is_incremental,
+                workers=workers,
+                by_department=by_department,
+                engine=engine,
+                started_at=None if queued else timezone.now()
+            )
+    except IntegrityError:
+        raise PayrollRunInProgress(f"A payroll run for {month}/{year} is already queued or running.")
+
+def start_payroll_runs(months, triggered_by=None, is_incremental=False, **options):
+    # Lấy khóa cho tất cả các tháng, nếu một tháng đang chạy thì trả lại các khóa đã lấy
+    runs = []
+    try:
+        for month, year in months:
+            runs.append(start_payroll_run(month, year, triggered_by, is_incremental, **options))
+    except PayrollRunInProgress:
+        PayrollRun.objects.filter(id__in=[run.id for run in runs]).update(
+            status=PayrollRun.Status.FAILED,
+            finished_at=timezone.now(),
+            error="Cancelled: another month in the range is already queued or running."
+        )
+        raise
+    return runs
+
+def queue_payroll_runs(months, triggered_by=None, is_incremental=False, workers=1, by_department=False, engine=None):
+    # API chỉ xếp hàng, tiến trình run_payroll --process-queue mới thực sự tính lương
+    return start_payroll_runs(
+        months,
+        triggered_by,
+        is_incremental,
+        queued=True,
+        workers=workers,
+        by_department=by_department,
+        engine=engine
+    )
+
+def claim_queued_payroll_runs():
+    """
+    Move QUEUED runs to RUNNING, oldest first, and return the ones this
+    process claimed. The conditional UPDATE makes concurrent workers claim
+    each run at most once.
+    """
+    claimed_runs = []
+    for run_id in PayrollRun.objects.filter(status=PayrollRun.Status.QUEUED).order_by('created_at').values_list('id', flat=True):
+        current = timezone.now()
+        claimed = PayrollRun.objects.filter(id=run_id, status=PayrollRun.Status.QUEUED).update(
+            status=PayrollRun.Status.RUNNING,
+            started_at=current,
+            updated_at=current
+        )
+        if claimed:
+            claimed_runs.append(PayrollRun.objects.get(id=run_id))
+    return claimed_runs
+
+def execute_queued_payroll_runs(on_progress=None):
+    """
+    Recover stale runs, then claim and execute every queued run, grouping
+    runs queued with the same options so a range shares one worker pool.
+    Returns the executed runs.
+    """
+    expire_stale_payroll_runs()
+    runs_by_options = {}
+    for run in claim_queued_payroll_runs():
+        runs_by_options.setdefault((run.workers, run.by_department, run.engine), []).append(run)
+    executed_runs = []
+    for (workers, by_department, engine), runs in runs_by_options.items():
+        executed_runs += execute_payroll_runs(runs, workers, by_department, engine or None, on_progress)
+    return executed_runs
+
+def get_dirty_employee_ids(run, department_id=None):
+    # Các nhân viên có dữ liệu thay đổi trước khi lần chạy bắt đầu
+    dirty_marks = PayrollDirtyEmployee.objects.filter(
+        month=run.month,
+        year=run.year,
+        marked_at__lte=run.started_at
+    )
+    if department_id is not None:
+        dirty_marks = dirty_marks.filter(employee__department_id=department_id)
+    return list(dirty_marks.values_list('employee_id', flat=True))
+
+def reconcile_monthly_attendance(run):
+    """
+    Rebuild the MonthlyAttendance rollup the run reads from TimeSheet and
+    LeaveRequest before computing it: the whole month for a full run, the
+    dirty employees for an incremental run. Writes that skip the counter
+    signals (.update(), bulk imports, backfills) then cannot leave payroll
+    computed from stale counters; incremental runs rely on those writes
+    marking the employees dirty (record_timesheet_changes).
+    """
+    if not run.is_incremental:
+        return rebuild_monthly_attendance(run.month, run.year)
+    employee_ids = get_dirty_employee_ids(run)
+    if not employee_ids:
+        return 0
+    return rebuild_monthly_attendance(run.month, run.year, employee_ids)
+
+def calculate_payroll_shard(run, department_id=None, engine=None):
+    employee_ids = None
+    if run.is_incremental:
+        # Chỉ tính lại các nhân viên có dữ liệu thay đổi
+        employee_ids = get_dirty_employee_ids(run, department_id)
+        if not employee_ids:
+            return 0
+    return batch_calculate_monthly_salaries(run.month, run.year, employee_ids, engine, department_id)
+
+def execute_payroll_shard(run_id, department_id=None, engine=None):
+    """
+    Compute one (month, department) shard. Runs inside a worker process of
+    the payroll pool, so it must only take picklable arguments.
+    """
+    started = time.perf_counter()
+    run = PayrollRun.objects.get(id=run_id)
+    with transaction.atomic():
+        employee_count = calculate_payroll_shard(run, department_id, engine)
+    return {
+        'department_id': department_id,
+        'employee_count': employee_count,
+        'seconds': round(time.perf_counter() - started, 3),
+        'pid': os.getpid(),
+    }
+
+def init_payroll_worker():
+    # Tiến trình con (spawn) cần khởi tạo Django; mỗi worker mở kết nối DB riêng
+    django.setup()
+    connections.close_all()
+
+def record_payroll_shard(run, shard_result):
+    run.shards_done += 1
+    run.shard_timings.append(shard_result)
+    run.employee_count += shard_result.get('employee_count', 0)
+    if shard_result.get('error'):
+        run.error = append_to_note(run.error, shard_result['error'])
+
+    if run.shards_done >= run.shards_total:
+        if run.error:
+            run.status = PayrollRun.Status.FAILED
+        else:
+            run.status = PayrollRun.Status.SUCCESS
+            # Xóa các đánh dấu đã được xử lý trong lần chạy này
+            PayrollDirtyEmployee.objects.filter(
+                month=run.month,
+                year=run.year,
+                marked_at__lte=run.started_at
+            ).delete()
+        run.finished_at = timezone.now()
+    run.save(update_fields=[
+        'status', 'employee_count', 'shards_done', 'shard_timings', 'error', 'finished_at', 'updated_at'
+    ])
+
+def execute_payroll_runs(runs, workers=1, by_department=False, engine=None, on_progress=None):
+    """
+    Execute started payroll runs as (month, department) shards. With more
+    than one worker the shards run in a process pool, each worker using its
+    own DB connection. Progress and per-shard timings are saved on each run
+    as shards finish; on_progress(run, shard_result) is called after each.
+    """
+    department_ids = [None]
+    if by_department:
+        department_ids = list(Department.objects.order_by('id').values_list('id', flat=True)) or [None]
+    for run in runs:
+        with transaction.atomic():
+            # Bộ đếm có thể lệch nếu có lần ghi bỏ qua signal, tính lại trước khi chia shard
+            reconcile_monthly_attendance(run)
+        run.shards_total = len(department_ids)
+        run.save(update_fields=['shards_total', 'updated_at'])
+    shards = [(run, department_id) for run in runs for department_id in department_ids]
+
+    def handle_result(run, department_id, get_result):
+        try:
+            shard_result = get_result()
+        except Exception as error:
+            print("payroll_shard_error:", error)
+            shard_result = {'department_id': department_id, 'employee_count': 0, 'error': str(error)}
+        record_payroll_shard(run, shard_result)
+        if on_progress:
+            on_progress(run, shard_result)
+
+    if workers <= 1:
+        for run, department_id in shards:
+            handle_result(run, department_id, lambda: execute_payroll_shard(run.id, department_id, engine))
+        return runs
+
+    # Đóng kết nối trước khi fork để tiến trình con không dùng chung socket với tiến trình cha
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_payroll_worker) as executor:
+        futures = {
+            executor.submit(execute_payroll_shard, run.id, department_id, engine): (run, department_id)
+            for run, department_id in shards
+        }
+        for future in as_completed(futures):
+            run, department_id = futures[future]
+            handle_result(run, department_id, future.result)
+    return runs
+
+def execute_payroll_run(run, engine=None):
+    return execute_payroll_runs([run], engine=engine)[0]
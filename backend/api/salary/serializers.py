@@ -1,93 +1,96 @@
 from rest_framework import serializers
-from ..submodels.models_timesheet import SalaryRecord, TimeSheet, LeaveRequest, LeaveBalance, EmployeeEvaluation
+from ..submodels.models_timesheet import SalaryRecord, LeaveBalance, EmployeeEvaluation, MonthlyAttendance
+from ..submodels.models_payroll import PayrollRun
+from ..timesheet.counters import rebuild_monthly_attendance
 from django.utils.timezone import localtime, now
-from django.db.models import Sum, Q, F, DecimalField, Case, When, Value, ExpressionWrapper
-from django.db.models.functions import Coalesce, ExtractHour, ExtractMinute, Cast
-from datetime import datetime, timedelta
-from decimal import Decimal
-from dateutil.rrule import rrule, DAILY
+from django.db import transaction
+from django.db.models import Sum, Avg, Count, Q
+from django.core.cache import cache
+from django.conf import settings
+from datetime import date
+import calendar
+from decimal import Decimal, ROUND_HALF_UP
 
 
-def calculate_timesheet_summary():
+PAYROLL_ENGINE_DECIMAL = 'decimal'
+PAYROLL_ENGINE_NUMPY = 'numpy'
+PAYROLL_ENGINES = [PAYROLL_ENGINE_DECIMAL, PAYROLL_ENGINE_NUMPY]
+PAYROLL_BULK_UPDATE_BATCH_SIZE = 1000
+SALARY_RECORD_PAYROLL_FIELDS = [
+    'base_salary',
+    'overtime_pay',
+    'attendance_bonus',
+    'other_bonus',
+    'gross_salary',
+    'note',
+    'updated_at'
+]
+PAYROLL_DIFF_FIELDS = [
+    'base_salary',
+    'overtime_pay',
+    'attendance_bonus',
+    'other_bonus',
+    'gross_salary',
+    'note'
+]
+ANNUAL_BONUS_NOTE = "thưởng phép năm 1500000"
+ANNUAL_BONUS_CUT_NOTE = "cắt thưởng phép năm"
+YEAR_END_NOTES = [ANNUAL_BONUS_NOTE, ANNUAL_BONUS_CUT_NOTE]
+
+
+def get_payroll_period(month, year):
+    # Tháng hiện tại tính tới hôm nay, các tháng trước tính trọn tháng
+    start_of_month = date(year, month, 1)
+    _, last_day_num = calendar.monthrange(year, month)
+    end_of_month = date(year, month, last_day_num)
     current_date = localtime(now()).date()
-    start_of_month = current_date.replace(day=1)
-    
-    # Tổng hợp TimeSheet theo nhân viên
-    timesheet_summary = TimeSheet.objects.filter(
+    return start_of_month, min(end_of_month, current_date)
+
+def filter_payroll_employees(queryset, employee_ids=None, department_id=None):
+    # Chỉ tính lại cho các nhân viên / phòng ban được chỉ định (payroll incremental, shard)
+    if employee_ids is not None:
+        queryset = queryset.filter(employee_id__in=employee_ids)
+    if department_id is not None:
+        queryset = queryset.filter(employee__department_id=department_id)
+    return queryset
+
+def calculate_timesheet_summary(month, year, employee_ids=None, department_id=None):
+    """
+    Per-employee worked minutes and overtime hours of the month, read from
+    the MonthlyAttendance rollup instead of re-scanning TimeSheet. Only
+    employees who attended at least one shift or overtime are returned.
+    """
+    attendances = MonthlyAttendance.objects.filter(
         Q(employee__is_active=True) &
-        Q(date__range=(start_of_month, current_date)) &
-        (Q(status=TimeSheet.Status.PRESENT) |
-        Q(status=TimeSheet.Status.EARLY_LEAVE))
-    ).values('employee').annotate(
-        total_regular_hours=Coalesce(
-            Sum(
-                Case(
-                    When(
-                        check_in_time__isnull=False,
-                        check_out_time__isnull=False,
-                        shift__isnull=False,
-                        then=ExpressionWrapper(
-                            (
-                                Cast(
-                                    ExpressionWrapper(
-                                        ExtractHour(F('check_out_time')) * 60 + 
-                                        ExtractMinute(F('check_out_time')) -
-                                        (ExtractHour(F('check_in_time')) * 60 + 
-                                        ExtractMinute(F('check_in_time'))),
-                                        output_field=DecimalField(max_digits=10, decimal_places=2)
-                                    ),
-                                    DecimalField(max_digits=10, decimal_places=2)
-                                ) / 60.0
-                            ),
-                            output_field=DecimalField(max_digits=10, decimal_places=2)
-                        )
-                    ),
-                    default=Value(Decimal('0.00'))
-                )
-            ),
-            Decimal('0.00'),
-            output_field=DecimalField(max_digits=10, decimal_places=2)
-        ),
-        total_overtime_hours=Coalesce(
-            Sum('overtime_hours'),
-            Decimal('0.00'),
-            output_field=DecimalField(max_digits=10, decimal_places=2)
-        )
+        Q(month=month) & Q(year=year) &
+        (Q(present_count__gt=0) | Q(overtime_minutes__gt=0))
     )
+    attendances = filter_payroll_employees(attendances, employee_ids, department_id)
 
-    return timesheet_summary
+    return [
+        {
+            'employee': employee_id,
+            # Số phút làm việc đã lưu lúc check-out (trừ giờ nghỉ, làm tròn 2 chữ số thập phân)
+            'total_regular_minutes': worked_minutes,
+            'total_overtime_hours': (overtime_minutes / 60).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        }
+        for employee_id, worked_minutes, overtime_minutes in attendances.values_list(
+            'employee_id', 'worked_minutes', 'overtime_minutes'
+        )
+    ]
 
-def get_leave_days_detailed(employee_id):
-    current_date = localtime(now()).date()
-    start_of_month = current_date.replace(day=1)
-    end_of_month = (start_of_month + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-    leave_requests = LeaveRequest.objects.filter(
-        Q(employee_id=employee_id) &
-        Q(status=LeaveRequest.Status.APPROVED) &
-        Q(from_date__lte=end_of_month) & Q(to_date__gte=start_of_month)
-    )
-    
-    weekdays_count = 0
-    saturday_count = 0
-    leave_days = 0
-    
-    for leave_request in leave_requests:
-        # Xác định ngày bắt đầu và kết thúc trong khoảng tháng hiện tại
-        start_date = max(leave_request.from_date, start_of_month)
-        end_date = min(leave_request.to_date, end_of_month)
-        
-        # Lặp qua từng ngày trong khoảng thời gian này
-        for single_date in rrule(DAILY, dtstart=start_date, until=end_date):
-            weekday = single_date.weekday()
-            if weekday == 6:
-                continue
-            elif weekday == 5:
-                saturday_count += 1
-            else:
-                weekdays_count += 1
-    
-    leave_days += weekdays_count + saturday_count / 2
-    return leave_days
+def get_leave_days_by_employee(month, year, employee_ids=None, department_id=None):
+    # Số ngày phép đã duyệt trong tháng, lấy từ MonthlyAttendance
+    attendances = MonthlyAttendance.objects.filter(month=month, year=year, leave_days__gt=0)
+    attendances = filter_payroll_employees(attendances, employee_ids, department_id)
+    return dict(attendances.values_list('employee_id', 'leave_days'))
+
+def get_leave_days_detailed(employee_id, month, year):
+    return get_leave_days_by_employee(month, year, [employee_id]).get(employee_id, 0)
+
+def round_to_cents(amount):
+    # Làm tròn như cột numeric(…, 2) của Postgres khi lưu (half-up với số dương)
+    return amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
 def append_to_note(current: str | None, new_content: str) -> str:
     if not current:
@@ -96,35 +99,73 @@ def append_to_note(current: str | None, new_content: str) -> str:
         current += f", {new_content}"
     return current
 
-def batch_calculate_monthly_salaries():
-    current_date = localtime(now()).date()
-    timesheet_summary = calculate_timesheet_summary()
-    
-    # Lấy tất cả SalaryRecord trong tháng hiện tại
-    salary_records = SalaryRecord.objects.filter(
-        month=current_date.month,
-        year=current_date.year
-    ).select_related('employee__position')
+def set_year_end_note(current: str | None, new_content: str) -> str:
+    # Bỏ ghi chú phép năm của lần chạy trước rồi mới thêm, để chạy lại lương không bị cộng dồn ghi chú
+    parts = [part for part in (current or '').split(', ') if part and part not in YEAR_END_NOTES]
+    return append_to_note(', '.join(parts), new_content)
+
+def load_payroll_inputs(month, year, employee_ids=None, department_id=None):
+    """
+    Fetch everything the payroll pass needs in a fixed number of queries,
+    keyed by employee id, so the calculation itself never touches the DB.
+    """
+    _, end_of_period = get_payroll_period(month, year)
+    # Thưởng phép năm được tính khi kỳ lương tháng 12 kết thúc vào ngày 31
+    is_year_end = month == 12 and end_of_period.day == 31
+    payroll_inputs = {
+        'end_of_period': end_of_period,
+        'timesheet_summary': list(calculate_timesheet_summary(month, year, employee_ids, department_id)),
+        'salary_records': {},
+        'employee_evaluations': {},
+        'leave_days': {},
+        'used_leaves': {},
+        'is_year_end': is_year_end,
+    }
+    if not payroll_inputs['timesheet_summary']:
+        return payroll_inputs
 
-    # Lấy tất cả EmployeeEvaluation trong tháng hiện tại
+    # Lấy tất cả SalaryRecord, EmployeeEvaluation trong tháng
+    salary_records = SalaryRecord.objects.filter(
+        month=month,
+        year=year
+    ).select_related('employee__position', 'employee__department')
     employee_evaluations = EmployeeEvaluation.objects.filter(
-        month=current_date.month,
-        year=current_date.year
+        month=month,
+        year=year
     )
-    
+    leave_balances = LeaveBalance.objects.filter(year=year)
+    salary_records = filter_payroll_employees(salary_records, employee_ids, department_id)
+    employee_evaluations = filter_payroll_employees(employee_evaluations, employee_ids, department_id)
+    leave_balances = filter_payroll_employees(leave_balances, employee_ids, department_id)
+
+    payroll_inputs['salary_records'] = {record.employee_id: record for record in salary_records}
+    payroll_inputs['employee_evaluations'] = {
+        evaluation.employee_id: evaluation for evaluation in employee_evaluations
+    }
+    payroll_inputs['leave_days'] = get_leave_days_by_employee(month, year, employee_ids, department_id)
+    if is_year_end:
+        # Số ngày phép đã dùng, chỉ cần cho thưởng phép năm
+        payroll_inputs['used_leaves'] = dict(leave_balances.values_list('employee_id', 'used_leaves'))
+    return payroll_inputs
+
+def calculate_monthly_salaries(payroll_inputs):
+    updated_salary_records = []
+    updated_employee_evaluations = []
+
     # Tính lương từng nhân viên
-    for summary in timesheet_summary:
+    for summary in payroll_inputs['timesheet_summary']:
         employee_id = summary['employee']
-        total_regular_hours = Decimal(str(summary['total_regular_hours']))
+        total_regular_minutes = Decimal(str(summary['total_regular_minutes']))
+        total_regular_hours = total_regular_minutes / 60
         total_overtime_hours = Decimal(str(summary['total_overtime_hours']))
 
         # Lấy EmployeeEvaluation cho nhân viên hiện tại
-        employee_evaluation = employee_evaluations.filter(employee_id=employee_id).first()
+        employee_evaluation = payroll_inputs['employee_evaluations'].get(employee_id)
         if not employee_evaluation:
             continue
         
         # Lấy SalaryRecord cho nhân viên hiện tại
-        salary_record = salary_records.filter(employee_id=employee_id).first()
+        salary_record = payroll_inputs['salary_records'].get(employee_id)
         if not salary_record:
             continue
         
@@ -144,13 +185,14 @@ def batch_calculate_monthly_salaries():
         # Tính lương cơ bản
         if total_regular_hours < Decimal('192.00'):
             employee_evaluation.content = "Chưa tốt"
-            regular_pay = position.salary_insufficient_work * total_regular_hours
+            regular_pay = position.salary_insufficient_work * total_regular_minutes / 60
         else:
-            regular_pay = position.salary_base * total_regular_hours
+            regular_pay = position.salary_base * total_regular_minutes / 60
             employee_evaluation.content = "Tốt"
         
-        leave_pay = Decimal(get_leave_days_detailed(employee_id)) * Decimal('8.00') * position.salary_base * Decimal('0.85')
-        salary_record.base_salary = regular_pay + leave_pay
+        leave_days = payroll_inputs['leave_days'].get(employee_id, 0)
+        leave_pay = Decimal(leave_days) * Decimal('8.00') * position.salary_base * Decimal('0.85')
+        salary_record.base_salary = round_to_cents(regular_pay + leave_pay)
         
         # Tính thưởng chuyên cần
         if (total_regular_hours + total_overtime_hours) > Decimal('200.00'):
@@ -160,32 +202,199 @@ def batch_calculate_monthly_salaries():
         
         # Tính lương overtime
         overtime_pay = position.salary_overtime * total_overtime_hours
-        salary_record.overtime_pay = overtime_pay
+        salary_record.overtime_pay = round_to_cents(overtime_pay)
 
         # Tính thưởng phép năm
-        if current_date.day == 31 and current_date.month == 12:
-            leave_balance = LeaveBalance.objects.filter(
-                employee_id=employee_id,
-                year=current_date.year
-            ).first()
-            if leave_balance.used_leaves <= 6:
+        if payroll_inputs['is_year_end']:
+            if payroll_inputs['used_leaves'].get(employee_id, 0) <= 6:
                 annual_pay = Decimal('1500000.00')
                 salary_record.other_bonus = annual_pay
-                note = append_to_note(note, "thưởng phép năm 1500000")
+                note = set_year_end_note(note, ANNUAL_BONUS_NOTE)
                 salary_record.note = note
             else:
-                note = append_to_note(note, "cắt thưởng phép năm")
+                note = set_year_end_note(note, ANNUAL_BONUS_CUT_NOTE)
                 salary_record.note = note
         
-        # Tổng lương
+        # Tổng lương: cộng các khoản chưa làm tròn rồi mới làm tròn một lần, như khi DecimalField làm tròn lúc lưu
         gross_salary = regular_pay + overtime_pay + attendance_pay + leave_pay + annual_pay
-        salary_record.gross_salary = gross_salary
-        
-        # Lưu SalaryRecord
-        salary_record.save()
+        salary_record.gross_salary = round_to_cents(gross_salary)
+
+        updated_salary_records.append(salary_record)
+        updated_employee_evaluations.append(employee_evaluation)
+
+    return updated_salary_records, updated_employee_evaluations
 
-        # Lưu EmployeeEvaluation
-        employee_evaluation.save()
+def save_monthly_salaries(salary_records, employee_evaluations):
+    updated_at = now()
+    for salary_record in salary_records:
+        salary_record.updated_at = updated_at
+    for employee_evaluation in employee_evaluations:
+        employee_evaluation.updated_at = updated_at
+
+    with transaction.atomic():
+        SalaryRecord.objects.bulk_update(
+            salary_records,
+            SALARY_RECORD_PAYROLL_FIELDS,
+            batch_size=PAYROLL_BULK_UPDATE_BATCH_SIZE
+        )
+        EmployeeEvaluation.objects.bulk_update(
+            employee_evaluations,
+            ['content', 'updated_at'],
+            batch_size=PAYROLL_BULK_UPDATE_BATCH_SIZE
+        )
+
+def get_payroll_engine(engine=None):
+    engine = engine or settings.PAYROLL_ENGINE
+    if engine == PAYROLL_ENGINE_NUMPY:
+        from .vectorized import calculate_monthly_salaries_vectorized
+        return calculate_monthly_salaries_vectorized
+    if engine == PAYROLL_ENGINE_DECIMAL:
+        return calculate_monthly_salaries
+    raise ValueError(f"Unknown payroll engine: {engine}")
+
+def batch_calculate_monthly_salaries(month, year, employee_ids=None, engine=None, department_id=None):
+    calculate = get_payroll_engine(engine)
+    payroll_inputs = load_payroll_inputs(month, year, employee_ids, department_id)
+    salary_records, employee_evaluations = calculate(payroll_inputs)
+    save_monthly_salaries(salary_records, employee_evaluations)
+    invalidate_department_salary_summary(month, year)
+    return len(salary_records)
+
+def format_money(value):
+    # Tổng/trung bình từ DB có thể là Decimal, float hoặc None tùy backend
+    return str(round_to_cents(Decimal(str(value or 0))))
+
+def department_salary_summary_cache_key(month, year):
+    return f"department_salary_summary:{year}:{month}"
+
+def invalidate_department_salary_summary(month, year):
+    cache.delete(department_salary_summary_cache_key(month, year))
+
+def get_department_salary_summary(month, year):
+    """
+    Per-department headcount, totals and averages for a month, computed as
+    one grouped aggregate and cached until payroll writes the month again.
+    """
+    cache_key = department_salary_summary_cache_key(month, year)
+    summary = cache.get(cache_key)
+    if summary is not None:
+        return summary
+
+    rows = SalaryRecord.objects.filter(
+        month=month,
+        year=year,
+        employee__is_active=True
+    ).values(
+        'employee__department_id',
+        'employee__department__name'
+    ).annotate(
+        headcount=Count('id'),
+        total_base_salary=Sum('base_salary'),
+        total_overtime_pay=Sum('overtime_pay'),
+        total_attendance_bonus=Sum('attendance_bonus'),
+        total_other_bonus=Sum('other_bonus'),
+        total_gross_salary=Sum('gross_salary'),
+        average_base_salary=Avg('base_salary'),
+        average_gross_salary=Avg('gross_salary')
+    ).order_by('employee__department__name')
+
+    summary = []
+    for row in rows:
+        summary.append({
+            'department': {
+                'id': row['employee__department_id'],
+                'name': row['employee__department__name'],
+            },
+            'headcount': row['headcount'],
+            'total_base_salary': format_money(row['total_base_salary']),
+            'total_overtime_pay': format_money(row['total_overtime_pay']),
+            'total_attendance_bonus': format_money(row['total_attendance_bonus']),
+            'total_other_bonus': format_money(row['total_other_bonus']),
+            'total_gross_salary': format_money(row['total_gross_salary']),
+            'average_base_salary': format_money(row['average_base_salary']),
+            'average_gross_salary': format_money(row['average_gross_salary']),
+        })
+    cache.set(cache_key, summary, settings.SALARY_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+def str_or_none(value):
+    return None if value is None else str(value)
+
+def snapshot_payroll_results(payroll_inputs):
+    # Giá trị đang lưu trong DB, lấy trước khi engine ghi đè lên các instance
+    snapshot = {}
+    for employee_id, salary_record in payroll_inputs['salary_records'].items():
+        employee_evaluation = payroll_inputs['employee_evaluations'].get(employee_id)
+        values = {field: getattr(salary_record, field) for field in PAYROLL_DIFF_FIELDS}
+        values['evaluation'] = employee_evaluation.content if employee_evaluation else None
+        snapshot[employee_id] = values
+    return snapshot
+
+def diff_monthly_salaries(month, year, employee_ids=None, engine=None, department_id=None):
+    """
+    Dry run: compute payroll from the same batched inputs as a real run and
+    return what would change, without writing anything. The MonthlyAttendance
+    rollup is rebuilt first, like a real run does, inside a transaction that
+    is rolled back afterwards.
+    """
+    calculate = get_payroll_engine(engine)
+    with transaction.atomic():
+        rebuild_monthly_attendance(month, year, employee_ids)
+        payroll_inputs = load_payroll_inputs(month, year, employee_ids, department_id)
+        stored = snapshot_payroll_results(payroll_inputs)
+        salary_records, employee_evaluations = calculate(payroll_inputs)
+        transaction.set_rollback(True)
+
+    changes = []
+    departments = {}
+    for salary_record, employee_evaluation in zip(salary_records, employee_evaluations):
+        employee = salary_record.employee
+        old_values = stored[employee.id]
+        new_values = {field: getattr(salary_record, field) for field in PAYROLL_DIFF_FIELDS}
+        new_values['evaluation'] = employee_evaluation.content
+        changed_fields = {
+            field: {'old': str_or_none(old_values[field]), 'new': str_or_none(value)}
+            for field, value in new_values.items()
+            if old_values[field] != value
+        }
+
+        totals = departments.setdefault(employee.department.name, {
+            'department': employee.department.name,
+            'employee_count': 0,
+            'changed_count': 0,
+            'old_gross_salary': Decimal('0.00'),
+            'new_gross_salary': Decimal('0.00'),
+        })
+        totals['employee_count'] += 1
+        totals['old_gross_salary'] += old_values['gross_salary']
+        totals['new_gross_salary'] += new_values['gross_salary']
+        if changed_fields:
+            totals['changed_count'] += 1
+            changes.append({
+                'employee': {
+                    'id': employee.id,
+                    'employee_id': employee.employee_id,
+                    'full_name': employee.full_name,
+                    'department': employee.department.name,
+                },
+                'changes': changed_fields,
+            })
+
+    department_totals = []
+    for totals in sorted(departments.values(), key=lambda totals: totals['department']):
+        totals['difference'] = str(totals['new_gross_salary'] - totals['old_gross_salary'])
+        totals['old_gross_salary'] = str(totals['old_gross_salary'])
+        totals['new_gross_salary'] = str(totals['new_gross_salary'])
+        department_totals.append(totals)
+
+    return {
+        'month': month,
+        'year': year,
+        'employee_count': len(salary_records),
+        'changed_count': len(changes),
+        'departments': department_totals,
+        'changes': changes,
+    }
 
 
 class SalaryRecordForManagerSerializer(serializers.ModelSerializer):
@@ -213,3 +422,34 @@ class SalaryRecordForManagerSerializer(serializers.ModelSerializer):
         data['department'] = obj.employee.department.name
         data['full_name'] = obj.employee.full_name
         return data
+
+class PayrollRunSerializer(serializers.ModelSerializer):
+    triggered_by = serializers.SerializerMethodField()
+    duration = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PayrollRun
+        fields = [
+            'id',
+            'month',
+            'year',
+            'status',
+            'triggered_by',
+            'started_at',
+            'finished_at',
+            'duration',
+            'is_incremental',
+            'employee_count',
+            'shards_total',
+            'shards_done',
+            'shard_timings',
+            'error'
+        ]
+
+    def get_triggered_by(self, obj):
+        if obj.triggered_by:
+            return obj.triggered_by.username
+        return None
+
+    def get_duration(self, obj):
+        return obj.duration
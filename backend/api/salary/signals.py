@@ -1,30 +1,103 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from decimal import Decimal
-from ..submodels.models_timesheet import TimeSheet, SalaryRecord, EmployeeEvaluation
+from ..submodels.models_employee import Employee, Position
+from ..submodels.models_timesheet import TimeSheet, SalaryRecord, EmployeeEvaluation, LeaveRequest, LeaveBalance
+from .payroll import mark_payroll_dirty, months_between, ensure_monthly_records, forget_monthly_record, get_open_payroll_months
+from .serializers import invalidate_department_salary_summary
 
 @receiver(post_save, sender=TimeSheet)
 def create_monthly_record(sender, instance, created, **kwargs):
     if not instance.date:
         return
-        
-    month = instance.date.month
-    year = instance.date.year
-    
-    SalaryRecord.objects.get_or_create(
-        employee=instance.employee,
-        month=month,
-        year=year,
-        defaults={
-            'base_salary': Decimal('0.00'),
-            'overtime_pay': Decimal('0.00'),
-            'attendance_bonus': Decimal('0.00'),
-            'gross_salary': Decimal('0.00')
-        }
-    )
-
-    EmployeeEvaluation.objects.get_or_create(
-        employee=instance.employee,
-        month=month,
-        year=year
-    )
+    # Bảng lương tháng đã được tạo sẵn khi mở tháng (open_month), thường không cần truy vấn
+    ensure_monthly_records({(instance.employee_id, instance.date.month, instance.date.year)})
+
+@receiver(post_save, sender=SalaryRecord)
+@receiver(post_delete, sender=SalaryRecord)
+def invalidate_salary_summary(sender, instance, **kwargs):
+    # Thêm/xóa bảng lương làm thay đổi số nhân viên của tổng hợp theo phòng ban
+    invalidate_department_salary_summary(instance.month, instance.year)
+
+@receiver(post_delete, sender=SalaryRecord)
+@receiver(post_delete, sender=EmployeeEvaluation)
+def forget_deleted_monthly_record(sender, instance, **kwargs):
+    forget_monthly_record(instance.employee_id, instance.month, instance.year)
+
+
+# ============================================ Payroll dirty tracking ===============================================
+@receiver(post_save, sender=TimeSheet)
+@receiver(post_delete, sender=TimeSheet)
+def mark_timesheet_payroll_dirty(sender, instance, **kwargs):
+    if not instance.date:
+        return
+    mark_payroll_dirty([instance.employee_id], instance.date.month, instance.date.year)
+
+def leave_request_months(employee_id, from_date, to_date):
+    if not (employee_id and from_date and to_date):
+        return set()
+    return {(employee_id, month, year) for month, year in months_between(from_date, to_date)}
+
+def mark_employee_months_dirty(employee_months):
+    employees_by_month = {}
+    for employee_id, month, year in employee_months:
+        employees_by_month.setdefault((month, year), []).append(employee_id)
+    for (month, year), employee_ids in employees_by_month.items():
+        mark_payroll_dirty(employee_ids, month, year)
+
+@receiver(pre_save, sender=LeaveRequest)
+def remember_old_leave_request_months(sender, instance, **kwargs):
+    # Đơn đổi ngày/nhân viên: các tháng cũ cũng phải tính lại lương
+    instance._old_payroll_months = set()
+    if not instance.pk:
+        return
+    old_row = LeaveRequest.objects.filter(pk=instance.pk).values_list('employee_id', 'from_date', 'to_date').first()
+    if old_row:
+        instance._old_payroll_months = leave_request_months(*old_row)
+
+@receiver(post_save, sender=LeaveRequest)
+@receiver(post_delete, sender=LeaveRequest)
+def mark_leave_request_payroll_dirty(sender, instance, **kwargs):
+    employee_months = leave_request_months(instance.employee_id, instance.from_date, instance.to_date)
+    mark_employee_months_dirty(employee_months | getattr(instance, '_old_payroll_months', set()))
+
+@receiver(post_save, sender=LeaveBalance)
+def mark_leave_balance_payroll_dirty(sender, instance, **kwargs):
+    # Số ngày phép đã dùng chỉ ảnh hưởng thưởng phép năm (tháng 12)
+    mark_payroll_dirty([instance.employee_id], 12, instance.year)
+
+@receiver(pre_save, sender=Position)
+def detect_position_rate_change(sender, instance, **kwargs):
+    instance._rates_changed = False
+    if not instance.pk:
+        return
+    old_rates = Position.objects.filter(pk=instance.pk).values(
+        'salary_base', 'salary_insufficient_work', 'salary_overtime', 'attendance_bonus'
+    ).first()
+    if old_rates:
+        instance._rates_changed = any(
+            Decimal(str(getattr(instance, field))) != old_value
+            for field, old_value in old_rates.items()
+        )
+
+@receiver(post_save, sender=Position)
+def mark_position_payroll_dirty(sender, instance, created, **kwargs):
+    if not getattr(instance, '_rates_changed', False):
+        return
+    employee_ids = list(Employee.objects.filter(
+        position=instance,
+        is_active=True
+    ).values_list('id', flat=True))
+    # Mức lương mới áp dụng cho mọi tháng lương còn mở
+    for month, year in get_open_payroll_months():
+        mark_payroll_dirty(employee_ids, month, year)
+
+@receiver(pre_save, sender=Employee)
+def mark_employee_position_payroll_dirty(sender, instance, **kwargs):
+    # Nhân viên đổi vị trí thì mức lương áp dụng cũng thay đổi
+    if not instance.pk:
+        return
+    old_position_id = Employee.objects.filter(pk=instance.pk).values_list('position_id', flat=True).first()
+    if old_position_id is not None and old_position_id != instance.position_id:
+        for month, year in get_open_payroll_months():
+            mark_payroll_dirty([instance.pk], month, year)
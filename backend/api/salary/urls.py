@@ -4,7 +4,31 @@ from .views import *
 get_current_month_salary_records = MonthlySalaryRecordForManagerMVS.as_view({
     'get': 'get_current_month_salary_records'
 })
+export_salary_records = MonthlySalaryRecordForManagerMVS.as_view({
+    'get': 'export_salary_records'
+})
+get_department_salary_summary = MonthlySalaryRecordForManagerMVS.as_view({
+    'get': 'get_department_salary_summary'
+})
+run_payroll = PayrollRunMVS.as_view({
+    'post': 'run_payroll'
+})
+run_payroll_range = PayrollRunMVS.as_view({
+    'post': 'run_payroll_range'
+})
+payroll_dry_run = PayrollRunMVS.as_view({
+    'get': 'payroll_dry_run'
+})
+get_payroll_runs = PayrollRunMVS.as_view({
+    'get': 'get_payroll_runs'
+})
 
 urlpatterns = [
     path('get_current_month_salary_records/', get_current_month_salary_records, name='get_current_month_salary_records'),
+    path('export_salary_records/', export_salary_records, name='export_salary_records'),
+    path('get_department_salary_summary/', get_department_salary_summary, name='get_department_salary_summary'),
+    path('run_payroll/', run_payroll, name='run_payroll'),
+    path('run_payroll_range/', run_payroll_range, name='run_payroll_range'),
+    path('payroll_dry_run/', payroll_dry_run, name='payroll_dry_run'),
+    path('get_payroll_runs/', get_payroll_runs, name='get_payroll_runs'),
 ]
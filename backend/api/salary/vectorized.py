@@ -0,0 +1,146 @@
+import numpy as np
+from decimal import Decimal
+from .serializers import set_year_end_note, ANNUAL_BONUS_NOTE, ANNUAL_BONUS_CUT_NOTE
+
+
+# Các ngưỡng của quy tắc tính lương, quy đổi ra số nguyên
+INSUFFICIENT_WORK_CENTIMINUTES = 192 * 60 * 100
+# (giờ làm + giờ overtime) > 200 <=> phút làm * 100 + 60 * (giờ overtime * 100) > 200 * 6000
+ATTENDANCE_BONUS_THRESHOLD = 200 * 6000
+ANNUAL_LEAVE_LIMIT = 6
+ANNUAL_BONUS_CENTS = 150000000
+ANNUAL_BONUS = Decimal('1500000.00')
+
+
+def to_cents(amounts, count):
+    return np.fromiter((int(amount * 100) for amount in amounts), dtype=np.int64, count=count)
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+def divide_half_up(numerator, denominator):
+    # Chia số nguyên không âm, làm tròn half-up giống round_to_cents
+    return (2 * numerator + denominator) // (2 * denominator)
+
+def calculate_monthly_salaries_vectorized(payroll_inputs):
+    """
+    NumPy implementation of calculate_monthly_salaries. Money is handled as
+    int64 cents and hours as hundredths of a minute / of an hour; the pay
+    components are kept exact over a common denominator and each stored
+    amount is rounded once, so the results match the Decimal engine to the
+    cent.
+    """
+    salary_records = []
+    employee_evaluations = []
+    summaries = []
+    for summary in payroll_inputs['timesheet_summary']:
+        employee_id = summary['employee']
+        employee_evaluation = payroll_inputs['employee_evaluations'].get(employee_id)
+        salary_record = payroll_inputs['salary_records'].get(employee_id)
+        if not employee_evaluation or not salary_record:
+            continue
+        summaries.append(summary)
+        salary_records.append(salary_record)
+        employee_evaluations.append(employee_evaluation)
+
+    count = len(summaries)
+    if not count:
+        return [], []
+
+    employee_ids = [summary['employee'] for summary in summaries]
+
+    # Bảng lương theo Position (ít dòng), mỗi nhân viên chỉ giữ chỉ số vào bảng
+    position_indexes = {}
+    positions = []
+    employee_position_indexes = np.empty(count, dtype=np.int64)
+    for index, salary_record in enumerate(salary_records):
+        employee = salary_record.employee
+        if employee.position_id not in position_indexes:
+            position_indexes[employee.position_id] = len(positions)
+            positions.append(employee.position)
+        employee_position_indexes[index] = position_indexes[employee.position_id]
+    position_count = len(positions)
+    salary_base = to_cents((position.salary_base for position in positions), position_count)[employee_position_indexes]
+    salary_insufficient_work = to_cents(
+        (position.salary_insufficient_work for position in positions), position_count
+    )[employee_position_indexes]
+    salary_overtime = to_cents((position.salary_overtime for position in positions), position_count)[employee_position_indexes]
+    attendance_bonus = to_cents((position.attendance_bonus for position in positions), position_count)[employee_position_indexes]
+
+    # Nạp dữ liệu vào mảng
+    regular_centiminutes = to_cents((summary['total_regular_minutes'] for summary in summaries), count)
+    overtime_centihours = to_cents((summary['total_overtime_hours'] for summary in summaries), count)
+    leave_days = payroll_inputs['leave_days']
+    leave_half_days = np.fromiter(
+        (int(leave_days.get(employee_id, 0) * 2) for employee_id in employee_ids),
+        dtype=np.int64,
+        count=count
+    )
+
+    # Tính lương cơ bản
+    insufficient_work = regular_centiminutes < INSUFFICIENT_WORK_CENTIMINUTES
+    regular_rate = np.where(insufficient_work, salary_insufficient_work, salary_base)
+    # Các khoản tính theo đơn vị 1/6000 cent để cộng chính xác trước khi làm tròn
+    regular_amount = regular_rate * regular_centiminutes
+    # ngày phép * 8 giờ * lương cơ bản * 0.85 = nửa ngày * lương cơ bản * 34 / 10
+    leave_amount = leave_half_days * salary_base * 34 * 600
+
+    # Tính thưởng chuyên cần
+    excellent = regular_centiminutes + 60 * overtime_centihours > ATTENDANCE_BONUS_THRESHOLD
+    attendance_pay = np.where(excellent, attendance_bonus, 0)
+
+    # Tính lương overtime
+    overtime_amount = salary_overtime * overtime_centihours * 60
+
+    # Tính thưởng phép năm
+    annual_pay = np.zeros(count, dtype=np.int64)
+    annual_bonus = np.zeros(count, dtype=bool)
+    if payroll_inputs['is_year_end']:
+        used_leaves = np.fromiter(
+            (payroll_inputs['used_leaves'].get(employee_id, 0) for employee_id in employee_ids),
+            dtype=np.int64,
+            count=count
+        )
+        annual_bonus = used_leaves <= ANNUAL_LEAVE_LIMIT
+        annual_pay = np.where(annual_bonus, ANNUAL_BONUS_CENTS, 0)
+
+    # Mỗi khoản được lưu làm tròn một lần, tổng lương cộng từ các khoản chưa làm tròn
+    base_salary = divide_half_up(regular_amount + leave_amount, 6000)
+    overtime_pay = divide_half_up(overtime_amount, 6000)
+    gross_salary = divide_half_up(regular_amount + leave_amount + overtime_amount + (attendance_pay + annual_pay) * 6000, 6000)
+
+    # Ghi kết quả về model (chuyển mảng về list Python để duyệt nhanh)
+    is_year_end = payroll_inputs['is_year_end']
+    rows = zip(
+        salary_records,
+        employee_evaluations,
+        excellent.tolist(),
+        insufficient_work.tolist(),
+        annual_bonus.tolist(),
+        attendance_pay.tolist(),
+        base_salary.tolist(),
+        overtime_pay.tolist(),
+        gross_salary.tolist()
+    )
+    for salary_record, employee_evaluation, is_excellent, is_insufficient, has_annual_bonus, \
+            attendance_cents, base_cents, overtime_cents, gross_cents in rows:
+        if is_excellent:
+            employee_evaluation.content = "Tuyệt vời"
+            salary_record.attendance_bonus = from_cents(attendance_cents)
+        elif is_insufficient:
+            employee_evaluation.content = "Chưa tốt"
+        else:
+            employee_evaluation.content = "Tốt"
+
+        if is_year_end:
+            if has_annual_bonus:
+                salary_record.other_bonus = ANNUAL_BONUS
+                salary_record.note = set_year_end_note(salary_record.note, ANNUAL_BONUS_NOTE)
+            else:
+                salary_record.note = set_year_end_note(salary_record.note, ANNUAL_BONUS_CUT_NOTE)
+
+        salary_record.base_salary = from_cents(base_cents)
+        salary_record.overtime_pay = from_cents(overtime_cents)
+        salary_record.gross_salary = from_cents(gross_cents)
+
+    return salary_records, employee_evaluations
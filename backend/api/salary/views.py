@@ -5,12 +5,21 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
 from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.conf import settings
 from ..submodels.models_timesheet import *
 from ..submodels.models_employee import Employee, Department
+from ..submodels.models_payroll import PayrollRun
 from .serializers import *
+from .export import EXPORT_FILE_TYPES, EXPORT_CONTENT_TYPES, get_salary_export_rows, stream_salary_export
+from .payroll import (
+    PayrollRunInProgress,
+    months_between,
+    queue_payroll_runs
+)
 from ..permissions import IsManager, IsEmployee
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from calendar import monthrange
 
@@ -47,14 +56,13 @@ class MonthlySalaryRecordForManagerMVS(viewsets.ModelViewSet):
     @action(methods=['GET'], detail=False, url_path='get_current_month_salary_records', url_name='get_current_month_salary_records')
     def get_current_month_salary_records(self, request):
         try:
-            batch_calculate_monthly_salaries()
             department = request.query_params.get('department')
             month = request.query_params.get('month')
             year = request.query_params.get('year')
 
             salary_records = SalaryRecord.objects.filter(
                 employee__is_active=True
-            ).order_by('employee__employee_id')
+            ).select_related('employee__department').order_by('employee__employee_id')
             if department:
                 department = Department.objects.get(name=department)
                 salary_records = salary_records.filter(employee__department=department)
@@ -71,3 +79,143 @@ class MonthlySalaryRecordForManagerMVS(viewsets.ModelViewSet):
         except Exception as error:
             print("error_get_monthly_salary_for_manager:", error)
             return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=False, url_path='export_salary_records', url_name='export_salary_records')
+    def export_salary_records(self, request):
+        try:
+            department = request.query_params.get('department')
+            month = request.query_params.get('month')
+            year = request.query_params.get('year')
+            # Không dùng tham số 'format' vì DRF dành riêng cho content negotiation
+            file_type = request.query_params.get('file_type', 'csv').lower()
+            if file_type not in EXPORT_FILE_TYPES:
+                return Response({"error": f"file_type must be one of {EXPORT_FILE_TYPES}."}, status=status.HTTP_400_BAD_REQUEST)
+
+            if department:
+                department = Department.objects.get(name=department)
+            rows = get_salary_export_rows(month, year, department)
+
+            file_name = f"salary_{year}_{month}" if month and year else "salary"
+            response = StreamingHttpResponse(
+                stream_salary_export(rows, file_type),
+                content_type=EXPORT_CONTENT_TYPES[file_type]
+            )
+            response['Content-Disposition'] = f'attachment; filename="{file_name}.{file_type}"'
+            return response
+        except Exception as error:
+            print("error_export_salary_records:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=False, url_path='get_department_salary_summary', url_name='get_department_salary_summary')
+    def get_department_salary_summary(self, request):
+        try:
+            current_date = timezone.localtime(timezone.now()).date()
+            month = int(request.query_params.get('month', current_date.month))
+            year = int(request.query_params.get('year', current_date.year))
+
+            summary = get_department_salary_summary(month, year)
+            return Response({
+                "month": month,
+                "year": year,
+                "results": summary
+            }, status=status.HTTP_200_OK)
+        except Exception as error:
+            print("error_get_department_salary_summary:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+class PayrollRunMVS(viewsets.ModelViewSet):
+    serializer_class = PayrollRunSerializer
+    permission_classes = [IsAuthenticated, IsManager]
+    pagination_class = SalaryPagination
+
+    @action(methods=['POST'], detail=False, url_path='run_payroll', url_name='run_payroll')
+    def run_payroll(self, request):
+        try:
+            current_date = timezone.localtime(timezone.now()).date()
+            month = int(request.data.get('month', current_date.month))
+            year = int(request.data.get('year', current_date.year))
+            # Mặc định chỉ tính lại nhân viên có thay đổi, full=true để tính lại toàn bộ
+            full = str(request.data.get('full', '')).lower() == 'true'
+            # Chỉ xếp hàng, worker run_payroll --process-queue sẽ thực thi
+            run, = queue_payroll_runs([(month, year)], triggered_by=request.user, is_incremental=not full)
+            return Response({
+                "message": "Payroll run queued.",
+                "data": self.serializer_class(run).data
+            }, status=status.HTTP_202_ACCEPTED)
+        except PayrollRunInProgress as error:
+            return Response({"error": str(error)}, status=status.HTTP_409_CONFLICT)
+        except Exception as error:
+            print("error_run_payroll:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['POST'], detail=False, url_path='run_payroll_range', url_name='run_payroll_range')
+    def run_payroll_range(self, request):
+        try:
+            from_date = date(int(request.data['from_year']), int(request.data['from_month']), 1)
+            to_date = date(int(request.data['to_year']), int(request.data['to_month']), 1)
+            if to_date < from_date:
+                return Response({"error": "to month cannot be before from month."}, status=status.HTTP_400_BAD_REQUEST)
+            workers = min(int(request.data.get('workers', 1)), settings.PAYROLL_MAX_WORKERS)
+            by_department = str(request.data.get('by_department', '')).lower() == 'true'
+            full = str(request.data.get('full', 'true')).lower() == 'true'
+
+            runs = queue_payroll_runs(
+                months_between(from_date, to_date),
+                triggered_by=request.user,
+                is_incremental=not full,
+                workers=workers,
+                by_department=by_department
+            )
+            return Response({
+                "message": "Payroll runs queued.",
+                "data": self.serializer_class(runs, many=True).data
+            }, status=status.HTTP_202_ACCEPTED)
+        except KeyError as error:
+            return Response({"error": f"{error.args[0]} is required."}, status=status.HTTP_400_BAD_REQUEST)
+        except PayrollRunInProgress as error:
+            return Response({"error": str(error)}, status=status.HTTP_409_CONFLICT)
+        except Exception as error:
+            print("error_run_payroll_range:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=False, url_path='payroll_dry_run', url_name='payroll_dry_run')
+    def payroll_dry_run(self, request):
+        try:
+            current_date = timezone.localtime(timezone.now()).date()
+            month = int(request.query_params.get('month', current_date.month))
+            year = int(request.query_params.get('year', current_date.year))
+            department = request.query_params.get('department')
+
+            department_id = None
+            if department:
+                department_id = Department.objects.get(name=department).id
+            # Chỉ tính toán trong bộ nhớ, không ghi gì vào DB
+            diff = diff_monthly_salaries(month, year, department_id=department_id)
+            return Response({
+                "message": "Payroll dry run finished.",
+                "data": diff
+            }, status=status.HTTP_200_OK)
+        except Exception as error:
+            print("error_payroll_dry_run:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=False, url_path='get_payroll_runs', url_name='get_payroll_runs')
+    def get_payroll_runs(self, request):
+        try:
+            month = request.query_params.get('month')
+            year = request.query_params.get('year')
+
+            payroll_runs = PayrollRun.objects.select_related('triggered_by').order_by('-created_at')
+            if month and year:
+                payroll_runs = payroll_runs.filter(month=month, year=year)
+
+            page = self.paginate_queryset(payroll_runs)
+            if page is not None:
+                serializer = self.serializer_class(page, many=True)
+                return self.get_paginated_response(serializer.data)
+
+            serializer = self.serializer_class(payroll_runs, many=True)
+            return Response(serializer.data)
+        except Exception as error:
+            print("error_get_payroll_runs:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,151 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from .submodels.models_timesheet import WorkingShift, TimeSheet
+
+
+SHIFT_VERSION_CACHE_KEY = 'working_shift_version'
+LATE_AFTER_MINUTES = 15
+
+_lock = threading.Lock()
+_shifts = {}
+_loaded_version = None
+_loaded_fingerprint = None
+_checked_at = None
+
+
+def get_shift_version():
+    version = cache.get(SHIFT_VERSION_CACHE_KEY)
+    if version is None:
+        # add() để các worker cùng khởi tạo không ghi đè lẫn nhau
+        cache.add(SHIFT_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SHIFT_VERSION_CACHE_KEY)
+    return version
+
+def invalidate_shifts():
+    # Đổi version stamp; với cache dùng chung (Redis...) mọi worker tải lại ngay ở lần tra cứu kế tiếp,
+    # với LocMemCache các worker khác nhận thay đổi qua lần kiểm tra updated_at theo TTL
+    cache.set(SHIFT_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+def get_shift_fingerprint(shifts=None):
+    # updated_at mới nhất và số ca: đổi khi một ca được sửa, thêm hoặc xóa
+    if shifts is None:
+        aggregate = WorkingShift.objects.aggregate(last_updated=Max('updated_at'), count=Count('id'))
+        return aggregate['last_updated'], aggregate['count']
+    return max((shift.updated_at for shift in shifts), default=None), len(shifts)
+
+def get_shifts():
+    """
+    All WorkingShift rows keyed by shift_type, loaded once per process.
+    Reloaded when the cache version stamp changes, and otherwise at most
+    SHIFT_REGISTRY_TTL_SECONDS late: after the TTL the process re-checks
+    the latest WorkingShift.updated_at, so edits made through another
+    worker are picked up even when the cache is per-process.
+    """
+    global _shifts, _loaded_version, _loaded_fingerprint, _checked_at
+    version = get_shift_version()
+    if version != _loaded_version or _is_check_due():
+        with _lock:
+            if version != _loaded_version:
+                _load_shifts()
+            elif _is_check_due():
+                if get_shift_fingerprint() != _loaded_fingerprint:
+                    _load_shifts()
+                _checked_at = time.monotonic()
+            _loaded_version = version
+    return _shifts
+
+def _is_check_due():
+    return _checked_at is None or time.monotonic() - _checked_at >= settings.SHIFT_REGISTRY_TTL_SECONDS
+
+def _load_shifts():
+    global _shifts, _loaded_fingerprint, _checked_at
+    shifts = list(WorkingShift.objects.all())
+    _shifts = {shift.shift_type: shift for shift in shifts}
+    _loaded_fingerprint = get_shift_fingerprint(shifts)
+    _checked_at = time.monotonic()
+
+def get_shift_by_id(shift_id):
+    for shift in get_shifts().values():
+        if shift.id == shift_id:
+            return shift
+    return None
+
+def get_shift(shift_type):
+    shift = get_shifts().get(shift_type)
+    if shift is None:
+        raise WorkingShift.DoesNotExist(f"WorkingShift {shift_type} does not exist.")
+    return shift
+
+def is_shift_day(shift_type, single_date):
+    # Chủ nhật nghỉ, thứ bảy chỉ làm ca sáng
+    weekday = single_date.weekday()
+    return weekday != 6 and not (shift_type == WorkingShift.ShiftType.AFTERNOON and weekday == 5)
+
+def get_check_in_status(shift, check_in_date, check_in_time):
+    # Vào trễ hơn 15 phút so với giờ bắt đầu ca là LATE
+    start_time = datetime.combine(check_in_date, shift.start_time)
+    if datetime.combine(check_in_date, check_in_time) > start_time + timedelta(minutes=LATE_AFTER_MINUTES):
+        return TimeSheet.Status.LATE
+    return TimeSheet.Status.INCOMPLETE
+
+def get_minutes_early(shift, check_out_date, check_out_time):
+    end_time = datetime.combine(check_out_date, shift.end_time)
+    return (end_time - datetime.combine(check_out_date, check_out_time)).total_seconds() / 60
+
+def get_check_out_status(check_in_status, minutes_early):
+    # Đã LATE thì giữ LATE, ra trước giờ kết thúc ca là EARLY_LEAVE
+    if check_in_status == TimeSheet.Status.LATE:
+        return TimeSheet.Status.LATE
+    if minutes_early > 0:
+        return TimeSheet.Status.EARLY_LEAVE
+    return TimeSheet.Status.PRESENT
+
+def time_to_seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1000000
+
+def seconds_to_minutes(seconds):
+    return (Decimal(str(seconds)) / 60).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+def get_break_overlap_bounds(shift, check_out_seconds):
+    """
+    (break_start, overlap_end) in seconds for the part of the shift's break
+    that ends before check-out; (0, 0) when the shift has no break. The
+    overlap with [check_in, check_out] is then
+    max(0, overlap_end - max(check_in, break_start)).
+    """
+    if not (shift and shift.break_start and shift.break_end):
+        return 0, 0
+    return time_to_seconds(shift.break_start), min(check_out_seconds, time_to_seconds(shift.break_end))
+
+def get_worked_seconds(shift, check_in_time, check_out_time):
+    check_in_seconds = time_to_seconds(check_in_time)
+    check_out_seconds = time_to_seconds(check_out_time)
+    break_start, overlap_end = get_break_overlap_bounds(shift, check_out_seconds)
+    overlap = max(0, overlap_end - max(check_in_seconds, break_start))
+    return check_out_seconds - check_in_seconds - overlap
+
+def get_timesheet_minutes(shift, check_in_time, check_out_time):
+    """
+    worked_minutes, late_minutes and early_minutes of a TimeSheet row,
+    accurate to the second: worked time excludes the part of the shift's
+    break inside [check-in, check-out]; lateness and early leave are
+    measured against the shift's start and end (0 for overtime rows).
+    """
+    minutes = {
+        'worked_minutes': Decimal('0.00'),
+        'late_minutes': Decimal('0.00'),
+        'early_minutes': Decimal('0.00'),
+    }
+    if check_in_time and check_out_time:
+        minutes['worked_minutes'] = seconds_to_minutes(get_worked_seconds(shift, check_in_time, check_out_time))
+    if shift and shift.start_time and check_in_time:
+        minutes['late_minutes'] = seconds_to_minutes(max(0, time_to_seconds(check_in_time) - time_to_seconds(shift.start_time)))
+    if shift and shift.end_time and check_out_time:
+        minutes['early_minutes'] = seconds_to_minutes(max(0, time_to_seconds(shift.end_time) - time_to_seconds(check_out_time)))
+    return minutes
@@ -79,6 +79,12 @@ class Employee(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Danh sách nhân viên đang làm việc của một phòng ban (employee_id đã có unique index)
+            models.Index(fields=['department'], condition=models.Q(is_active=True), name='employee_active_department'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.employee_id:
             department_code = self.department.code
@@ -99,3 +105,12 @@ class Employee(models.Model):
 
     def __str__(self):
         return f"{self.employee_id} - {self.full_name} - Department: {self.department.name}"
+
+
+class UserAuthVersion(models.Model):
+    # Tăng mỗi khi group/hồ sơ nhân viên đổi; access token mang version cũ bị từ chối
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='auth_version')
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.version}"
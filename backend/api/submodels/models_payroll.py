@@ -0,0 +1,76 @@
+from django.db import models
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from django.core.validators import MinValueValidator, MaxValueValidator
+from .models_employee import Employee
+
+
+class PayrollRun(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', _('Queued')
+        RUNNING = 'RUNNING', _('Running')
+        SUCCESS = 'SUCCESS', _('Success')
+        FAILED = 'FAILED', _('Failed')
+
+    month = models.PositiveSmallIntegerField(validators=[
+        MinValueValidator(1),
+        MaxValueValidator(12)
+    ])
+    year = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.RUNNING)
+    triggered_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='payroll_runs'
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    is_incremental = models.BooleanField(default=False)
+    # Tùy chọn của lần chạy được xếp hàng từ API, worker (run_payroll --process-queue) đọc lại khi thực thi
+    workers = models.PositiveSmallIntegerField(default=1)
+    by_department = models.BooleanField(default=False)
+    engine = models.CharField(max_length=10, null=True, blank=True)
+    employee_count = models.PositiveIntegerField(default=0)
+    shards_total = models.PositiveIntegerField(default=0)
+    shards_done = models.PositiveIntegerField(default=0)
+    shard_timings = models.JSONField(default=list, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Only one queued or running payroll run per month, enforced by the database.
+            models.UniqueConstraint(
+                fields=['month', 'year'],
+                condition=models.Q(status__in=['QUEUED', 'RUNNING']),
+                name='unique_active_payroll_run'
+            )
+        ]
+
+    @property
+    def duration(self):
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+    def __str__(self):
+        return f"Payroll {str(self.month)}-{str(self.year)} - Status: {self.status}"
+
+
+class PayrollDirtyEmployee(models.Model):
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='payroll_dirty_marks')
+    month = models.PositiveSmallIntegerField(validators=[
+        MinValueValidator(1),
+        MaxValueValidator(12)
+    ])
+    year = models.PositiveIntegerField()
+    marked_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['employee', 'month', 'year']
+
+    def __str__(self):
+        return f"{self.employee_id} - {str(self.month)}-{str(self.year)} - Marked at: {str(self.marked_at)}"
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from .models_employee import Employee
 from django.utils.translation import gettext_lazy as _
@@ -18,6 +18,7 @@ class WorkingShift(models.Model):
     end_time = models.TimeField(null=True, blank=True)
     break_start = models.TimeField(null=True, blank=True)
     break_end = models.TimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.shift_type
@@ -45,12 +46,39 @@ class TimeSheet(models.Model):
         default=Decimal('0.00'),
         validators=[MinValueValidator(Decimal('0.00'))]
     )
+    # Số phút (chính xác tới giây) tính khi check-in/check-out, đã trừ giờ nghỉ của ca
+    worked_minutes = models.DecimalField(max_digits=7, decimal_places=2, default=Decimal('0.00'))
+    late_minutes = models.DecimalField(max_digits=7, decimal_places=2, default=Decimal('0.00'))
+    early_minutes = models.DecimalField(max_digits=7, decimal_places=2, default=Decimal('0.00'))
     note = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ['employee', 'date', 'shift']
+        # shift có thể NULL (ca tăng ca) nên unique_together không chặn được bản ghi trùng
+        constraints = [
+            models.UniqueConstraint(
+                fields=['employee', 'date', 'shift'],
+                condition=models.Q(shift__isnull=False),
+                name='unique_timesheet_shift'
+            ),
+            models.UniqueConstraint(
+                fields=['employee', 'date'],
+                condition=models.Q(is_overtime=True),
+                name='unique_timesheet_overtime'
+            ),
+        ]
+        indexes = [
+            # Bảng chấm công / payroll của một nhân viên theo khoảng ngày và trạng thái
+            models.Index(fields=['employee', 'date', 'status'], name='timesheet_employee_date_status'),
+            # Theo ngày cho mọi nhân viên: lịch nhóm, rebuild MonthlyAttendance, materialise_absences
+            models.Index(fields=['date', 'status'], name='timesheet_date_status'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Signal pre_save/post_save cập nhật MonthlyAttendance: bản ghi và bộ đếm commit cùng nhau
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         if self.shift:
@@ -86,6 +114,13 @@ class OvertimeRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Hàng đợi duyệt của quản lý: đơn PENDING mới nhất trước
+            models.Index(fields=['-created_at'], condition=models.Q(status='PENDING'), name='overtime_pending_created'),
+            models.Index(fields=['employee', 'date'], name='overtime_employee_date'),
+        ]
+
     def __str__(self):
         return f"{self.employee.employee_id} - From: {str(self.from_time)} to: {str(self.to_time)} {str(self.date)} - Status: {self.status}"
 
@@ -134,6 +169,20 @@ class LeaveRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', 'status', 'from_date', 'to_date'], name='leave_employee_status_dates'),
+            # Hàng đợi duyệt của quản lý: đơn PENDING mới nhất trước
+            models.Index(fields=['-created_at'], condition=models.Q(status='PENDING'), name='leave_pending_created'),
+            # Đơn đã duyệt giao với một tháng (payroll, rebuild MonthlyAttendance)
+            models.Index(fields=['from_date', 'to_date'], condition=models.Q(status='APPROVED'), name='leave_approved_dates'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Signal pre_save/post_save cập nhật MonthlyAttendance: bản ghi và bộ đếm commit cùng nhau
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.employee.employee_id} - From date: {str(self.from_date)} to date: {str(self.to_date)} - Status: {self.status}"
 
@@ -176,6 +225,7 @@ class SalaryRecord(models.Model):
     
     class Meta:
         unique_together = ['employee', 'month', 'year']
+        indexes = [models.Index(fields=['year', 'month'], name='salary_record_period')]
     
     def __str__(self):
         return f"{self.employee.employee_id} - {str(self.month)}-{str(self.year)} - Salary: {str(self.gross_salary)}"
@@ -202,6 +252,73 @@ class EmployeeEvaluation(models.Model):
 
     class Meta:
         unique_together = ['employee', 'month', 'year']
+        indexes = [models.Index(fields=['year', 'month'], name='evaluation_period')]
 
     def __str__(self):
         return f"{self.employee.employee_id} - {self.month}/{self.year}"
+
+
+class MonthlyAttendance(models.Model):
+    # Bộ đếm chấm công theo tháng, cập nhật bằng F() trong cùng transaction với save()/delete() của TimeSheet/LeaveRequest.
+    # .update()/bulk_* không qua signal: các đường ghi đó phải tự rebuild (rebuild_attendance_counters để tính lại)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='monthly_attendances')
+    month = models.PositiveSmallIntegerField(validators=[
+        MinValueValidator(1),
+        MaxValueValidator(12)
+    ])
+    year = models.PositiveIntegerField()
+    early_leave_count = models.IntegerField(default=0)
+    late_count = models.IntegerField(default=0)
+    present_count = models.IntegerField(default=0)
+    worked_minutes = models.DecimalField(max_digits=9, decimal_places=2, default=Decimal('0.00'))
+    overtime_minutes = models.DecimalField(max_digits=9, decimal_places=2, default=Decimal('0.00'))
+    # Số ngày phép đã duyệt trong tháng (thứ 7 tính nửa ngày), số ngày công = present_count / 2
+    leave_days = models.DecimalField(max_digits=4, decimal_places=1, default=Decimal('0.0'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['employee', 'month', 'year']
+        indexes = [models.Index(fields=['year', 'month'], name='monthly_attendance_period')]
+
+    def __str__(self):
+        return f"{self.employee.employee_id} - {self.month}/{self.year}"
+
+
+def upload_to_attendance_imports_folder(instance, filename):
+    base_name, ext = os.path.splitext(filename)
+    timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+    return f"attendance_imports/{base_name}_{timestamp}{ext}"
+
+class AttendanceImport(models.Model):
+    # File log máy chấm công được upload qua API, worker (import_attendance_logs --process-queue) mới thực sự import
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', _('Queued')
+        RUNNING = 'RUNNING', _('Running')
+        SUCCESS = 'SUCCESS', _('Success')
+        FAILED = 'FAILED', _('Failed')
+
+    file = models.FileField(upload_to=upload_to_attendance_imports_folder)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    triggered_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='attendance_imports'
+    )
+    row_count = models.PositiveIntegerField(default=0)
+    punch_count = models.PositiveIntegerField(default=0)
+    upserted_count = models.PositiveIntegerField(default=0)
+    incomplete_count = models.PositiveIntegerField(default=0)
+    reject_count = models.PositiveIntegerField(default=0)
+    # Tối đa MAX_REPORTED_REJECTS dòng đầu tiên, như response của API trước đây
+    rejects = models.JSONField(default=list, blank=True)
+    incompletes = models.JSONField(default=list, blank=True)
+    error = models.TextField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Attendance import {self.id} - Status: {self.status}"
@@ -1,3 +1,943 @@
-from django.test import TestCase
+import csv
+import random
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from datetime import date, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import *
+from .authentication import get_tokens_for_user
+from .shifts import get_shift, get_shifts, get_timesheet_minutes
+from .timesheet.journal import append_check_in, flush_check_in_journal, flush_employee_check_in, read_check_in_marker
+from .salary.payroll import PayrollRunInProgress, create_monthly_records, execute_queued_payroll_runs, expire_stale_payroll_runs, start_payroll_run, execute_payroll_run
+from .salary.serializers import batch_calculate_monthly_salaries, diff_monthly_salaries, get_payroll_engine, \
+    get_department_salary_summary, PAYROLL_ENGINES
+from .timesheet.upserts import upsert_check_in, upsert_overtime_check_in, upsert_check_in_rows
+from .workdays import count_workdays, batch_count_leave_days
+from .management.commands.benchmark import rrule_count_leave_days
+from .timesheet.serializers import build_team_calendar
+from .timesheet.attendance_import import import_attendance_logs, execute_queued_attendance_imports
 
-# Create your tests here.
+
+def create_working_shifts():
+    return (
+        WorkingShift.objects.create(shift_type=WorkingShift.ShiftType.MORNING, start_time=time(8), end_time=time(12)),
+        WorkingShift.objects.create(shift_type=WorkingShift.ShiftType.AFTERNOON, start_time=time(13), end_time=time(17)),
+    )
+
+def create_employees(count, department=None, position=None, start=0):
+    for group_name in settings.GROUP_NAME.values():
+        Group.objects.get_or_create(name=group_name)
+    department = department or Department.objects.get_or_create(name='Test', code='T')[0]
+    position = position or Position.objects.get_or_create(
+        code='P',
+        defaults={
+            'name': 'Staff',
+            'salary_base': Decimal('50000.00'),
+            'salary_insufficient_work': Decimal('40000.00'),
+            'salary_overtime': Decimal('70000.00'),
+            'attendance_bonus': Decimal('500000.00'),
+        }
+    )[0]
+    employee_group = Group.objects.get(name=settings.GROUP_NAME['EMPLOYEE'])
+    employees = []
+    for index in range(start, start + count):
+        user = User.objects.create_user(f'employee{index}', f'employee{index}@example.com', 'password')
+        user.groups.add(employee_group)
+        employees.append(Employee.objects.create(
+            user=user,
+            department=department,
+            position=position,
+            full_name=f'Employee {index}'
+        ))
+    return employees
+
+def create_manager():
+    for group_name in settings.GROUP_NAME.values():
+        Group.objects.get_or_create(name=group_name)
+    manager = User.objects.create_user('manager', 'manager@example.com', 'password')
+    manager.groups.add(Group.objects.get(name=settings.GROUP_NAME['MANAGER']))
+    return manager
+
+
+def api_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(user).access_token}")
+    return client
+
+
+class PayrollDirtyTrackingTests(TestCase):
+    def test_moving_leave_request_marks_old_and_new_months(self):
+        employee, other_employee = create_employees(2)
+        leave_request = LeaveRequest.objects.create(
+            employee=employee,
+            from_date=date(2026, 1, 29),
+            to_date=date(2026, 2, 2),
+            status=LeaveRequest.Status.APPROVED
+        )
+        PayrollDirtyEmployee.objects.all().delete()
+
+        leave_request.employee = other_employee
+        leave_request.from_date = date(2026, 4, 6)
+        leave_request.to_date = date(2026, 4, 7)
+        leave_request.save()
+
+        dirty_marks = set(PayrollDirtyEmployee.objects.values_list('employee_id', 'month', 'year'))
+        self.assertEqual(dirty_marks, {
+            (employee.id, 1, 2026),
+            (employee.id, 2, 2026),
+            (other_employee.id, 4, 2026),
+        })
+
+
+class PayrollQueryCountTests(TestCase):
+    def setUp(self):
+        self.morning, self.afternoon = create_working_shifts()
+
+    def add_month_of_attendance(self, employees, month, year):
+        for employee in employees:
+            for day in (2, 3, 4):
+                for shift in (self.morning, self.afternoon):
+                    TimeSheet.objects.create(
+                        employee=employee,
+                        date=date(year, month, day),
+                        shift=shift,
+                        check_in_time=shift.start_time,
+                        check_out_time=shift.end_time,
+                        status=TimeSheet.Status.PRESENT
+                    )
+            LeaveRequest.objects.create(
+                employee=employee,
+                from_date=date(year, month, 9),
+                to_date=date(year, month, 10),
+                status=LeaveRequest.Status.APPROVED
+            )
+
+    def count_payroll_queries(self, month, year):
+        with CaptureQueriesContext(connection) as queries:
+            employee_count = batch_calculate_monthly_salaries(month, year)
+        return employee_count, len(queries)
+
+    def test_query_count_does_not_grow_with_headcount(self):
+        self.add_month_of_attendance(create_employees(3), 3, 2026)
+        small_count, small_queries = self.count_payroll_queries(3, 2026)
+
+        self.add_month_of_attendance(create_employees(12, start=3), 3, 2026)
+        large_count, large_queries = self.count_payroll_queries(3, 2026)
+
+        self.assertEqual((small_count, large_count), (3, 15))
+        self.assertEqual(small_queries, large_queries)
+
+
+class PayrollQueueTests(TestCase):
+    def test_api_queues_and_worker_executes(self):
+        create_employees(2)
+        client = api_client(create_manager())
+
+        response = client.post('/api/salary/run_payroll_range/', {
+            'from_month': 1, 'from_year': 2026, 'to_month': 2, 'to_year': 2026, 'workers': 1
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(set(PayrollRun.objects.values_list('status', flat=True)), {PayrollRun.Status.QUEUED})
+
+        # Tháng đang xếp hàng vẫn bị khóa
+        response = client.post('/api/salary/run_payroll/', {'month': 2, 'year': 2026}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+        runs = execute_queued_payroll_runs()
+        self.assertEqual(len(runs), 2)
+        self.assertEqual({run.status for run in runs}, {PayrollRun.Status.SUCCESS})
+        self.assertEqual(execute_queued_payroll_runs(), [])
+
+    def test_stale_running_run_is_released(self):
+        stale_run = PayrollRun.objects.create(month=1, year=2026, status=PayrollRun.Status.RUNNING, started_at=timezone.now())
+        PayrollRun.objects.filter(id=stale_run.id).update(
+            updated_at=timezone.now() - timedelta(minutes=settings.PAYROLL_RUN_TIMEOUT_MINUTES + 1)
+        )
+        live_run = PayrollRun.objects.create(month=2, year=2026, status=PayrollRun.Status.RUNNING, started_at=timezone.now())
+
+        self.assertEqual(expire_stale_payroll_runs(), 1)
+        stale_run.refresh_from_db()
+        live_run.refresh_from_db()
+        self.assertEqual((stale_run.status, live_run.status), (PayrollRun.Status.FAILED, PayrollRun.Status.RUNNING))
+
+    def test_second_run_for_month_is_locked(self):
+        run = start_payroll_run(1, 2026)
+        with self.assertRaises(PayrollRunInProgress):
+            start_payroll_run(1, 2026, queued=True)
+        # Tháng khác không bị ảnh hưởng
+        start_payroll_run(2, 2026)
+
+        execute_payroll_run(run)
+        start_payroll_run(1, 2026)
+
+    def test_stale_queued_run_is_released(self):
+        client = api_client(create_manager())
+        response = client.post('/api/salary/run_payroll/', {'month': 1, 'year': 2026}, format='json')
+        self.assertEqual(response.status_code, 202)
+        response = client.post('/api/salary/run_payroll/', {'month': 1, 'year': 2026}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+        # Không có worker nào nhận lần chạy đã xếp hàng
+        PayrollRun.objects.update(
+            updated_at=timezone.now() - timedelta(minutes=settings.PAYROLL_RUN_TIMEOUT_MINUTES + 1)
+        )
+        response = client.post('/api/salary/run_payroll/', {'month': 1, 'year': 2026}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(
+            sorted(PayrollRun.objects.values_list('status', flat=True)),
+            sorted([PayrollRun.Status.FAILED, PayrollRun.Status.QUEUED])
+        )
+
+
+class TimesheetViewQueryCountTests(TestCase):
+    def setUp(self):
+        self.shifts = create_working_shifts()
+        self.employee, = create_employees(1)
+        self.client = api_client(self.employee.user)
+
+    def add_days_of_attendance(self, days):
+        for day in days:
+            for shift in self.shifts:
+                TimeSheet.objects.create(
+                    employee=self.employee,
+                    date=date(2026, 3, day),
+                    shift=shift,
+                    check_in_time=shift.start_time,
+                    check_out_time=shift.end_time,
+                    status=TimeSheet.Status.PRESENT
+                )
+
+    def test_month_view_uses_fixed_number_of_queries(self):
+        url = '/api/timesheet/get_current_month_timesheet_employee/?month=3&year=2026'
+        # Một query lấy user, một query lấy timesheet của cả trang
+        self.add_days_of_attendance([2])
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.add_days_of_attendance(range(3, 10))
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        worked_days = [day for day in response.data['results'] if day['morning_shift'] and day['afternoon_shift']]
+        self.assertEqual(len(worked_days), 8)
+
+    def test_daily_view_uses_two_queries_after_authentication(self):
+        url = '/api/timesheet/get_daily_timesheet_employee/'
+        current_date = timezone.localtime(timezone.now()).date()
+        morning, afternoon = self.shifts
+        TimeSheet.objects.create(
+            employee=self.employee, date=current_date, shift=morning,
+            check_in_time=morning.start_time, check_out_time=time(11), status=TimeSheet.Status.EARLY_LEAVE
+        )
+        TimeSheet.objects.create(
+            employee=self.employee, date=current_date, shift=afternoon,
+            check_in_time=afternoon.start_time, status=TimeSheet.Status.INCOMPLETE
+        )
+        TimeSheet.objects.create(
+            employee=self.employee, date=current_date, is_overtime=True,
+            check_in_time=time(18), status=TimeSheet.Status.INCOMPLETE
+        )
+        # Một query lấy user, một query đếm EARLY_LEAVE của tháng, một query lấy timesheet hôm nay
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['early_leave_count'], 1)
+        self.assertTrue(response.data['morning_shift'] and response.data['afternoon_shift'])
+
+
+class ShiftRegistryTests(TestCase):
+    def test_edit_from_another_worker_is_picked_up_after_ttl(self):
+        morning, _ = create_working_shifts()
+        self.assertEqual(get_shift(WorkingShift.ShiftType.MORNING).start_time, time(8))
+
+        # Worker khác sửa ca: không có signal hay version stamp nào tới được tiến trình này
+        WorkingShift.objects.filter(id=morning.id).update(start_time=time(7), updated_at=timezone.now() + timedelta(seconds=1))
+        with override_settings(SHIFT_REGISTRY_TTL_SECONDS=3600):
+            self.assertEqual(get_shift(WorkingShift.ShiftType.MORNING).start_time, time(8))
+        with override_settings(SHIFT_REGISTRY_TTL_SECONDS=0):
+            self.assertEqual(get_shift(WorkingShift.ShiftType.MORNING).start_time, time(7))
+
+    @override_settings(SHIFT_REGISTRY_TTL_SECONDS=3600)
+    def test_save_and_delete_reload_registry_without_waiting_for_ttl(self):
+        morning, afternoon = create_working_shifts()
+        self.assertEqual(get_shift(WorkingShift.ShiftType.MORNING).start_time, time(8))
+        # Đã nạp: tra cứu chỉ đọc version stamp trong cache
+        with self.assertNumQueries(0):
+            get_shift(WorkingShift.ShiftType.AFTERNOON)
+
+        morning.start_time = time(7, 30)
+        morning.save()
+        self.assertEqual(get_shift(WorkingShift.ShiftType.MORNING).start_time, time(7, 30))
+
+        afternoon.delete()
+        self.assertIsNone(get_shifts().get(WorkingShift.ShiftType.AFTERNOON))
+
+
+class TeamCalendarTests(TestCase):
+    def setUp(self):
+        self.morning, self.afternoon = create_working_shifts()
+
+    def add_week_of_attendance(self, employee):
+        # 2/3/2026 là thứ 2: sáng có mặt, chiều trễ, có tăng ca; thứ 7 (7/3) nghỉ phép chỉ có ca sáng
+        TimeSheet.objects.create(
+            employee=employee, date=date(2026, 3, 2), shift=self.morning,
+            check_in_time=time(8), check_out_time=time(12), status=TimeSheet.Status.PRESENT
+        )
+        TimeSheet.objects.create(
+            employee=employee, date=date(2026, 3, 2), shift=self.afternoon,
+            check_in_time=time(13, 30), check_out_time=time(17), status=TimeSheet.Status.LATE
+        )
+        TimeSheet.objects.create(
+            employee=employee, date=date(2026, 3, 2), is_overtime=True,
+            check_in_time=time(18), check_out_time=time(20), overtime_hours=Decimal('2.00'), status=TimeSheet.Status.PRESENT
+        )
+        LeaveRequest.objects.create(
+            employee=employee, from_date=date(2026, 3, 6), to_date=date(2026, 3, 8), status=LeaveRequest.Status.APPROVED
+        )
+
+    def test_calendar_uses_three_queries_for_any_headcount(self):
+        employees = create_employees(4)
+        other_department = Department.objects.create(name='Other', code='O')
+        self.add_week_of_attendance(create_employees(1, department=other_department, start=4)[0])
+        for employee in employees:
+            self.add_week_of_attendance(employee)
+
+        with self.assertNumQueries(3):
+            calendar = build_team_calendar('Test', 3, 2026)
+        self.assertEqual([row['id'] for row in calendar['results']], [employee.id for employee in employees])
+        for row in calendar['results']:
+            self.assertEqual(len(row['codes']), 31)
+            self.assertEqual(row['codes'][1], 'PLP')
+            self.assertEqual(row['codes'][2], '---')
+            self.assertEqual(row['codes'][5:8], ['VV-', 'V--', '---'])
+
+    url = '/api/timesheet/get_tracking_time_employee/'
+
+    def setUp(self):
+        self.morning, self.afternoon = create_working_shifts()
+        self.client = api_client(create_manager())
+
+    def add_month_of_attendance(self, employee):
+        # 2 ngày đủ ca, 1 ca LATE (không tính công), 1 dòng overtime 1.5 giờ, 1 ngày phép
+        for day in (2, 3):
+            for shift in (self.morning, self.afternoon):
+                TimeSheet.objects.create(
+                    employee=employee, date=date(2026, 3, day), shift=shift,
+                    check_in_time=shift.start_time, check_out_time=shift.end_time, status=TimeSheet.Status.PRESENT
+                )
+        TimeSheet.objects.create(
+            employee=employee, date=date(2026, 3, 4), shift=self.morning,
+            check_in_time=time(8, 30), check_out_time=time(12), status=TimeSheet.Status.LATE
+        )
+        TimeSheet.objects.create(
+            employee=employee, date=date(2026, 3, 2), is_overtime=True,
+            check_in_time=time(18), check_out_time=time(19, 30), overtime_hours=Decimal('1.50'), status=TimeSheet.Status.PRESENT
+        )
+        LeaveRequest.objects.create(
+            employee=employee, from_date=date(2026, 3, 5), to_date=date(2026, 3, 5), status=LeaveRequest.Status.APPROVED
+        )
+
+    def test_totals_come_from_the_monthly_rollup(self):
+        employees = create_employees(3)
+        create_monthly_records({(employee.id, 3, 2026) for employee in employees})
+        for employee in employees[:2]:
+            self.add_month_of_attendance(employee)
+
+        # Một query lấy user, một query đếm, một query lấy cả trang
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'month': 3, 'year': 2026})
+        self.assertEqual(response.status_code, 200, response.data)
+        rows = {row['employee']['id']: row for row in response.data['results']}
+        self.assertEqual(len(rows), 3)
+        for employee in employees[:2]:
+            row = rows[employee.id]
+            self.assertEqual(row['working_days'], 2)
+            self.assertEqual(row['regular_hours'], Decimal('16.00'))
+            self.assertEqual(row['overtime_hours'], Decimal('1.50'))
+            self.assertEqual(row['leave_days'], Decimal('1.0'))
+        # Không có dòng MonthlyAttendance: tổng bằng 0
+        row = rows[employees[2].id]
+        self.assertEqual((row['working_days'], row['regular_hours'], row['overtime_hours']), (0, 0, 0))
+
+
+class TimesheetMinutesTests(TestCase):
+    shift = WorkingShift(start_time=time(8), end_time=time(17), break_start=time(12), break_end=time(13))
+
+    def assertMinutes(self, shift, check_in_time, check_out_time, worked, late, early):
+        self.assertEqual(get_timesheet_minutes(shift, check_in_time, check_out_time), {
+            'worked_minutes': Decimal(worked),
+            'late_minutes': Decimal(late),
+            'early_minutes': Decimal(early),
+        })
+
+    def test_row_spanning_the_break(self):
+        self.assertMinutes(self.shift, time(8), time(17), '480.00', '0.00', '0.00')
+        # Chính xác tới giây: 8:59:15 có mặt trừ 1 giờ nghỉ
+        self.assertMinutes(self.shift, time(8, 0, 30), time(16, 59, 45), '479.25', '0.50', '0.25')
+        # Ra trong giờ nghỉ: chỉ trừ phần nghỉ trước lúc check-out
+        self.assertMinutes(self.shift, time(11), time(12, 30), '60.00', '180.00', '270.00')
+
+    def test_row_inside_the_break(self):
+        self.assertMinutes(self.shift, time(12, 10), time(12, 40), '0.00', '250.00', '260.00')
+
+    def test_overtime_row(self):
+        # Dòng overtime không có ca: không trừ giờ nghỉ, không tính trễ/về sớm
+        self.assertMinutes(None, time(18), time(20, 30, 20), '150.33', '0.00', '0.00')
+        employee, = create_employees(1)
+        timesheet = TimeSheet.objects.create(
+            employee=employee, date=date(2026, 3, 2), is_overtime=True,
+            check_in_time=time(18), check_out_time=time(20, 30, 20), status=TimeSheet.Status.PRESENT
+        )
+        timesheet.refresh_from_db()
+        self.assertEqual(timesheet.worked_minutes, Decimal('150.33'))
+
+
+class TokenRevocationTests(TestCase):
+    url = '/api/timesheet/get_current_month_timesheet_employee/'
+
+    def test_revocation_is_stored_in_db(self):
+        employee, = create_employees(1)
+        client = api_client(employee.user)
+
+        # Cache của worker khác (hoặc sau khi khởi động lại) không có gì: token vẫn hợp lệ
+        cache.clear()
+        self.assertEqual(client.get(self.url).status_code, 200)
+
+        employee.user.groups.add(Group.objects.get(name=settings.GROUP_NAME['MANAGER']))
+        cache.clear()
+        self.assertEqual(client.get(self.url).status_code, 401)
+        self.assertEqual(api_client(employee.user).get(self.url).status_code, 200)
+
+    def test_deleting_user_with_employee_profile(self):
+        employee, = create_employees(1)
+        api_client(employee.user)
+        employee.user.delete()
+        self.assertFalse(UserAuthVersion.objects.exists())
+
+
+class RequestEmployeeTests(TestCase):
+    def setUp(self):
+        create_working_shifts()
+        self.employee, = create_employees(1)
+
+    def employee_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        table = Employee._meta.db_table
+        return [query['sql'] for query in queries.captured_queries if f'FROM "{table}"' in query['sql']]
+
+    def test_employee_is_not_loaded_when_view_uses_claim(self):
+        # View chỉ cần employee_id, lấy từ claim của token
+        client = api_client(self.employee.user)
+        self.assertEqual(self.employee_queries(client, '/api/timesheet/get_daily_timesheet_employee/'), [])
+
+    def test_employee_is_loaded_once_when_used(self):
+        client = api_client(self.employee.user)
+        self.assertEqual(len(self.employee_queries(client, '/api/employee/get_employee_profile/')), 1)
+
+    def test_employee_is_loaded_without_claim(self):
+        # force_authenticate không có token mang claim: tra theo user
+        client = APIClient()
+        client.force_authenticate(self.employee.user)
+        self.assertEqual(len(self.employee_queries(client, '/api/timesheet/get_daily_timesheet_employee/')), 1)
+
+    def setUp(self):
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        settings_override = override_settings(CHECK_IN_INGESTION_MODE='buffered', CHECK_IN_JOURNAL_DIR=journal_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.morning, _ = create_working_shifts()
+        self.employee, self.other_employee = create_employees(2)
+
+    def test_duplicate_check_in_is_rejected_without_cache(self):
+        self.assertTrue(append_check_in(self.employee.id, self.morning, date(2026, 3, 2), time(8, 5), TimeSheet.Status.INCOMPLETE))
+        # Worker khác không thấy cache của worker này
+        cache.clear()
+        self.assertIsNone(append_check_in(self.employee.id, self.morning, date(2026, 3, 2), time(8, 6), TimeSheet.Status.INCOMPLETE))
+
+        self.assertEqual(flush_check_in_journal(), 1)
+        cache.clear()
+        self.assertIsNone(append_check_in(self.employee.id, self.morning, date(2026, 3, 2), time(8, 7), TimeSheet.Status.INCOMPLETE))
+
+    def test_flush_removes_markers_of_past_days(self):
+        old_date = timezone.localtime(timezone.now()).date() - timedelta(days=3)
+        append_check_in(self.employee.id, self.morning, old_date, time(8), TimeSheet.Status.INCOMPLETE)
+        append_check_in(self.other_employee.id, self.morning, old_date + timedelta(days=3), time(8), TimeSheet.Status.INCOMPLETE)
+
+        flush_check_in_journal()
+        self.assertIsNone(read_check_in_marker(self.employee.id, self.morning.shift_type, old_date))
+        self.assertTrue(read_check_in_marker(self.other_employee.id, self.morning.shift_type, old_date + timedelta(days=3)))
+
+    def test_flush_fills_in_row_without_check_in(self):
+        TimeSheet.objects.create(employee=self.employee, date=date(2026, 3, 2), shift=self.morning, status=TimeSheet.Status.ABSENT)
+        append_check_in(self.employee.id, self.morning, date(2026, 3, 2), time(8, 30), TimeSheet.Status.LATE)
+
+        flush_check_in_journal()
+        timesheet = TimeSheet.objects.get(employee=self.employee, date=date(2026, 3, 2), shift=self.morning)
+        self.assertEqual((timesheet.check_in_time, timesheet.status), (time(8, 30), TimeSheet.Status.LATE))
+        self.assertEqual(timesheet.late_minutes, Decimal('30.00'))
+
+    def test_check_out_flushes_only_own_check_in(self):
+        append_check_in(self.employee.id, self.morning, date(2026, 3, 2), time(8), TimeSheet.Status.INCOMPLETE)
+        append_check_in(self.other_employee.id, self.morning, date(2026, 3, 2), time(8), TimeSheet.Status.INCOMPLETE)
+
+        self.assertTrue(flush_employee_check_in(self.employee.id, self.morning, date(2026, 3, 2)))
+        self.assertEqual(list(TimeSheet.objects.values_list('employee_id', flat=True)), [self.employee.id])
+
+        self.assertEqual(flush_check_in_journal(), 2)
+        self.assertEqual(TimeSheet.objects.filter(check_in_time=time(8)).count(), 2)
+
+
+class AttendanceCounterTransactionTests(TestCase):
+    def test_failed_save_rolls_back_counter_delta(self):
+        morning, _ = create_working_shifts()
+        employee, = create_employees(1)
+        TimeSheet.objects.create(
+            employee=employee, date=date(2026, 3, 2), shift=morning,
+            check_in_time=time(8), check_out_time=time(12), status=TimeSheet.Status.PRESENT
+        )
+
+        def fail_after_counters(sender, **kwargs):
+            raise RuntimeError('write failed')
+        post_save.connect(fail_after_counters, sender=TimeSheet)
+        self.addCleanup(post_save.disconnect, fail_after_counters, sender=TimeSheet)
+
+        with self.assertRaises(RuntimeError):
+            TimeSheet.objects.create(
+                employee=employee, date=date(2026, 3, 3), shift=morning,
+                check_in_time=time(8), check_out_time=time(12), status=TimeSheet.Status.PRESENT
+            )
+        self.assertEqual(TimeSheet.objects.count(), 1)
+        self.assertEqual(MonthlyAttendance.objects.get(employee=employee, month=3, year=2026).present_count, 1)
+
+
+class PayrollRollupReconcileTests(TestCase):
+    def test_payroll_run_rebuilds_rollup_after_signal_skipping_write(self):
+        morning, afternoon = create_working_shifts()
+        employee, = create_employees(1)
+        for shift in (morning, afternoon):
+            TimeSheet.objects.create(
+                employee=employee, date=date(2026, 3, 2), shift=shift,
+                check_in_time=shift.start_time, check_out_time=shift.end_time, status=TimeSheet.Status.PRESENT
+            )
+        # .update() không qua signal: MonthlyAttendance vẫn đếm 2 ca
+        TimeSheet.objects.filter(shift=afternoon).update(status=TimeSheet.Status.ABSENT, worked_minutes=Decimal('0.00'))
+
+        run = execute_payroll_run(start_payroll_run(3, 2026))
+        self.assertEqual(run.status, PayrollRun.Status.SUCCESS)
+        attendance = MonthlyAttendance.objects.get(employee=employee, month=3, year=2026)
+        self.assertEqual((attendance.present_count, attendance.worked_minutes), (1, Decimal('240.00')))
+
+
+class PayrollRoundingParityTests(TestCase):
+    def build_payroll_inputs(self, seed):
+        # Số lẻ (lương 33333.33, phút lẻ, nửa ngày phép) để lộ sai lệch do làm tròn từng khoản
+        rng = random.Random(seed)
+        positions = [
+            Position(id=1, salary_base=Decimal('33333.33'), salary_insufficient_work=Decimal('22222.27'),
+                     salary_overtime=Decimal('44444.49'), attendance_bonus=Decimal('500000.00')),
+            Position(id=2, salary_base=Decimal('50000.00'), salary_insufficient_work=Decimal('41666.67'),
+                     salary_overtime=Decimal('70000.01'), attendance_bonus=Decimal('333333.33')),
+        ]
+        payroll_inputs = {
+            'timesheet_summary': [],
+            'salary_records': {},
+            'employee_evaluations': {},
+            'leave_days': {},
+            'used_leaves': {},
+            'is_year_end': True,
+        }
+        for employee_id in range(1, 301):
+            employee = Employee(id=employee_id, position=rng.choice(positions))
+            payroll_inputs['timesheet_summary'].append({
+                'employee': employee_id,
+                'total_regular_minutes': Decimal(rng.randint(0, 1300000)).scaleb(-2),
+                'total_overtime_hours': Decimal(rng.randint(0, 3000)).scaleb(-2),
+            })
+            payroll_inputs['salary_records'][employee_id] = SalaryRecord(employee=employee)
+            payroll_inputs['employee_evaluations'][employee_id] = EmployeeEvaluation(employee=employee)
+            payroll_inputs['leave_days'][employee_id] = rng.randint(0, 10) / 2
+            payroll_inputs['used_leaves'][employee_id] = rng.randint(0, 10)
+        return payroll_inputs
+
+    def expected_amounts(self, payroll_inputs):
+        # Cách tính trước khi tách engine: cộng các khoản chưa làm tròn, cột DecimalField làm tròn khi lưu
+        def stored(amount):
+            return amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+        expected = {}
+        for summary in payroll_inputs['timesheet_summary']:
+            employee_id = summary['employee']
+            position = payroll_inputs['salary_records'][employee_id].employee.position
+            regular_hours = summary['total_regular_minutes'] / 60
+            overtime_hours = summary['total_overtime_hours']
+            rate = position.salary_insufficient_work if regular_hours < 192 else position.salary_base
+            regular_pay = rate * regular_hours
+            leave_pay = Decimal(payroll_inputs['leave_days'][employee_id]) * Decimal('8.00') * position.salary_base * Decimal('0.85')
+            overtime_pay = position.salary_overtime * overtime_hours
+            attendance_pay = position.attendance_bonus if regular_hours + overtime_hours > 200 else Decimal('0.00')
+            annual_pay = Decimal('1500000.00') if payroll_inputs['used_leaves'][employee_id] <= 6 else Decimal('0.00')
+            expected[employee_id] = (
+                stored(regular_pay + leave_pay),
+                stored(overtime_pay),
+                stored(regular_pay + overtime_pay + attendance_pay + leave_pay + annual_pay),
+            )
+        return expected
+
+    def test_engines_round_like_the_stored_decimal_fields(self):
+        for seed in range(5):
+            expected = self.expected_amounts(self.build_payroll_inputs(seed))
+            for engine in PAYROLL_ENGINES:
+                salary_records, _ = get_payroll_engine(engine)(self.build_payroll_inputs(seed))
+                amounts = {
+                    salary_record.employee_id: (salary_record.base_salary, salary_record.overtime_pay, salary_record.gross_salary)
+                    for salary_record in salary_records
+                }
+                self.assertEqual(amounts, expected, f"engine={engine} seed={seed}")
+
+
+class WorkdayCountTests(TestCase):
+    def test_counts_match_day_by_day_loop(self):
+        rng = random.Random(5)
+        for _ in range(300):
+            month, year = rng.randint(1, 12), rng.choice([2024, 2025, 2026])
+            start_of_month = date(year, month, 1)
+            end_of_month = (start_of_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            # Khoảng nghỉ bắt đầu trước, kết thúc sau tháng, hoặc nằm hẳn ngoài tháng
+            intervals = []
+            for employee_id in range(1, 6):
+                for _ in range(rng.randint(1, 3)):
+                    from_date = start_of_month + timedelta(days=rng.randint(-40, 40))
+                    intervals.append((employee_id, from_date, from_date + timedelta(days=rng.randint(0, 45))))
+
+            self.assertEqual(
+                batch_count_leave_days(intervals, start_of_month, end_of_month),
+                rrule_count_leave_days(intervals, start_of_month, end_of_month)
+            )
+            for _, from_date, to_date in intervals:
+                days = [from_date + timedelta(days=offset) for offset in range((to_date - from_date).days + 1)]
+                self.assertEqual(count_workdays(from_date, to_date), (
+                    sum(1 for single_date in days if single_date.weekday() < 5),
+                    sum(1 for single_date in days if single_date.weekday() == 5),
+                ))
+
+
+class SalaryExportTests(TestCase):
+    def setUp(self):
+        other_department = Department.objects.create(name='Other', code='O')
+        self.employee, = create_employees(1)
+        other_employee, = create_employees(1, department=other_department, start=1)
+        SalaryRecord.objects.create(
+            employee=self.employee, month=3, year=2026, base_salary=Decimal('1234.50'),
+            gross_salary=Decimal('1234.50'), note='thưởng, "đặc biệt" <A&B>'
+        )
+        SalaryRecord.objects.create(employee=other_employee, month=3, year=2026, gross_salary=Decimal('99.00'))
+        self.client = api_client(create_manager())
+
+    def export(self, file_type):
+        response = self.client.get('/api/salary/export_salary_records/', {
+            'department': 'Test', 'month': 3, 'year': 2026, 'file_type': file_type
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="salary_2026_3.{file_type}"')
+        return response
+
+    def test_csv_export(self):
+        response = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        header, *rows = list(csv.reader(StringIO(content[1:])))
+        self.assertEqual(header[:3], ['Employee ID', 'Full name', 'Department'])
+        # Chỉ phòng ban được lọc, dấu phẩy/ngoặc kép trong ghi chú được quote đúng
+        self.assertEqual(rows, [[
+            self.employee.employee_id, 'Employee 0', 'Test', '3', '2026',
+            '1234.50', '0.00', '0.00', '0.00', '1234.50', 'thưởng, "đặc biệt" <A&B>'
+        ]])
+
+    def test_xlsx_export(self):
+        response = self.export('xlsx')
+        self.assertEqual(response['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(
+                set(archive.namelist()),
+                {'[Content_Types].xml', '_rels/.rels', 'xl/workbook.xml', 'xl/_rels/workbook.xml.rels', 'xl/worksheets/sheet1.xml'}
+            )
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row>'), 2)
+        self.assertIn('<t xml:space="preserve">Employee ID</t>', sheet)
+        self.assertIn('<c><v>1234.50</v></c>', sheet)
+        self.assertIn('thưởng, "đặc biệt" &lt;A&amp;B&gt;', sheet)
+
+
+class DepartmentSalarySummaryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.morning, self.afternoon = create_working_shifts()
+        self.employee, = create_employees(1)
+
+    def get_summary(self):
+        summary, = get_department_salary_summary(3, 2026)
+        return summary
+
+    def test_summary_is_cached(self):
+        create_monthly_records({(self.employee.id, 3, 2026)})
+        self.get_summary()
+        with self.assertNumQueries(0):
+            self.get_summary()
+
+    def test_salary_record_save_busts_cache(self):
+        create_monthly_records({(self.employee.id, 3, 2026)})
+        self.assertEqual(self.get_summary()['total_gross_salary'], '0.00')
+        salary_record = SalaryRecord.objects.get(employee=self.employee)
+        salary_record.gross_salary = Decimal('10.00')
+        salary_record.save()
+        self.assertEqual(self.get_summary()['total_gross_salary'], '10.00')
+
+    def test_new_monthly_records_bust_cache(self):
+        create_monthly_records({(self.employee.id, 3, 2026)})
+        self.assertEqual(self.get_summary()['headcount'], 1)
+        # bulk_create không qua signal
+        other_employee, = create_employees(1, start=1)
+        create_monthly_records({(other_employee.id, 3, 2026)})
+        self.assertEqual(self.get_summary()['headcount'], 2)
+
+    def test_payroll_calculation_busts_cache(self):
+        TimeSheet.objects.create(
+            employee=self.employee, date=date(2026, 3, 2), shift=self.morning,
+            check_in_time=self.morning.start_time, check_out_time=self.morning.end_time, status=TimeSheet.Status.PRESENT
+        )
+        self.assertEqual(self.get_summary()['total_gross_salary'], '0.00')
+        # bulk_update không qua signal
+        batch_calculate_monthly_salaries(3, 2026)
+        self.assertEqual(self.get_summary()['total_gross_salary'], str(SalaryRecord.objects.get(employee=self.employee).gross_salary))
+        self.assertNotEqual(self.get_summary()['total_gross_salary'], '0.00')
+
+
+class PayrollDryRunTests(TestCase):
+    def setUp(self):
+        self.morning, self.afternoon = create_working_shifts()
+        self.employee, = create_employees(1)
+
+    def add_day_of_attendance(self, day):
+        for shift in (self.morning, self.afternoon):
+            TimeSheet.objects.create(
+                employee=self.employee, date=day, shift=shift,
+                check_in_time=shift.start_time, check_out_time=shift.end_time, status=TimeSheet.Status.PRESENT
+            )
+
+    def test_dry_run_rebuilds_rollup_like_a_real_run(self):
+        self.add_day_of_attendance(date(2026, 3, 2))
+        execute_payroll_run(start_payroll_run(3, 2026))
+        TimeSheet.objects.filter(shift=self.afternoon).update(status=TimeSheet.Status.ABSENT, worked_minutes=Decimal('0.00'))
+
+        diff = diff_monthly_salaries(3, 2026)
+        self.assertEqual(diff['changed_count'], 1)
+        # Dry run không ghi gì: MonthlyAttendance vẫn giữ số cũ cho tới lần chạy thật
+        attendance = MonthlyAttendance.objects.get(employee=self.employee, month=3, year=2026)
+        self.assertEqual(attendance.present_count, 2)
+
+        execute_payroll_run(start_payroll_run(3, 2026))
+        salary_record = SalaryRecord.objects.get(employee=self.employee, month=3, year=2026)
+        new_gross_salary = diff['changes'][0]['changes']['gross_salary']['new']
+        self.assertEqual(str(salary_record.gross_salary), new_gross_salary)
+        self.assertEqual(diff_monthly_salaries(3, 2026)['changed_count'], 0)
+
+    def test_rerun_does_not_repeat_year_end_note(self):
+        self.add_day_of_attendance(date(2025, 12, 1))
+        for engine in PAYROLL_ENGINES:
+            for _ in range(2):
+                execute_payroll_run(start_payroll_run(12, 2025), engine=engine)
+            salary_record = SalaryRecord.objects.get(employee=self.employee, month=12, year=2025)
+            self.assertEqual(salary_record.note, "thưởng phép năm 1500000")
+
+        # Đổi từ thưởng sang cắt thưởng: thay ghi chú cũ thay vì thêm vào
+        LeaveBalance.objects.update_or_create(employee=self.employee, year=2025, defaults={'used_leaves': 7})
+        execute_payroll_run(start_payroll_run(12, 2025))
+        salary_record = SalaryRecord.objects.get(employee=self.employee, month=12, year=2025)
+        self.assertEqual(salary_record.note, "cắt thưởng phép năm")
+
+
+class MaterialiseAbsencesTests(TestCase):
+    def test_rerun_closes_open_rows_once(self):
+        morning, afternoon = create_working_shifts()
+        incomplete_employee, late_employee, absent_employee = create_employees(3)
+        day = date(2026, 3, 2)
+        for employee, status in ((incomplete_employee, TimeSheet.Status.INCOMPLETE), (late_employee, TimeSheet.Status.LATE)):
+            TimeSheet.objects.create(employee=employee, date=day, shift=morning, check_in_time=time(8, 30), status=status)
+            TimeSheet.objects.create(
+                employee=employee, date=day, shift=afternoon,
+                check_in_time=time(13, 30), check_out_time=time(17), status=TimeSheet.Status.LATE
+            )
+
+        output = StringIO()
+        call_command('materialise_absences', '--from', '2026-03-02', stdout=output)
+        self.assertIn("2 absent, 0 on leave, 2 closed without check-out.", output.getvalue())
+        statuses = dict(TimeSheet.objects.filter(shift=morning).values_list('employee_id', 'status'))
+        self.assertEqual(set(statuses.values()), {TimeSheet.Status.ABSENT})
+        # Dòng LATE đã check-out giữ nguyên, bộ đếm chỉ còn ca chiều
+        self.assertEqual(TimeSheet.objects.get(employee=late_employee, shift=afternoon).status, TimeSheet.Status.LATE)
+        self.assertEqual(MonthlyAttendance.objects.get(employee=late_employee, month=3, year=2026).late_count, 1)
+
+        rows = list(TimeSheet.objects.order_by('id').values('id', 'status', 'note', 'updated_at'))
+        output = StringIO()
+        call_command('materialise_absences', '--from', '2026-03-02', stdout=output)
+        self.assertIn("0 absent, 0 on leave, 0 closed without check-out.", output.getvalue())
+        self.assertEqual(list(TimeSheet.objects.order_by('id').values('id', 'status', 'note', 'updated_at')), rows)
+
+
+class AttendanceImportTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.morning, self.afternoon = create_working_shifts()
+        self.employee, self.lone_punch_employee = create_employees(2)
+        self.client = api_client(create_manager())
+
+    def test_upload_is_queued_and_imported_by_worker(self):
+        log_file = SimpleUploadedFile('log.csv', (
+            "employee_id,timestamp\n"
+            f"{self.employee.employee_id},2026-03-02 07:58:00\n"
+            f"{self.employee.employee_id},2026-03-02 12:01:00\n"
+            f"{self.lone_punch_employee.employee_id},2026-03-02 08:40:00\n"
+            "UNKNOWN,2026-03-02 08:00:00\n"
+        ).encode())
+        response = self.client.post('/api/timesheet/import_attendance_logs/', {'file': log_file}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        import_id = response.data['data']['id']
+        self.assertEqual(response.data['data']['status'], AttendanceImport.Status.QUEUED)
+        # Request không import gì, chỉ lưu file
+        self.assertFalse(TimeSheet.objects.exists())
+
+        self.assertEqual(len(execute_queued_attendance_imports()), 1)
+        response = self.client.get('/api/timesheet/get_attendance_import/', {'id': import_id})
+        self.assertEqual(response.data['status'], AttendanceImport.Status.SUCCESS)
+        self.assertEqual((response.data['punch_count'], response.data['reject_count']), (3, 1))
+        self.assertEqual(response.data['incomplete_count'], 1)
+        self.assertEqual(response.data['incompletes'][0]['employee_id'], self.lone_punch_employee.employee_id)
+
+        self.assertEqual(TimeSheet.objects.get(employee=self.employee).status, TimeSheet.Status.PRESENT)
+        # Một lần chấm duy nhất (8:40) không bị coi là check-in trễ
+        lone_timesheet = TimeSheet.objects.get(employee=self.lone_punch_employee)
+        self.assertEqual((lone_timesheet.status, lone_timesheet.check_out_time), (TimeSheet.Status.INCOMPLETE, None))
+
+    def test_upload_without_required_columns_is_rejected(self):
+        log_file = SimpleUploadedFile('log.csv', b"name,timestamp\nA,2026-03-02 08:00:00\n")
+        response = self.client.post('/api/timesheet/import_attendance_logs/', {'file': log_file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AttendanceImport.objects.exists())
+
+    def test_punch_completed_in_a_later_batch_is_not_incomplete(self):
+        lines = [
+            "employee_id,timestamp",
+            f"{self.employee.employee_id},2026-03-02 08:00:00",
+            f"{self.lone_punch_employee.employee_id},2026-03-02 08:00:00",
+            f"{self.employee.employee_id},2026-03-02 12:00:00",
+        ]
+        result = import_attendance_logs(lines, batch_size=1)
+        self.assertEqual(result['incomplete_count'], 1)
+        self.assertEqual(TimeSheet.objects.get(employee=self.employee).status, TimeSheet.Status.PRESENT)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_do_not_scan_large_tables(self):
+        morning, afternoon = create_working_shifts()
+        employees = create_employees(5)
+        create_manager()
+        current_date = timezone.localtime(timezone.now()).date()
+        for employee in employees:
+            for shift in (morning, afternoon):
+                TimeSheet.objects.create(
+                    employee=employee, date=current_date.replace(day=1), shift=shift,
+                    check_in_time=shift.start_time, check_out_time=shift.end_time, status=TimeSheet.Status.PRESENT
+                )
+            LeaveRequest.objects.create(employee=employee, from_date=current_date, to_date=current_date)
+            OvertimeRequest.objects.create(employee=employee, date=current_date, from_time=time(18), to_time=time(20))
+
+        output = StringIO()
+        try:
+            call_command('check_query_plans', stdout=output)
+        except CommandError as error:
+            self.fail(f"{error}\n{output.getvalue()}")
+
+
+class TimesheetUpsertTests(TestCase):
+    def setUp(self):
+        self.morning, _ = create_working_shifts()
+        self.employee, = create_employees(1)
+
+    def test_repeated_check_in_writes_one_row(self):
+        self.assertTrue(upsert_check_in(self.employee.id, self.morning, date(2026, 3, 2), time(8), TimeSheet.Status.INCOMPLETE))
+        self.assertIsNone(upsert_check_in(self.employee.id, self.morning, date(2026, 3, 2), time(8, 1), TimeSheet.Status.INCOMPLETE))
+        # Journal phát lại cùng check-in: không ghi đè dòng đã check-in
+        upsert_check_in_rows([
+            (self.employee.id, date(2026, 3, 2), self.morning, time(8, 2), TimeSheet.Status.INCOMPLETE),
+            (self.employee.id, date(2026, 3, 2), self.morning, time(8, 3), TimeSheet.Status.INCOMPLETE),
+        ])
+        timesheet = TimeSheet.objects.get()
+        self.assertEqual(timesheet.check_in_time, time(8))
+
+    def test_repeated_overtime_check_in_writes_one_row(self):
+        OvertimeRequest.objects.create(
+            employee=self.employee, date=date(2026, 3, 2), from_time=time(18), to_time=time(20),
+            status=OvertimeRequest.Status.APPROVED
+        )
+        self.assertTrue(upsert_overtime_check_in(self.employee.id, date(2026, 3, 2), time(18)))
+        self.assertIsNone(upsert_overtime_check_in(self.employee.id, date(2026, 3, 2), time(18, 5)))
+        self.assertEqual(TimeSheet.objects.filter(is_overtime=True).count(), 1)
+
+
+class TimesheetConstraintMigrationTests(TransactionTestCase):
+    migrate_from = [('api', '0004_payrollrun_shards')]
+    migrate_to = [('api', '0005_timesheet_unique_constraints')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicate_overtime_rows_are_removed_before_constraint(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        old_apps = executor.loader.project_state(self.migrate_from).apps
+        user = old_apps.get_model('auth', 'User').objects.create(username='employee')
+        department = old_apps.get_model('api', 'Department').objects.create(name='Test', code='T')
+        position = old_apps.get_model('api', 'Position').objects.create(
+            name='Staff', code='P', salary_base=1, salary_insufficient_work=1, salary_overtime=1, attendance_bonus=1
+        )
+        employee = old_apps.get_model('api', 'Employee').objects.create(
+            user=user, department=department, position=position, employee_id='T001'
+        )
+        OldTimeSheet = old_apps.get_model('api', 'TimeSheet')
+        for check_in_time, check_out_time in [(time(18, 5), None), (time(18), time(20)), (None, None)]:
+            OldTimeSheet.objects.create(
+                employee=employee, date=date(2026, 3, 2), is_overtime=True,
+                check_in_time=check_in_time, check_out_time=check_out_time, status='PRESENT'
+            )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        new_apps = executor.loader.project_state(self.migrate_to).apps
+        kept = list(new_apps.get_model('api', 'TimeSheet').objects.values_list('check_in_time', 'check_out_time'))
+        self.assertEqual(kept, [(time(18), time(20))])
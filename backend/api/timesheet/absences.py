@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from ..submodels.models_employee import Employee
+from ..submodels.models_timesheet import TimeSheet, LeaveRequest
+from ..salary.payroll import record_timesheet_changes
+from ..shifts import get_shifts, is_shift_day
+from .counters import rebuild_attendance_counters
+
+
+MISSING_CHECK_OUT_NOTE = 'No check-out.'
+# Trạng thái lúc check-in (get_check_in_status): dòng nào còn thiếu check-out là ca chưa đóng
+OPEN_SHIFT_STATUSES = [TimeSheet.Status.INCOMPLETE, TimeSheet.Status.LATE]
+
+
+def find_unrecorded_shifts(single_date, shifts):
+    """
+    One query over active employees: for each (employee, shift) of the day
+    without a TimeSheet row, whether an approved leave covers the day.
+    Returns [(employee_id, shift, on_leave)].
+    """
+    employees = Employee.objects.filter(
+        Q(is_active=True) &
+        (Q(join_date__isnull=True) | Q(join_date__lte=single_date)) &
+        (Q(contract_end_date__isnull=True) | Q(contract_end_date__gte=single_date))
+    ).annotate(
+        on_leave=Exists(LeaveRequest.objects.filter(
+            employee_id=OuterRef('pk'),
+            status=LeaveRequest.Status.APPROVED,
+            from_date__lte=single_date,
+            to_date__gte=single_date
+        )),
+        **{
+            f'has_{shift.shift_type.lower()}': Exists(TimeSheet.objects.filter(
+                employee_id=OuterRef('pk'),
+                date=single_date,
+                shift_id=shift.id
+            ))
+            for shift in shifts
+        }
+    )
+
+    unrecorded = []
+    for employee in employees.only('id'):
+        for shift in shifts:
+            if not getattr(employee, f'has_{shift.shift_type.lower()}'):
+                unrecorded.append((employee.id, shift, employee.on_leave))
+    return unrecorded
+
+def materialise_absences(single_date, batch_size=1000):
+    """
+    Record the day's missing attendance: an ABSENT (or LEAVE, when an
+    approved leave covers the day) row for every active employee and
+    working shift without a TimeSheet row, and close shift rows checked in
+    (INCOMPLETE or LATE) but never checked out as ABSENT. Safe to re-run:
+    existing rows are never touched again, and ignore_conflicts skips
+    rows written concurrently. Closed rows bypass the TimeSheet signals, so
+    their counters are rebuilt and their payroll marked dirty here. Returns
+    (absent_count, leave_count, closed_count).
+    """
+    shifts = [shift for shift in get_shifts().values() if is_shift_day(shift.shift_type, single_date)]
+    if not shifts:
+        return 0, 0, 0
+
+    timesheets = [
+        TimeSheet(
+            employee_id=employee_id,
+            date=single_date,
+            shift=shift,
+            status=TimeSheet.Status.LEAVE if on_leave else TimeSheet.Status.ABSENT
+        )
+        for employee_id, shift, on_leave in find_unrecorded_shifts(single_date, shifts)
+    ]
+    # Dòng ABSENT/LEAVE mới không đóng góp vào bộ đếm MonthlyAttendance hay lương
+    with transaction.atomic():
+        TimeSheet.objects.bulk_create(timesheets, batch_size=batch_size, ignore_conflicts=True)
+        open_timesheets = TimeSheet.objects.select_for_update().filter(
+            date=single_date,
+            shift__isnull=False,
+            status__in=OPEN_SHIFT_STATUSES,
+            check_out_time__isnull=True
+        )
+        closed_employee_ids = list(open_timesheets.values_list('employee_id', flat=True))
+        closed_count = open_timesheets.update(
+            status=TimeSheet.Status.ABSENT,
+            note=Coalesce('note', Value(MISSING_CHECK_OUT_NOTE)),
+            updated_at=timezone.now()
+        )
+        if closed_employee_ids:
+            employee_dates = {(employee_id, single_date) for employee_id in closed_employee_ids}
+            record_timesheet_changes(employee_dates)
+            rebuild_attendance_counters(employee_dates)
+
+    leave_count = sum(1 for timesheet in timesheets if timesheet.status == TimeSheet.Status.LEAVE)
+    return len(timesheets) - leave_count, leave_count, closed_count
@@ -0,0 +1,257 @@
+import csv
+import io
+from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..submodels.models_employee import Employee
+from ..submodels.models_timesheet import TimeSheet, AttendanceImport
+from ..salary.payroll import record_timesheet_changes
+from ..shifts import get_shifts, is_shift_day, get_check_in_status, get_minutes_early, get_check_out_status
+from .upserts import upsert_timesheet_rows
+from .counters import rebuild_attendance_counters
+
+
+# Lần chấm công cách ca gần nhất quá số phút này thì bị loại
+PUNCH_MARGIN_MINUTES = 120
+# Số dòng bị loại trả về trong response, tổng số vẫn được đếm đủ
+MAX_REPORTED_REJECTS = 1000
+
+
+class AttendanceImportError(Exception):
+    pass
+
+
+def minute_of_day(value):
+    return value.hour * 60 + value.minute + value.second / 60
+
+def match_shift(shifts, punch_date, punch_time):
+    """
+    Shift a punch belongs to: the one whose [start, end] contains it, else
+    the nearest one within PUNCH_MARGIN_MINUTES (ties go to the earlier
+    shift, so a lunch-time punch closes the morning shift).
+    """
+    punch_minute = minute_of_day(punch_time)
+    best_shift, best_distance = None, None
+    for shift in shifts:
+        if not (shift.start_time and shift.end_time and is_shift_day(shift.shift_type, punch_date)):
+            continue
+        start_minute, end_minute = minute_of_day(shift.start_time), minute_of_day(shift.end_time)
+        distance = max(start_minute - punch_minute, punch_minute - end_minute, 0)
+        if distance > PUNCH_MARGIN_MINUTES:
+            continue
+        if best_distance is None or (distance, start_minute) < (best_distance, minute_of_day(best_shift.start_time)):
+            best_shift, best_distance = shift, distance
+    return best_shift
+
+def parse_punch_time(row, columns):
+    if 'timestamp' in columns:
+        value = row[columns['timestamp']].strip().replace('/', '-')
+        return datetime.fromisoformat(value)
+    value = f"{row[columns['date']].strip().replace('/', '-')} {row[columns['time']].strip()}"
+    return datetime.fromisoformat(value)
+
+def read_columns(header):
+    columns = {name.strip().lower(): index for index, name in enumerate(header or [])}
+    if 'employee_id' not in columns or not ('timestamp' in columns or {'date', 'time'} <= set(columns)):
+        raise AttendanceImportError("The file must have an employee_id column and either timestamp or date and time columns.")
+    return columns
+
+def add_punch_time(times, value):
+    # times = [lần chấm đầu, lần chấm cuối]
+    times[0] = min(times[0], value)
+    times[1] = max(times[1], value)
+
+def build_timesheet_row(shifts_by_id, key, check_in_time, check_out_time):
+    employee_id, single_date, shift_id = key
+    shift = shifts_by_id[shift_id]
+    if not check_out_time:
+        # Chỉ có một lần chấm: không biết là vào hay ra nên không xét LATE, để INCOMPLETE cho quản lý kiểm tra
+        return (employee_id, single_date, shift_id, check_in_time, None, TimeSheet.Status.INCOMPLETE)
+    timesheet_status = get_check_in_status(shift, single_date, check_in_time)
+    timesheet_status = get_check_out_status(timesheet_status, get_minutes_early(shift, single_date, check_out_time))
+    return (employee_id, single_date, shift_id, check_in_time, check_out_time, timesheet_status)
+
+def flush_punches(punches, shifts_by_id):
+    """
+    Merge a batch of aggregated punches ({(employee, date, shift): [first,
+    last]}) with the rows already in TimeSheet, so a key spread over
+    several batches (or already checked in through the app) keeps its
+    earliest and latest time, then upsert the batch. Returns the number of
+    rows upserted and the keys left with a single punch.
+    """
+    employee_ids = {employee_id for employee_id, _, _ in punches}
+    dates = [single_date for _, single_date, _ in punches]
+    existing_rows = TimeSheet.objects.filter(
+        employee_id__in=employee_ids,
+        date__range=(min(dates), max(dates)),
+        shift__isnull=False
+    ).values_list('employee_id', 'date', 'shift_id', 'check_in_time', 'check_out_time')
+    for employee_id, single_date, shift_id, check_in_time, check_out_time in existing_rows:
+        times = punches.get((employee_id, single_date, shift_id))
+        if times is None:
+            continue
+        for value in (check_in_time, check_out_time):
+            if value:
+                add_punch_time(times, value)
+
+    rows = []
+    lone_keys = []
+    for key, (first, last) in punches.items():
+        if last == first:
+            lone_keys.append(key)
+        rows.append(build_timesheet_row(shifts_by_id, key, first, last if last > first else None))
+
+    with transaction.atomic():
+        upsert_timesheet_rows(rows)
+        employee_dates = {(employee_id, single_date) for employee_id, single_date, _ in punches}
+        record_timesheet_changes(employee_dates)
+        rebuild_attendance_counters(employee_dates)
+    return len(rows), lone_keys
+
+def import_attendance_logs(lines, batch_size=None, on_reject=None):
+    """
+    Stream-parse a fingerprint terminal CSV export (employee_id plus
+    timestamp, or date and time columns) into shift TimeSheet rows. The
+    first punch of an employee's shift is the check-in and the last one the
+    check-out; LATE/EARLY_LEAVE follow the same rules as the check-in and
+    check-out endpoints. A shift with a single punch cannot tell a check-in
+    from a check-out: it is stored INCOMPLETE and reported in incompletes.
+    The API's refusals (check-in window, 30 minutes, two early leaves a
+    month) are not applied, the punches already happened. Punches are
+    aggregated and upserted every batch_size (employee, date, shift) keys,
+    so memory does not grow with the file.
+    """
+    batch_size = batch_size or settings.ATTENDANCE_IMPORT_BATCH_SIZE
+    reader = csv.reader(lines)
+    columns = read_columns(next(reader, None))
+    shifts = list(get_shifts().values())
+    shifts_by_id = {shift.id: shift for shift in shifts}
+    employee_ids = dict(Employee.objects.filter(is_active=True, employee_id__isnull=False).values_list('employee_id', 'id'))
+    employee_codes = {employee_id: employee_code for employee_code, employee_id in employee_ids.items()}
+
+    result = {
+        'row_count': 0,
+        'punch_count': 0,
+        'upserted_count': 0,
+        'incomplete_count': 0,
+        'incompletes': [],
+        'reject_count': 0,
+        'rejects': []
+    }
+
+    def reject(line, employee_code, error):
+        result['reject_count'] += 1
+        rejected = {'line': line, 'employee_id': employee_code, 'error': error}
+        if len(result['rejects']) < MAX_REPORTED_REJECTS:
+            result['rejects'].append(rejected)
+        if on_reject:
+            on_reject(rejected)
+
+    incomplete_keys = {}
+
+    def flush(punches):
+        upserted_count, lone_keys = flush_punches(punches, shifts_by_id)
+        result['upserted_count'] += upserted_count
+        # Key đã INCOMPLETE ở batch trước mà được chấm tiếp thì dòng đã được ghi đè bằng dòng đủ vào/ra
+        for key in punches:
+            incomplete_keys.pop(key, None)
+        incomplete_keys.update(dict.fromkeys(lone_keys))
+
+    punches = {}
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        result['row_count'] += 1
+        try:
+            employee_code = row[columns['employee_id']].strip()
+            punched_at = parse_punch_time(row, columns)
+        except (IndexError, ValueError):
+            reject(reader.line_num, None, "Malformed row.")
+            continue
+
+        employee_id = employee_ids.get(employee_code)
+        if employee_id is None:
+            reject(reader.line_num, employee_code, "Employee not found.")
+            continue
+        shift = match_shift(shifts, punched_at.date(), punched_at.time())
+        if shift is None:
+            reject(reader.line_num, employee_code, "No working shift matches this punch time.")
+            continue
+
+        punch_time = punched_at.time().replace(microsecond=0)
+        times = punches.setdefault((employee_id, punched_at.date(), shift.id), [punch_time, punch_time])
+        add_punch_time(times, punch_time)
+        result['punch_count'] += 1
+        if len(punches) >= batch_size:
+            flush(punches)
+            punches = {}
+
+    if punches:
+        flush(punches)
+
+    result['incomplete_count'] = len(incomplete_keys)
+    for employee_id, single_date, shift_id in list(incomplete_keys)[:MAX_REPORTED_REJECTS]:
+        result['incompletes'].append({
+            'employee_id': employee_codes[employee_id],
+            'date': single_date.isoformat(),
+            'shift': shifts_by_id[shift_id].shift_type,
+            'error': "Only one punch for this shift, recorded as INCOMPLETE."
+        })
+    return result
+
+def check_attendance_log_header(log_file):
+    # Kiểm tra header ngay khi upload để báo lỗi 400 thay vì để worker báo FAILED
+    lines = io.TextIOWrapper(log_file, encoding='utf-8-sig', newline='')
+    try:
+        read_columns(next(csv.reader(lines), None))
+    finally:
+        lines.detach()
+        log_file.seek(0)
+
+def queue_attendance_import(log_file, triggered_by=None):
+    # API chỉ lưu file, tiến trình import_attendance_logs --process-queue mới thực sự import
+    check_attendance_log_header(log_file)
+    return AttendanceImport.objects.create(file=log_file, triggered_by=triggered_by)
+
+def claim_queued_attendance_imports():
+    """
+    Move QUEUED imports to RUNNING, oldest first, and return the ones this
+    process claimed. The conditional UPDATE makes concurrent workers claim
+    each import at most once.
+    """
+    claimed_imports = []
+    for import_id in AttendanceImport.objects.filter(status=AttendanceImport.Status.QUEUED).order_by('created_at').values_list('id', flat=True):
+        current = timezone.now()
+        claimed = AttendanceImport.objects.filter(id=import_id, status=AttendanceImport.Status.QUEUED).update(
+            status=AttendanceImport.Status.RUNNING,
+            started_at=current,
+            updated_at=current
+        )
+        if claimed:
+            claimed_imports.append(AttendanceImport.objects.get(id=import_id))
+    return claimed_imports
+
+def execute_attendance_import(attendance_import, batch_size=None):
+    """
+    Import a claimed AttendanceImport and store its counts. Batches are
+    committed one by one, so a FAILED import may have written the batches
+    before the error; importing the file again is safe (rows are upserted).
+    """
+    try:
+        with attendance_import.file.open('rb') as log_file:
+            lines = io.TextIOWrapper(log_file, encoding='utf-8-sig', newline='')
+            result = import_attendance_logs(lines, batch_size)
+        for field in ['row_count', 'punch_count', 'upserted_count', 'incomplete_count', 'incompletes', 'reject_count', 'rejects']:
+            setattr(attendance_import, field, result[field])
+        attendance_import.status = AttendanceImport.Status.SUCCESS
+    except Exception as error:
+        print("error_attendance_import:", error)
+        attendance_import.status = AttendanceImport.Status.FAILED
+        attendance_import.error = str(error)
+    attendance_import.finished_at = timezone.now()
+    attendance_import.save()
+    return attendance_import
+
+def execute_queued_attendance_imports(batch_size=None):
+    return [execute_attendance_import(attendance_import, batch_size) for attendance_import in claim_queued_attendance_imports()]
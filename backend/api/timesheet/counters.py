@@ -0,0 +1,205 @@
+import calendar
+from datetime import date
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from ..submodels.models_timesheet import TimeSheet, LeaveRequest, MonthlyAttendance
+from ..workdays import batch_count_leave_days, count_leave_days
+
+
+COUNTER_FIELDS = ['early_leave_count', 'late_count', 'present_count', 'worked_minutes', 'overtime_minutes', 'leave_days']
+# Các trạng thái được tính là có đi làm (giống calculate_timesheet_summary)
+ATTENDED_STATUSES = [TimeSheet.Status.PRESENT, TimeSheet.Status.EARLY_LEAVE]
+COUNTER_SOURCE_FIELDS = ['employee_id', 'date', 'shift_id', 'status', 'worked_minutes', 'overtime_hours']
+LEAVE_SOURCE_FIELDS = ['employee_id', 'from_date', 'to_date', 'status']
+REBUILD_CHUNK_SIZE = 2000
+
+
+def empty_counters():
+    counters = dict.fromkeys(COUNTER_FIELDS, 0)
+    counters['worked_minutes'] = Decimal('0.00')
+    counters['overtime_minutes'] = Decimal('0.00')
+    counters['leave_days'] = Decimal('0.0')
+    return counters
+
+def get_month_range(month, year):
+    start_of_month = date(year, month, 1)
+    return start_of_month, date(year, month, calendar.monthrange(year, month)[1])
+
+def attendance_counters(shift_id, status, worked_minutes, overtime_hours):
+    """
+    What a single TimeSheet row adds to its month's MonthlyAttendance.
+    Worked minutes are the row's persisted, break-aware worked_minutes.
+    """
+    counters = empty_counters()
+    if status == TimeSheet.Status.EARLY_LEAVE:
+        counters['early_leave_count'] = 1
+    if status == TimeSheet.Status.LATE:
+        counters['late_count'] = 1
+    if status in ATTENDED_STATUSES:
+        if shift_id is not None:
+            counters['present_count'] = 1
+            counters['worked_minutes'] = Decimal(str(worked_minutes or 0))
+        counters['overtime_minutes'] = Decimal(str(overtime_hours or 0)) * 60
+    return counters
+
+def timesheet_attendance_counters(timesheet):
+    return attendance_counters(
+        timesheet.shift_id,
+        timesheet.status,
+        timesheet.worked_minutes,
+        timesheet.overtime_hours
+    )
+
+def leave_request_counters(from_date, to_date, status):
+    """
+    What an approved leave request adds to each month it spans, as
+    {(month, year): counters}. Other statuses add nothing.
+    """
+    if status != LeaveRequest.Status.APPROVED or not from_date or not to_date:
+        return {}
+    counters_by_month = {}
+    month, year = from_date.month, from_date.year
+    while date(year, month, 1) <= to_date:
+        start_of_month, end_of_month = get_month_range(month, year)
+        leave_days = count_leave_days(max(from_date, start_of_month), min(to_date, end_of_month))
+        if leave_days:
+            counters = empty_counters()
+            counters['leave_days'] = Decimal(str(leave_days))
+            counters_by_month[(month, year)] = counters
+        month, year = (1, year + 1) if month == 12 else (month + 1, year)
+    return counters_by_month
+
+def apply_leave_delta(employee_id, old_counters_by_month, new_counters_by_month, rebuild_missing=True):
+    # Cộng phần chênh lệch số ngày phép vào từng tháng mà đơn nghỉ phép trải qua
+    for month, year in set(old_counters_by_month) | set(new_counters_by_month):
+        apply_attendance_delta(
+            employee_id,
+            date(year, month, 1),
+            old_counters_by_month.get((month, year), empty_counters()),
+            new_counters_by_month.get((month, year), empty_counters()),
+            rebuild_missing
+        )
+
+def apply_attendance_delta(employee_id, single_date, old_counters, new_counters, rebuild_missing=True):
+    """
+    Add new - old to the (employee, month) counters with F() expressions.
+    Callers run it inside the transaction of the write it accounts for
+    (TimeSheet/LeaveRequest.save() and delete() are atomic, the SQL upserts
+    open their own), so the row and the delta commit or roll back
+    together. A month without a counter row yet
+    (not provisioned) is rebuilt from TimeSheet instead, which already
+    includes the current write, unless rebuild_missing is False.
+    """
+    if not single_date:
+        return
+    delta = {
+        field: new_counters[field] - old_counters[field]
+        for field in COUNTER_FIELDS
+        if new_counters[field] != old_counters[field]
+    }
+    if not delta:
+        return
+    with transaction.atomic():
+        updated = MonthlyAttendance.objects.filter(
+            employee_id=employee_id,
+            month=single_date.month,
+            year=single_date.year
+        ).update(updated_at=timezone.now(), **{field: F(field) + value for field, value in delta.items()})
+        if not updated and rebuild_missing:
+            rebuild_monthly_attendance(single_date.month, single_date.year, [employee_id])
+
+def lock_monthly_attendance(month, year, employee_ids, whole_month=False):
+    """
+    Create the missing counter rows of (month, year) and lock them before a
+    rebuild reads TimeSheet. An apply_attendance_delta committed between
+    that read and the rebuild's write would otherwise be overwritten; with
+    the rows locked it either committed before the read (and is counted)
+    or waits and is applied on top of the rebuilt values.
+    """
+    MonthlyAttendance.objects.bulk_create(
+        [MonthlyAttendance(employee_id=employee_id, month=month, year=year) for employee_id in employee_ids],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+    attendances = MonthlyAttendance.objects.select_for_update().filter(month=month, year=year)
+    if not whole_month:
+        attendances = attendances.filter(employee_id__in=employee_ids)
+    # Khóa theo thứ tự employee_id để hai lần rebuild đồng thời không deadlock
+    list(attendances.order_by('employee_id').values_list('id', flat=True))
+
+def rebuild_monthly_attendance(month, year, employee_ids=None):
+    """
+    Recompute MonthlyAttendance of (month, year) from TimeSheet rows and
+    approved LeaveRequest rows, for the given employees or for everyone
+    with a timesheet, a leave or a counter row in that month. The counter
+    rows are locked first (lock_monthly_attendance), so concurrent deltas
+    are never lost. Returns the number of counter rows written.
+    """
+    start_of_month, end_of_month = get_month_range(month, year)
+    timesheets = TimeSheet.objects.filter(date__range=(start_of_month, end_of_month))
+    leave_requests = LeaveRequest.objects.filter(
+        status=LeaveRequest.Status.APPROVED,
+        from_date__lte=end_of_month,
+        to_date__gte=start_of_month
+    )
+    whole_month = employee_ids is None
+    with transaction.atomic():
+        if whole_month:
+            # Bộ đếm của nhân viên không còn bản ghi nào trong tháng được đưa về 0
+            employee_ids = (
+                set(MonthlyAttendance.objects.filter(month=month, year=year).values_list('employee_id', flat=True))
+                | set(timesheets.values_list('employee_id', flat=True).distinct())
+                | set(leave_requests.values_list('employee_id', flat=True).distinct())
+            )
+        else:
+            timesheets = timesheets.filter(employee_id__in=employee_ids)
+            leave_requests = leave_requests.filter(employee_id__in=employee_ids)
+        if not employee_ids:
+            return 0
+        lock_monthly_attendance(month, year, employee_ids, whole_month)
+        counters_by_employee = {employee_id: empty_counters() for employee_id in employee_ids}
+
+        for employee_id, _, shift_id, status, worked_minutes, overtime_hours in timesheets.values_list(
+            *COUNTER_SOURCE_FIELDS
+        ).iterator(chunk_size=REBUILD_CHUNK_SIZE):
+            counters = counters_by_employee.setdefault(employee_id, empty_counters())
+            for field, value in attendance_counters(shift_id, status, worked_minutes, overtime_hours).items():
+                counters[field] += value
+
+        leave_days = batch_count_leave_days(
+            leave_requests.values_list('employee_id', 'from_date', 'to_date'),
+            start_of_month,
+            end_of_month
+        )
+        for employee_id, days in leave_days.items():
+            counters_by_employee.setdefault(employee_id, empty_counters())['leave_days'] = Decimal(str(days))
+
+        MonthlyAttendance.objects.bulk_create(
+            [
+                MonthlyAttendance(employee_id=employee_id, month=month, year=year, **counters)
+                for employee_id, counters in counters_by_employee.items()
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['employee', 'month', 'year'],
+            update_fields=COUNTER_FIELDS + ['updated_at']
+        )
+    return len(counters_by_employee)
+
+def rebuild_attendance_counters(employee_dates):
+    # Dùng sau các lần ghi hàng loạt (flush journal, nhập log máy chấm công) thay cho F() từng dòng
+    employees_by_month = {}
+    for employee_id, single_date in employee_dates:
+        employees_by_month.setdefault((single_date.month, single_date.year), set()).add(employee_id)
+    for (month, year), employee_ids in employees_by_month.items():
+        rebuild_monthly_attendance(month, year, list(employee_ids))
+
+def get_early_leave_count(employee_id, month, year):
+    early_leave_count = MonthlyAttendance.objects.filter(
+        employee_id=employee_id,
+        month=month,
+        year=year
+    ).values_list('early_leave_count', flat=True).first()
+    return early_leave_count or 0
@@ -0,0 +1,190 @@
+import fcntl
+import glob
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta, time as datetime_time
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..submodels.models_timesheet import TimeSheet
+from ..salary.payroll import record_timesheet_changes
+from ..shifts import get_shifts
+from .counters import rebuild_attendance_counters
+from .upserts import upsert_check_in, upsert_check_in_rows
+
+
+CHECK_IN_INGESTION_SYNC = 'sync'
+CHECK_IN_INGESTION_BUFFERED = 'buffered'
+JOURNAL_FILE_NAME = 'check_ins.jsonl'
+JOURNAL_LOCK_FILE_NAME = 'check_ins.lock'
+FLUSH_LOCK_FILE_NAME = 'check_ins.flush.lock'
+# Mỗi check-in đã nhận có một file đánh dấu markers/<ngày>/<employee_id>.<ca> chứa entry của nó
+MARKER_DIR_NAME = 'markers'
+
+
+def is_buffered_check_in():
+    return settings.CHECK_IN_INGESTION_MODE == CHECK_IN_INGESTION_BUFFERED
+
+def journal_path(name):
+    return os.path.join(settings.CHECK_IN_JOURNAL_DIR, name)
+
+@contextmanager
+def journal_lock(name=JOURNAL_LOCK_FILE_NAME):
+    # Khóa file giữa các worker: ghi thêm và xoay journal không chen vào nhau
+    os.makedirs(settings.CHECK_IN_JOURNAL_DIR, exist_ok=True)
+    with open(journal_path(name), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def check_in_marker_path(employee_id, shift_type, check_in_date):
+    return os.path.join(settings.CHECK_IN_JOURNAL_DIR, MARKER_DIR_NAME, check_in_date.isoformat(), f"{employee_id}.{shift_type}")
+
+def create_check_in_marker(entry, path):
+    """
+    Atomically claim the (employee, shift, date) marker and store the entry
+    in it. Returns False when another request already claimed it: O_EXCL
+    makes the check and the claim one step across all workers of the host.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        marker = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(marker, 'w', encoding='utf-8') as marker_file:
+        marker_file.write(json.dumps(entry))
+    return True
+
+def read_check_in_marker(employee_id, shift_type, check_in_date):
+    # None khi chưa có marker hoặc marker vừa được tạo và chưa ghi xong
+    try:
+        with open(check_in_marker_path(employee_id, shift_type, check_in_date), encoding='utf-8') as marker_file:
+            return json.loads(marker_file.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def remove_old_check_in_markers():
+    # Giữ marker của hôm qua và hôm nay (ca qua nửa đêm), các ngày trước đó đã có trong TimeSheet
+    keep_from = (timezone.localtime(timezone.now()).date() - timedelta(days=1)).isoformat()
+    for path in glob.glob(os.path.join(settings.CHECK_IN_JOURNAL_DIR, MARKER_DIR_NAME, '*')):
+        if os.path.basename(path) < keep_from:
+            shutil.rmtree(path, ignore_errors=True)
+
+def append_check_in(employee_id, shift, check_in_date, check_in_time, check_in_status):
+    """
+    Record a check-in in the append-only journal and return its entry, or
+    None if the employee already checked in for this shift. Duplicates are
+    caught by a per-(employee, shift, date) marker file created with
+    O_EXCL, so the cost does not depend on the journal backlog; the global
+    journal lock is only held for the append itself. The entry is fsync'ed
+    before returning, so an acknowledged check-in survives a crash.
+    """
+    already_checked_in = TimeSheet.objects.filter(
+        employee_id=employee_id,
+        date=check_in_date,
+        shift=shift,
+        check_in_time__isnull=False
+    ).exists()
+    if already_checked_in:
+        return None
+
+    entry = {
+        'employee_id': employee_id,
+        'date': check_in_date.isoformat(),
+        'shift_type': shift.shift_type,
+        'check_in_time': check_in_time.isoformat(),
+        'status': check_in_status,
+    }
+    marker_path = check_in_marker_path(employee_id, shift.shift_type, check_in_date)
+    if not create_check_in_marker(entry, marker_path):
+        return None
+    try:
+        with journal_lock():
+            journal = open(journal_path(JOURNAL_FILE_NAME), 'a', encoding='utf-8')
+            journal.write(json.dumps(entry) + '\n')
+            journal.flush()
+        # fsync ngoài khóa: nếu journal vừa bị xoay, fd vẫn trỏ tới đúng file đã ghi
+        with journal:
+            os.fsync(journal.fileno())
+    except Exception:
+        # Chưa ghi được thì cho phép check-in lại
+        os.remove(marker_path)
+        raise
+    return entry
+
+def flush_employee_check_in(employee_id, shift, check_in_date):
+    """
+    Write one employee's buffered check-in for the shift straight into
+    TimeSheet, read from its marker, leaving the journal to
+    flush_check_ins. The later flush skips the entry because the row is
+    already checked in. Returns the TimeSheet row, or None.
+    """
+    entry = read_check_in_marker(employee_id, shift.shift_type, check_in_date)
+    if not entry:
+        return None
+    return upsert_check_in(
+        employee_id,
+        shift,
+        check_in_date,
+        datetime_time.fromisoformat(entry['check_in_time']),
+        entry['status']
+    )
+
+def rotate_journal():
+    # Đổi tên journal hiện tại để flush, các check-in mới ghi vào file mới
+    with journal_lock():
+        path = journal_path(JOURNAL_FILE_NAME)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            os.rename(path, journal_path(f"{JOURNAL_FILE_NAME}.{time.time_ns()}.flushing"))
+    return sorted(glob.glob(journal_path(f"{JOURNAL_FILE_NAME}.*.flushing")))
+
+def read_journal(path):
+    with open(path, encoding='utf-8') as journal:
+        for line in journal:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Dòng cuối bị ghi dở khi tiến trình chết giữa chừng
+                print("check_in_journal_error: skipped malformed line in", path)
+
+def flush_check_in_journal(batch_size=None):
+    """
+    Move journaled check-ins into TimeSheet with a multi-row upsert and run
+    the side effects the per-row signals would have run. Rows without a
+    check-in yet (e.g. ABSENT) are filled in, rows already checked in are
+    kept, so files left over by an interrupted flush can be replayed first.
+    Returns the number of entries processed.
+    """
+    batch_size = batch_size or settings.CHECK_IN_FLUSH_BATCH_SIZE
+    flushed = 0
+    # Chỉ một tiến trình flush tại một thời điểm
+    with journal_lock(FLUSH_LOCK_FILE_NAME):
+        for path in rotate_journal():
+            shifts = get_shifts()
+            rows = [
+                (
+                    entry['employee_id'],
+                    date.fromisoformat(entry['date']),
+                    shifts[entry['shift_type']],
+                    datetime_time.fromisoformat(entry['check_in_time']),
+                    entry['status'],
+                )
+                for entry in read_journal(path)
+            ]
+            with transaction.atomic():
+                upsert_check_in_rows(rows, batch_size)
+                employee_dates = {(employee_id, check_in_date) for employee_id, check_in_date, *_ in rows}
+                record_timesheet_changes(employee_dates)
+                rebuild_attendance_counters(employee_dates)
+            os.remove(path)
+            flushed += len(rows)
+        remove_old_check_in_markers()
+    return flushed
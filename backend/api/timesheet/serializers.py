@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from ..submodels.models_timesheet import *
 from django.utils import timezone
-from django.db.models import Q
-from datetime import datetime, timedelta
-from dateutil.rrule import rrule, DAILY
+from django.db.models import Q, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from datetime import date, datetime, timedelta
+from ..authentication import get_request_employee_id
 import calendar
 
 
@@ -21,14 +22,14 @@ class SendLeaveRequestSerializer(serializers.ModelSerializer):
     
     def send_request(self, request):
         try:
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             from_date = self.validated_data['from_date']
             to_date = self.validated_data['to_date']
             attachments = self.validated_data['attachments']
             note = self.validated_data['note']
             
             leave_request = LeaveRequest.objects.create(
-                employee=employee,
+                employee_id=employee_id,
                 from_date=from_date,
                 to_date=to_date,
                 attachments=attachments,
@@ -150,6 +151,119 @@ class ShiftDetailSerializer(serializers.ModelSerializer):
         model = TimeSheet
         fields = ['check_in_time','check_out_time','status','is_overtime','overtime_hours','note']
 
+def group_timesheets_by_day(timesheets):
+    """
+    Pivot TimeSheet rows (ordered by id, shift selected) into
+    {date: {'morning_shift', 'afternoon_shift', 'overtime_shift'}}, keeping
+    the first row of each slot like the old per-slot .first() queries.
+    """
+    grouped = {}
+    for timesheet in timesheets:
+        slots = grouped.setdefault(timesheet.date, {})
+        if timesheet.shift:
+            if timesheet.shift.shift_type == WorkingShift.ShiftType.MORNING:
+                slots.setdefault('morning_shift', timesheet)
+            elif timesheet.shift.shift_type == WorkingShift.ShiftType.AFTERNOON:
+                slots.setdefault('afternoon_shift', timesheet)
+        if timesheet.is_overtime:
+            slots.setdefault('overtime_shift', timesheet)
+    return grouped
+
+def serialize_timesheet_day(single_date, slots):
+    data = {"date": single_date}
+    for slot in ['morning_shift', 'afternoon_shift', 'overtime_shift']:
+        timesheet = slots.get(slot)
+        data[slot] = ShiftDetailSerializer(timesheet).data if timesheet else None
+    return data
+
+# Mã trạng thái 1 ký tự cho lịch nhóm, mỗi ngày gồm 3 ký tự: sáng, chiều, tăng ca
+TEAM_CALENDAR_CODES = {
+    TimeSheet.Status.PRESENT: 'P',
+    TimeSheet.Status.LATE: 'L',
+    TimeSheet.Status.EARLY_LEAVE: 'E',
+    TimeSheet.Status.ABSENT: 'A',
+    TimeSheet.Status.LEAVE: 'V',
+    TimeSheet.Status.INCOMPLETE: 'I',
+}
+TEAM_CALENDAR_EMPTY = '-'
+TEAM_CALENDAR_SLOTS = {
+    WorkingShift.ShiftType.MORNING: 0,
+    WorkingShift.ShiftType.AFTERNOON: 1,
+}
+TEAM_CALENDAR_OVERTIME_SLOT = 2
+
+def build_team_calendar(department, month, year):
+    """
+    Attendance grid of every active employee of a department for a month.
+    Each employee gets one 3-character code per day (morning, afternoon,
+    overtime). Built from one Employee, one TimeSheet and one LeaveRequest
+    query, pivoted in memory.
+    """
+    start_of_month = date(year, month, 1)
+    _, days_in_month = calendar.monthrange(year, month)
+    end_of_month = start_of_month.replace(day=days_in_month)
+
+    employees = list(Employee.objects.filter(
+        department__name=department,
+        is_active=True
+    ).order_by('employee_id').values('id', 'employee_id', 'full_name'))
+    grid = {
+        employee['id']: [[TEAM_CALENDAR_EMPTY] * 3 for _ in range(days_in_month)]
+        for employee in employees
+    }
+
+    timesheets = TimeSheet.objects.filter(
+        employee__department__name=department,
+        employee__is_active=True,
+        date__range=(start_of_month, end_of_month)
+    ).order_by('-id').values_list('employee_id', 'date', 'shift__shift_type', 'is_overtime', 'status')
+    # Duyệt id giảm dần để dòng có id nhỏ nhất (giống .first()) được ghi sau cùng
+    for employee_id, single_date, shift_type, is_overtime, timesheet_status in timesheets:
+        day = grid[employee_id][single_date.day - 1]
+        code = TEAM_CALENDAR_CODES.get(timesheet_status, TEAM_CALENDAR_EMPTY)
+        if shift_type in TEAM_CALENDAR_SLOTS:
+            day[TEAM_CALENDAR_SLOTS[shift_type]] = code
+        if is_overtime:
+            day[TEAM_CALENDAR_OVERTIME_SLOT] = code
+
+    leave_requests = LeaveRequest.objects.filter(
+        employee__department__name=department,
+        employee__is_active=True,
+        status=LeaveRequest.Status.APPROVED,
+        from_date__lte=end_of_month,
+        to_date__gte=start_of_month
+    ).values_list('employee_id', 'from_date', 'to_date')
+    leave_code = TEAM_CALENDAR_CODES[TimeSheet.Status.LEAVE]
+    for employee_id, from_date, to_date in leave_requests:
+        single_date = max(from_date, start_of_month)
+        while single_date <= min(to_date, end_of_month):
+            day = grid[employee_id][single_date.day - 1]
+            # Chủ nhật nghỉ, thứ 7 chỉ có ca sáng; ca đã chấm công thì giữ nguyên
+            weekday = single_date.weekday()
+            if weekday != 6:
+                if day[0] == TEAM_CALENDAR_EMPTY:
+                    day[0] = leave_code
+                if weekday != 5 and day[1] == TEAM_CALENDAR_EMPTY:
+                    day[1] = leave_code
+            single_date += timedelta(days=1)
+
+    return {
+        'department': department,
+        'month': month,
+        'year': year,
+        'days_in_month': days_in_month,
+        'legend': {code: timesheet_status for timesheet_status, code in TEAM_CALENDAR_CODES.items()},
+        'results': [
+            {
+                'id': employee['id'],
+                'employee_id': employee['employee_id'],
+                'full_name': employee['full_name'],
+                'codes': [''.join(day) for day in grid[employee['id']]],
+            }
+            for employee in employees
+        ],
+    }
+
 class SendOvertimeRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = OvertimeRequest
@@ -162,14 +276,14 @@ class SendOvertimeRequestSerializer(serializers.ModelSerializer):
     
     def send_request(self, request):
         try:
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             date = self.validated_data['date']
             from_time = self.validated_data['from_time']
             to_time = self.validated_data['to_time']
             note = self.validated_data['note']
 
             overtime_request = OvertimeRequest.objects.create(
-                employee=employee,
+                employee_id=employee_id,
                 date=date,
                 from_time=from_time,
                 to_time=to_time,
@@ -243,28 +357,33 @@ class ApproveOvertimeRequestSerializer(serializers.ModelSerializer):
 
 
 # ============================================== Working hours Statistics =========================================
-def calculate_working_hours(check_in_time, check_out_time):
-    if check_in_time and check_out_time:
-        datetime_in = datetime.combine(datetime.today().date(), check_in_time)
-        datetime_out = datetime.combine(datetime.today().date(), check_out_time)
-        total_time = datetime_out - datetime_in
-        return total_time.total_seconds() / 3600
-    return 0
-
-def calculate_working_days(employee, month, year):
-    start_of_month = datetime(year, month, 1).date()
-    _, last_day_num = calendar.monthrange(year, month)
-    end_of_month = datetime(year, month, last_day_num).date()
-    working_days = TimeSheet.objects.filter(
-        Q(employee=employee) &
-        Q(date__range=(start_of_month, end_of_month)) &
-        Q(shift__isnull=False) &
-        (Q(status=TimeSheet.Status.PRESENT) |
-        Q(status=TimeSheet.Status.EARLY_LEAVE))
-    ).count()
-    return working_days / 2
+def month_attendance(month, year, field):
+    # Subquery một cột MonthlyAttendance trong tháng của nhân viên ở dòng ngoài
+    attendances = MonthlyAttendance.objects.filter(
+        employee_id=OuterRef('employee_id'),
+        month=month,
+        year=year
+    ).values(field)[:1]
+    return Subquery(attendances, output_field=MonthlyAttendance._meta.get_field(field))
+
+def annotate_tracking_time(queryset, month, year):
+    """
+    Annotate EmployeeEvaluation rows with the month's attended shift count,
+    worked minutes, overtime minutes and leave days from the
+    MonthlyAttendance rollup, so a page of any size is served by a single
+    query.
+    """
+    return queryset.select_related('employee__department').annotate(
+        attended_shift_count=Coalesce(month_attendance(month, year, 'present_count'), 0),
+        total_worked_minutes=Coalesce(month_attendance(month, year, 'worked_minutes'), Decimal('0.00')),
+        total_overtime_minutes=Coalesce(month_attendance(month, year, 'overtime_minutes'), Decimal('0.00')),
+        total_leave_days=Coalesce(month_attendance(month, year, 'leave_days'), Decimal('0.0'))
+    )
 
 class TrackingTimeEmployeeManagementSerializer(serializers.ModelSerializer):
+    """
+    Expects a queryset from annotate_tracking_time.
+    """
     employee = serializers.SerializerMethodField()
     working_days = serializers.SerializerMethodField()
     regular_hours = serializers.SerializerMethodField()
@@ -285,81 +404,17 @@ class TrackingTimeEmployeeManagementSerializer(serializers.ModelSerializer):
         return data
     
     def get_working_days(self, obj):
-        current_date = timezone.localtime(timezone.now()).date()
-        month = self.context.get('month', current_date.month)
-        year = self.context.get('year', current_date.year)
-        working_days = calculate_working_days(obj.employee, month, year)
-        return working_days
+        # Mỗi ngày có 2 ca
+        return obj.attended_shift_count / 2
     
     def get_regular_hours(self, obj):
-        current_date = timezone.localtime(timezone.now()).date()
-        month = self.context.get('month', current_date.month)
-        year = self.context.get('year', current_date.year)
-        start_of_month = datetime(year, month, 1).date()
-        _, last_day_num = calendar.monthrange(year, month)
-        end_of_month = datetime(year, month, last_day_num).date()
-        timesheets = TimeSheet.objects.filter(
-            Q(employee=obj.employee) &
-            Q(date__range=(start_of_month, end_of_month)) &
-            (Q(status=TimeSheet.Status.PRESENT) |
-            Q(status=TimeSheet.Status.EARLY_LEAVE))
-        )
-        regular_hours = Decimal(0)
-        for timesheet in timesheets:
-            shift_hours = Decimal(calculate_working_hours(timesheet.check_in_time, timesheet.check_out_time))
-            regular_hours += shift_hours
-        
-        return round(regular_hours, 2)
+        return round(Decimal(str(obj.total_worked_minutes)) / 60, 2)
     
     def get_overtime_hours(self, obj):
-        current_date = timezone.localtime(timezone.now()).date()
-        month = self.context.get('month', current_date.month)
-        year = self.context.get('year', current_date.year)
-        start_of_month = datetime(year, month, 1).date()
-        _, last_day_num = calendar.monthrange(year, month)
-        end_of_month = datetime(year, month, last_day_num).date()
-        timesheets = TimeSheet.objects.filter(
-            employee=obj.employee,
-            shift__isnull=True,
-            date__range=(start_of_month, end_of_month),
-            status=TimeSheet.Status.PRESENT
-        )
-        overtime_hours = Decimal(0)
-        for timesheet in timesheets:
-            overtime_hours += timesheet.overtime_hours
-        
-        return overtime_hours
+        return round(Decimal(str(obj.total_overtime_minutes)) / 60, 2)
     
     def get_leave_days(self, obj):
-        current_date = timezone.localtime(timezone.now()).date()
-        month = self.context.get('month', current_date.month)
-        year = self.context.get('year', current_date.year)
-        start_of_month = datetime(year, month, 1).date()
-        _, last_day_num = calendar.monthrange(year, month)
-        end_of_month = datetime(year, month, last_day_num).date()
-        leave_requests = LeaveRequest.objects.filter(
-            Q(employee=obj.employee) &
-            Q(status=LeaveRequest.Status.APPROVED) &
-            Q(from_date__lte=end_of_month) & Q(to_date__gte=start_of_month)
-        )
-        leave_days = 0
-        weekdays_count = 0
-        saturday_count = 0
-        for leave_request in leave_requests:
-            start_date = max(leave_request.from_date, start_of_month)
-            end_date = min(leave_request.to_date, end_of_month)
-
-            for single_date in rrule(DAILY, dtstart=start_date, until=end_date):
-                weekday = single_date.weekday()
-                if weekday == 6:
-                    continue
-                elif weekday == 5:
-                    saturday_count += 1
-                else:
-                    weekdays_count += 1
-
-        leave_days += weekdays_count + saturday_count / 2
-        return leave_days
+        return obj.total_leave_days
     
     def get_content(self, obj):
         current_date = timezone.localtime(timezone.now()).date()
@@ -382,3 +437,31 @@ class TrackingTimeEmployeeManagementSerializer(serializers.ModelSerializer):
         except EmployeeEvaluation.DoesNotExist:
             print("evaluation not found.")
             return None
+
+
+class AttendanceImportSerializer(serializers.ModelSerializer):
+    triggered_by = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AttendanceImport
+        fields = [
+            'id',
+            'status',
+            'triggered_by',
+            'row_count',
+            'punch_count',
+            'upserted_count',
+            'incomplete_count',
+            'incompletes',
+            'reject_count',
+            'rejects',
+            'error',
+            'started_at',
+            'finished_at',
+            'created_at'
+        ]
+
+    def get_triggered_by(self, obj):
+        if obj.triggered_by:
+            return obj.triggered_by.username
+        return None
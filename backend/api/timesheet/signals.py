@@ -0,0 +1,93 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from ..submodels.models_timesheet import WorkingShift, TimeSheet, LeaveRequest
+from ..shifts import invalidate_shifts, get_shift_by_id, get_timesheet_minutes
+from .counters import (
+    empty_counters, COUNTER_SOURCE_FIELDS, LEAVE_SOURCE_FIELDS, attendance_counters, timesheet_attendance_counters,
+    apply_attendance_delta, leave_request_counters, apply_leave_delta
+)
+
+@receiver(post_save, sender=WorkingShift)
+@receiver(post_delete, sender=WorkingShift)
+def invalidate_working_shifts(sender, instance, **kwargs):
+    invalidate_shifts()
+
+
+@receiver(pre_save, sender=TimeSheet)
+def fill_timesheet_minutes(sender, instance, **kwargs):
+    # Bản ghi lưu qua ORM (admin, ...) cũng có số phút làm/trễ/về sớm đúng với giờ check-in/out
+    shift = get_shift_by_id(instance.shift_id) if instance.shift_id else None
+    for field, value in get_timesheet_minutes(shift, instance.check_in_time, instance.check_out_time).items():
+        setattr(instance, field, value)
+
+
+# ========================================= Monthly attendance counters =============================================
+# Chạy trong transaction của TimeSheet.save()/LeaveRequest.save() (và của Collector khi xóa),
+# select_for_update giữ dòng cũ tới khi bộ đếm được cập nhật xong
+@receiver(pre_save, sender=TimeSheet)
+def remember_old_attendance_counters(sender, instance, **kwargs):
+    # Lưu phần đóng góp cũ của bản ghi để post_save chỉ cộng phần chênh lệch
+    instance._old_attendance = None
+    if not instance.pk:
+        return
+    old_row = TimeSheet.objects.select_for_update().filter(pk=instance.pk).values_list(*COUNTER_SOURCE_FIELDS).first()
+    if old_row:
+        employee_id, single_date, *counter_source = old_row
+        instance._old_attendance = (employee_id, single_date, attendance_counters(*counter_source))
+
+@receiver(post_save, sender=TimeSheet)
+def update_attendance_counters(sender, instance, **kwargs):
+    zero_counters = empty_counters()
+    old_attendance = getattr(instance, '_old_attendance', None)
+    new_counters = timesheet_attendance_counters(instance)
+    if old_attendance:
+        employee_id, single_date, old_counters = old_attendance
+        if (employee_id, single_date) != (instance.employee_id, instance.date):
+            # Đổi nhân viên/ngày: trừ ở tháng cũ, cộng ở tháng mới
+            apply_attendance_delta(employee_id, single_date, old_counters, zero_counters)
+            old_counters = zero_counters
+    else:
+        old_counters = zero_counters
+    apply_attendance_delta(instance.employee_id, instance.date, old_counters, new_counters)
+
+@receiver(post_delete, sender=TimeSheet)
+def remove_attendance_counters(sender, instance, **kwargs):
+    # Không tạo lại bộ đếm khi xóa (vd. xóa nhân viên kéo theo xóa TimeSheet và MonthlyAttendance)
+    apply_attendance_delta(
+        instance.employee_id,
+        instance.date,
+        timesheet_attendance_counters(instance),
+        empty_counters(),
+        rebuild_missing=False
+    )
+
+@receiver(pre_save, sender=LeaveRequest)
+def remember_old_leave_counters(sender, instance, **kwargs):
+    instance._old_leave = None
+    if not instance.pk:
+        return
+    old_row = LeaveRequest.objects.select_for_update().filter(pk=instance.pk).values_list(*LEAVE_SOURCE_FIELDS).first()
+    if old_row:
+        employee_id, *leave_source = old_row
+        instance._old_leave = (employee_id, leave_request_counters(*leave_source))
+
+@receiver(post_save, sender=LeaveRequest)
+def update_leave_counters(sender, instance, **kwargs):
+    new_counters = leave_request_counters(instance.from_date, instance.to_date, instance.status)
+    old_leave = getattr(instance, '_old_leave', None)
+    old_counters = {}
+    if old_leave:
+        employee_id, old_counters = old_leave
+        if employee_id != instance.employee_id:
+            apply_leave_delta(employee_id, old_counters, {})
+            old_counters = {}
+    apply_leave_delta(instance.employee_id, old_counters, new_counters)
+
+@receiver(post_delete, sender=LeaveRequest)
+def remove_leave_counters(sender, instance, **kwargs):
+    apply_leave_delta(
+        instance.employee_id,
+        leave_request_counters(instance.from_date, instance.to_date, instance.status),
+        {},
+        rebuild_missing=False
+    )
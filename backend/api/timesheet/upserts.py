@@ -0,0 +1,381 @@
+from decimal import Decimal
+from django.db import connection, transaction, models
+from django.utils import timezone
+from ..submodels.models_timesheet import TimeSheet, OvertimeRequest, MonthlyAttendance
+from ..salary.payroll import record_timesheet_changes
+from .counters import empty_counters, attendance_counters, timesheet_attendance_counters, apply_attendance_delta
+from ..shifts import get_shift_by_id, get_timesheet_minutes, time_to_seconds, get_break_overlap_bounds
+
+
+TIMESHEET_TABLE = TimeSheet._meta.db_table
+OVERTIME_REQUEST_TABLE = OvertimeRequest._meta.db_table
+MONTHLY_ATTENDANCE_TABLE = MonthlyAttendance._meta.db_table
+RETURNING_FIELDS = [
+    'id',
+    'employee_id',
+    'date',
+    'shift_id',
+    'check_in_time',
+    'check_out_time',
+    'status',
+    'is_overtime',
+    'overtime_hours',
+    'worked_minutes',
+    'late_minutes',
+    'early_minutes',
+    'note',
+]
+RETURNING_SQL = ', '.join(RETURNING_FIELDS)
+# Số dòng mỗi câu INSERT nhiều dòng, giữ số tham số dưới giới hạn của SQLite/PostgreSQL
+UPSERT_CHUNK_SIZE = 1000
+# Số giây từ 00:00 tới check_in_time (kể cả phần lẻ của giây)
+CHECK_IN_SECONDS_SQL = {
+    'postgresql': "EXTRACT(EPOCH FROM (check_in_time - TIME '00:00'))",
+    'sqlite': "((julianday('2000-01-01 ' || check_in_time) - julianday('2000-01-01')) * 86400)",
+}
+
+
+def adapt_date(value):
+    return connection.ops.adapt_datefield_value(value)
+
+def adapt_time(value):
+    return connection.ops.adapt_timefield_value(value)
+
+def adapt_datetime(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+def rounded_seconds_sql(seconds_sql, divisor):
+    # seconds_sql / divisor làm tròn 2 chữ số, giống seconds_to_minutes
+    return f"ROUND(CAST(({seconds_sql}) / {divisor} AS NUMERIC), 2)"
+
+def timesheet_from_row(row, shift=None):
+    # Chuyển giá trị trả về từ RETURNING (tùy backend có thể là chuỗi/float) thành TimeSheet
+    values = {}
+    for field_name, value in zip(RETURNING_FIELDS, row):
+        field = TimeSheet._meta.get_field(field_name)
+        value = field.to_python(value)
+        if isinstance(field, models.DecimalField) and value is not None:
+            value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+        values[field_name] = value
+    timesheet = TimeSheet(**values)
+    timesheet._state.adding = False
+    if shift is not None:
+        timesheet.shift = shift
+    return timesheet
+
+def fetch_returning(sql, params, shift=None):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return timesheet_from_row(row, shift)
+
+def record_timesheet_write(timesheet, old_counters=None):
+    # Ghi thẳng bằng SQL nên không có post_save: tạo bảng lương tháng, đánh dấu tính lại lương, cập nhật bộ đếm
+    record_timesheet_changes({(timesheet.employee_id, timesheet.date)})
+    apply_attendance_delta(
+        timesheet.employee_id,
+        timesheet.date,
+        old_counters or empty_counters(),
+        timesheet_attendance_counters(timesheet)
+    )
+
+def upsert_check_in(employee_id, shift, check_in_date, check_in_time, check_in_status):
+    """
+    Insert the shift's TimeSheet row, or fill in a pre-created row that has
+    no check-in yet, in one statement. Returns None when the employee has
+    already checked in for this shift.
+    """
+    current = adapt_datetime(timezone.now())
+    sql = f"""
+        INSERT INTO {TIMESHEET_TABLE}
+            (employee_id, date, shift_id, check_in_time, status, is_overtime, overtime_hours,
+             worked_minutes, late_minutes, early_minutes, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (employee_id, date, shift_id) WHERE shift_id IS NOT NULL
+        DO UPDATE SET
+            check_in_time = EXCLUDED.check_in_time,
+            status = EXCLUDED.status,
+            late_minutes = EXCLUDED.late_minutes,
+            updated_at = EXCLUDED.updated_at
+        WHERE {TIMESHEET_TABLE}.check_in_time IS NULL
+        RETURNING {RETURNING_SQL}
+    """
+    params = [
+        employee_id,
+        adapt_date(check_in_date),
+        shift.id,
+        adapt_time(check_in_time),
+        check_in_status,
+        False,
+        '0.00',
+        '0.00',
+        str(get_timesheet_minutes(shift, check_in_time, None)['late_minutes']),
+        '0.00',
+        current,
+        current,
+    ]
+    with transaction.atomic():
+        timesheet = fetch_returning(sql, params, shift)
+        if timesheet:
+            # Bản ghi cũ (nếu có) chưa check-in nên chưa đóng góp gì vào bộ đếm
+            record_timesheet_write(timesheet)
+    return timesheet
+
+def update_check_out(employee_id, shift, check_out_date, check_out_time, check_out_status):
+    """
+    Set check-out in one UPDATE ... RETURNING, guarded by the same rules as
+    before: checked in, not checked out yet, and fewer than two early
+    leaves this month (read from MonthlyAttendance). Returns (timesheet,
+    early_leave_count), or None when a rule blocks the check-out.
+    """
+    current = adapt_datetime(timezone.now())
+    # Giờ làm = check-out - check-in - phần giờ nghỉ nằm trong khoảng đó (xem get_worked_seconds)
+    check_in_seconds_sql = CHECK_IN_SECONDS_SQL[connection.vendor]
+    check_out_seconds = time_to_seconds(check_out_time)
+    break_start, overlap_end = get_break_overlap_bounds(shift, check_out_seconds)
+    worked_seconds_sql = f"""
+        %s - {check_in_seconds_sql} - CASE
+            WHEN {check_in_seconds_sql} >= %s THEN 0
+            WHEN {check_in_seconds_sql} <= %s THEN %s
+            ELSE %s - {check_in_seconds_sql}
+        END
+    """
+    worked_seconds_params = [check_out_seconds, overlap_end, break_start, max(0, overlap_end - break_start), overlap_end]
+    early_minutes = get_timesheet_minutes(shift, None, check_out_time)['early_minutes']
+    early_leave_count_sql = f"""
+        COALESCE((
+            SELECT early_leave_count FROM {MONTHLY_ATTENDANCE_TABLE}
+            WHERE employee_id = %s AND month = %s AND year = %s
+        ), 0)
+    """
+    sql = f"""
+        UPDATE {TIMESHEET_TABLE}
+        SET
+            check_out_time = %s,
+            status = CASE WHEN status = %s THEN status ELSE %s END,
+            worked_minutes = {rounded_seconds_sql(worked_seconds_sql, 60)},
+            early_minutes = %s,
+            updated_at = %s
+        WHERE employee_id = %s
+            AND date = %s
+            AND shift_id = %s
+            AND check_in_time IS NOT NULL
+            AND check_out_time IS NULL
+            AND {early_leave_count_sql} < 2
+        RETURNING {RETURNING_SQL}, {early_leave_count_sql}
+    """
+    early_leave_params = [employee_id, check_out_date.month, check_out_date.year]
+    params = [
+        adapt_time(check_out_time),
+        TimeSheet.Status.LATE,
+        check_out_status,
+        *worked_seconds_params,
+        str(early_minutes),
+        current,
+        employee_id,
+        adapt_date(check_out_date),
+        shift.id,
+        *early_leave_params,
+        *early_leave_params,
+    ]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        timesheet = timesheet_from_row(row[:-1], shift)
+        # Trước khi check-out bản ghi là LATE (giữ nguyên) hoặc INCOMPLETE
+        old_status = TimeSheet.Status.LATE if timesheet.status == TimeSheet.Status.LATE else TimeSheet.Status.INCOMPLETE
+        record_timesheet_write(
+            timesheet,
+            attendance_counters(timesheet.shift_id, old_status, 0, timesheet.overtime_hours)
+        )
+    return timesheet, row[-1]
+
+def upsert_overtime_check_in(employee_id, check_in_date, check_in_time):
+    """
+    Create (or fill in) the overtime row only if an approved OvertimeRequest
+    exists for the day, in one statement. Returns None when there is no
+    approved request or the employee already checked in.
+    """
+    current = adapt_datetime(timezone.now())
+    sql = f"""
+        INSERT INTO {TIMESHEET_TABLE}
+            (employee_id, date, shift_id, check_in_time, status, is_overtime, overtime_hours,
+             worked_minutes, late_minutes, early_minutes, created_at, updated_at)
+        SELECT %s, %s, NULL, %s, %s, %s, %s, %s, %s, %s, %s, %s
+        WHERE EXISTS (
+            SELECT 1 FROM {OVERTIME_REQUEST_TABLE}
+            WHERE employee_id = %s AND date = %s AND status = %s
+        )
+        ON CONFLICT (employee_id, date) WHERE is_overtime
+        DO UPDATE SET
+            check_in_time = EXCLUDED.check_in_time,
+            status = EXCLUDED.status,
+            updated_at = EXCLUDED.updated_at
+        WHERE {TIMESHEET_TABLE}.check_in_time IS NULL
+        RETURNING {RETURNING_SQL}
+    """
+    params = [
+        employee_id,
+        adapt_date(check_in_date),
+        adapt_time(check_in_time),
+        TimeSheet.Status.INCOMPLETE,
+        True,
+        '0.00',
+        '0.00',
+        '0.00',
+        '0.00',
+        current,
+        current,
+        employee_id,
+        adapt_date(check_in_date),
+        OvertimeRequest.Status.APPROVED,
+    ]
+    with transaction.atomic():
+        timesheet = fetch_returning(sql, params)
+        if timesheet:
+            record_timesheet_write(timesheet)
+    return timesheet
+
+def update_overtime_check_out(employee_id, check_out_date, check_out_time):
+    # Số giờ tăng ca tính ngay trong câu UPDATE từ check_in_time đã lưu
+    overtime_seconds_sql = f"%s - {CHECK_IN_SECONDS_SQL[connection.vendor]}"
+    check_out_seconds = time_to_seconds(check_out_time)
+    current = adapt_datetime(timezone.now())
+    sql = f"""
+        UPDATE {TIMESHEET_TABLE}
+        SET
+            check_out_time = %s,
+            overtime_hours = {rounded_seconds_sql(overtime_seconds_sql, 3600)},
+            worked_minutes = {rounded_seconds_sql(overtime_seconds_sql, 60)},
+            status = %s,
+            updated_at = %s
+        WHERE employee_id = %s
+            AND date = %s
+            AND is_overtime
+            AND check_in_time IS NOT NULL
+            AND check_out_time IS NULL
+        RETURNING {RETURNING_SQL}
+    """
+    params = [
+        adapt_time(check_out_time),
+        check_out_seconds,
+        check_out_seconds,
+        TimeSheet.Status.PRESENT,
+        current,
+        employee_id,
+        adapt_date(check_out_date),
+    ]
+    with transaction.atomic():
+        timesheet = fetch_returning(sql, params)
+        if timesheet:
+            # Trước khi check-out: INCOMPLETE, chưa có giờ tăng ca
+            record_timesheet_write(
+                timesheet,
+                attendance_counters(None, TimeSheet.Status.INCOMPLETE, 0, 0)
+            )
+    return timesheet
+
+def upsert_timesheet_rows(rows, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    Multi-row upsert of shift TimeSheet rows given as (employee_id, date,
+    shift_id, check_in_time, check_out_time, status); worked, late and early
+    minutes are computed here. Existing rows of the same (employee, date,
+    shift) are overwritten. Side effects (record_timesheet_changes) are left
+    to the caller.
+    """
+    current = adapt_datetime(timezone.now())
+    upserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            sql = f"""
+                INSERT INTO {TIMESHEET_TABLE}
+                    (employee_id, date, shift_id, check_in_time, check_out_time, status, is_overtime, overtime_hours,
+                     worked_minutes, late_minutes, early_minutes, created_at, updated_at)
+                VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))}
+                ON CONFLICT (employee_id, date, shift_id) WHERE shift_id IS NOT NULL
+                DO UPDATE SET
+                    check_in_time = EXCLUDED.check_in_time,
+                    check_out_time = EXCLUDED.check_out_time,
+                    status = EXCLUDED.status,
+                    worked_minutes = EXCLUDED.worked_minutes,
+                    late_minutes = EXCLUDED.late_minutes,
+                    early_minutes = EXCLUDED.early_minutes,
+                    updated_at = EXCLUDED.updated_at
+            """
+            params = []
+            for employee_id, single_date, shift_id, check_in_time, check_out_time, timesheet_status in chunk:
+                minutes = get_timesheet_minutes(get_shift_by_id(shift_id), check_in_time, check_out_time)
+                params.extend([
+                    employee_id,
+                    adapt_date(single_date),
+                    shift_id,
+                    adapt_time(check_in_time),
+                    adapt_time(check_out_time),
+                    timesheet_status,
+                    False,
+                    '0.00',
+                    str(minutes['worked_minutes']),
+                    str(minutes['late_minutes']),
+                    str(minutes['early_minutes']),
+                    current,
+                    current,
+                ])
+            cursor.execute(sql, params)
+            upserted += len(chunk)
+    return upserted
+
+def upsert_check_in_rows(rows, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    Multi-row upsert_check_in for rows given as (employee_id, date, shift,
+    check_in_time, status): inserts the shift row, or fills in a row that
+    has no check-in yet (e.g. ABSENT written by materialise_absences). Rows
+    already checked in are left untouched, so replaying the same check-ins
+    is harmless. Side effects are left to the caller.
+    """
+    # Một câu INSERT không được cập nhật cùng một dòng hai lần
+    unique_rows = {}
+    for row in rows:
+        unique_rows.setdefault((row[0], row[1], row[2].id), row)
+    rows = list(unique_rows.values())
+
+    current = adapt_datetime(timezone.now())
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            sql = f"""
+                INSERT INTO {TIMESHEET_TABLE}
+                    (employee_id, date, shift_id, check_in_time, status, is_overtime, overtime_hours,
+                     worked_minutes, late_minutes, early_minutes, created_at, updated_at)
+                VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))}
+                ON CONFLICT (employee_id, date, shift_id) WHERE shift_id IS NOT NULL
+                DO UPDATE SET
+                    check_in_time = EXCLUDED.check_in_time,
+                    status = EXCLUDED.status,
+                    late_minutes = EXCLUDED.late_minutes,
+                    updated_at = EXCLUDED.updated_at
+                WHERE {TIMESHEET_TABLE}.check_in_time IS NULL
+            """
+            params = []
+            for employee_id, check_in_date, shift, check_in_time, check_in_status in chunk:
+                params.extend([
+                    employee_id,
+                    adapt_date(check_in_date),
+                    shift.id,
+                    adapt_time(check_in_time),
+                    check_in_status,
+                    False,
+                    '0.00',
+                    '0.00',
+                    str(get_timesheet_minutes(shift, check_in_time, None)['late_minutes']),
+                    '0.00',
+                    current,
+                    current,
+                ])
+            cursor.execute(sql, params)
+    return len(rows)
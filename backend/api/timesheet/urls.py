@@ -45,6 +45,15 @@ get_tracking_time_employee = TrackingTimeEmployeeManagementMVS.as_view({
 manager_evaluate_employee = TrackingTimeEmployeeManagementMVS.as_view({
     'post': 'manager_evaluate_employee'
 })
+get_team_calendar = TeamCalendarMVS.as_view({
+    'get': 'get_team_calendar'
+})
+import_attendance_logs = AttendanceImportMVS.as_view({
+    'post': 'import_attendance_logs'
+})
+get_attendance_import = AttendanceImportMVS.as_view({
+    'get': 'get_attendance_import'
+})
 
 urlpatterns = [
     # Leave request
@@ -64,6 +73,9 @@ urlpatterns = [
     path('get_current_month_timesheet_employee/', get_current_month_timesheet_employee, name='get_current_month_timesheet_employee'),
     path('get_tracking_time_employee/', get_tracking_time_employee, name='get_tracking_time_employee'),
     path('manager_evaluate_employee/', manager_evaluate_employee, name='manager_evaluate_employee'),
+    path('get_team_calendar/', get_team_calendar, name='get_team_calendar'),
+    path('import_attendance_logs/', import_attendance_logs, name='import_attendance_logs'),
+    path('get_attendance_import/', get_attendance_import, name='get_attendance_import'),
 
     # Overtime request
     path('send_overtime_request/', SendOvertimeRequestView.as_view(), name='send_overtime_request'),
@@ -1,3 +1,4 @@
+import io
 from rest_framework import status, viewsets
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -11,7 +12,13 @@ from ..submodels.models_timesheet import *
 from ..submodels.models_employee import Department
 from .serializers import *
 from ..permissions import IsManager, IsEmployee
-from datetime import datetime, timedelta
+from ..shifts import get_shift, is_shift_day, get_check_in_status, get_minutes_early, get_check_out_status
+from ..authentication import get_request_employee_id, EmployeeRequestMixin
+from .journal import is_buffered_check_in, append_check_in, flush_employee_check_in
+from .attendance_import import AttendanceImportError, queue_attendance_import
+from .counters import get_early_leave_count
+from .upserts import upsert_check_in, update_check_out, upsert_overtime_check_in, update_overtime_check_out
+from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from calendar import monthrange
 
@@ -66,7 +73,7 @@ class TimeSheetPagination(PageNumberPagination):
 
 
 # ============================================= Leave request =================================================
-class SendLeaveRequestView(APIView):
+class SendLeaveRequestView(EmployeeRequestMixin, APIView):
     serializer_class = SendLeaveRequestSerializer
     permission_classes = [IsAuthenticated, IsEmployee]
 
@@ -83,7 +90,7 @@ class SendLeaveRequestView(APIView):
             print("send leave request error:", error)
             return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-class ListLeaveRequestEmployeeView(viewsets.ReadOnlyModelViewSet):
+class ListLeaveRequestEmployeeView(EmployeeRequestMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ListLeaveRequestEmployeeSerializer
     permission_classes = [IsAuthenticated, IsEmployee]
     pagination_class = ListItemPagination
@@ -95,9 +102,9 @@ class ListLeaveRequestEmployeeView(viewsets.ReadOnlyModelViewSet):
             start_of_month = current_date.replace(day=1)
             end_of_month = (start_of_month + relativedelta(months=1)) - timedelta(days=1)
 
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             queryset = LeaveRequest.objects.filter(
-                employee=employee,
+                employee_id=employee_id,
                 from_date__lte=end_of_month,
                 to_date__gte=start_of_month
             ).order_by('-created_at')
@@ -118,9 +125,9 @@ class ListLeaveRequestEmployeeView(viewsets.ReadOnlyModelViewSet):
             current_date = timezone.localtime(timezone.now()).date()
             start_of_month = current_date.replace(day=1)
             end_of_month = (start_of_month + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             leave_requests_count = LeaveRequest.objects.filter(
-                Q(employee=employee) &
+                Q(employee_id=employee_id) &
                 Q(status=LeaveRequest.Status.APPROVED) &
                 Q(from_date__lte=end_of_month) & Q(to_date__gte=start_of_month)
             ).count()
@@ -179,45 +186,46 @@ class ApproveLeaveRequestMVS(viewsets.ModelViewSet):
 
 
 # ========================================= Timesheet =============================================
-class CheckInAPIView(APIView):
+class CheckInAPIView(EmployeeRequestMixin, APIView):
     permission_classes = [IsAuthenticated, IsEmployee]
 
     def post(self, request):
         try:
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             shift_type = request.data.get('shift_type')
 
             current = timezone.localtime(timezone.now())
-            if (shift_type == 'AFTERNOON' and current.weekday() == 5) or current.weekday() == 6:
+            if not is_shift_day(shift_type, current.date()):
                 return Response({"message": "This is not the time to check in this shift."}, status=status.HTTP_400_BAD_REQUEST)
             
             current_time = current.time()
             current_date = current.date()
 
-            shift = WorkingShift.objects.get(shift_type=shift_type)
+            shift = get_shift(shift_type)
 
             if not (current_time >= shift.start_time and current_time <= shift.end_time):
                 return Response({"message": "This is not the time to check in this shift."}, status=status.HTTP_400_BAD_REQUEST)
 
-            timesheet, created = TimeSheet.objects.get_or_create(
-                employee=employee,
-                date=current_date,
-                shift=shift,
-                defaults={
-                    'check_in_time': current_time,
-                    'status': TimeSheet.Status.INCOMPLETE
-                }
-            )
-
-            if not created:
-                if timesheet.check_in_time:
+            check_in_status = get_check_in_status(shift, current_date, current_time)
+
+            if is_buffered_check_in():
+                # Ghi vào journal và trả lời ngay, flush_check_ins sẽ ghi vào TimeSheet
+                entry = append_check_in(employee_id, shift, current_date, current_time, check_in_status)
+                if not entry:
                     return Response({'message': 'You already checked in for this shift!'}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                start_time = timezone.datetime.combine(current_date, shift.start_time)
-                start_time = timezone.make_aware(start_time)
-                if current > (start_time + timedelta(minutes=15)):
-                    timesheet.status = TimeSheet.Status.LATE
-                timesheet.save()
+                timesheet = TimeSheet(
+                    employee_id=employee_id,
+                    date=current_date,
+                    shift=shift,
+                    check_in_time=current_time,
+                    status=check_in_status
+                )
+                return Response({'message': 'Check in successfully!', 'data': TimeSheetSerializer(timesheet).data})
+
+            # Một câu INSERT ... ON CONFLICT: hai request đồng thời không tạo được hai bản ghi
+            timesheet = upsert_check_in(employee_id, shift, current_date, current_time, check_in_status)
+            if not timesheet:
+                return Response({'message': 'You already checked in for this shift!'}, status=status.HTTP_400_BAD_REQUEST)
 
             return Response({'message': 'Check in successfully!', 'data': TimeSheetSerializer(timesheet).data})
         except Employee.DoesNotExist:
@@ -229,61 +237,48 @@ class CheckInAPIView(APIView):
             return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class CheckOutAPIView(APIView):
+class CheckOutAPIView(EmployeeRequestMixin, APIView):
     permission_classes = [IsAuthenticated, IsEmployee]
 
     def post(self, request):
         try:
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             shift_type = request.data.get('shift_type')
             current_time = timezone.localtime(timezone.now()).time()
             current_date = timezone.localtime(timezone.now()).date()
 
-            shift = WorkingShift.objects.get(shift_type=shift_type)
+            shift = get_shift(shift_type)
 
-            timesheet = TimeSheet.objects.filter(
-                employee=employee,
-                date=current_date,
-                shift=shift
-            ).first()
+            minutes_early = get_minutes_early(shift, current_date, current_time)
+            check_out_status = get_check_out_status(None, minutes_early)
 
-            if not timesheet:
-                return Response({'message': 'You have not check in for this shift!'}, status=status.HTTP_400_BAD_REQUEST)
+            result = None
+            if minutes_early <= 30:
+                # Một câu UPDATE ... RETURNING kiểm tra luôn check-in/check-out và số lần về sớm
+                result = update_check_out(employee_id, shift, current_date, current_time, check_out_status)
 
-            if not timesheet.check_in_time:
-                return Response({'message': 'You have not check in for this shift!'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if timesheet.check_out_time:
-                return Response({'message': 'You already checked out for this shift!'}, status=status.HTTP_400_BAD_REQUEST)
+            if not result:
+                # Không cập nhật được: đọc lại bản ghi để trả đúng thông báo lỗi
+                timesheet = TimeSheet.objects.filter(employee_id=employee_id, date=current_date, shift=shift).first()
+                if (not timesheet or not timesheet.check_in_time) and is_buffered_check_in() and minutes_early <= 30:
+                    # Check-in có thể còn nằm trong journal: chỉ ghi check-in của nhân viên này
+                    flush_employee_check_in(employee_id, shift, current_date)
+                    result = update_check_out(employee_id, shift, current_date, current_time, check_out_status)
+                    timesheet = TimeSheet.objects.filter(employee_id=employee_id, date=current_date, shift=shift).first()
 
-            shift_end_time = timezone.datetime.combine(current_date, shift.end_time)
-            check_out_time = timezone.datetime.combine(current_date, current_time)
-            minutes_early = (shift_end_time - check_out_time).total_seconds() / 60
+            if not result:
+                if not timesheet or not timesheet.check_in_time:
+                    return Response({'message': 'You have not check in for this shift!'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if minutes_early > 30:
-                return Response({"message": "You are only allowed to leave 30 minutes early."}, status=status.HTTP_400_BAD_REQUEST)
-            
-            start_of_month = current_date.replace(day=1)
-            end_of_month = (start_of_month + relativedelta(months=1)) - timedelta(days=1)
+                if timesheet.check_out_time:
+                    return Response({'message': 'You already checked out for this shift!'}, status=status.HTTP_400_BAD_REQUEST)
 
-            early_leave_count = TimeSheet.objects.filter(
-                employee=employee,
-                date__range=(start_of_month, end_of_month),
-                status=TimeSheet.Status.EARLY_LEAVE
-            ).count()
+                if minutes_early > 30:
+                    return Response({"message": "You are only allowed to leave 30 minutes early."}, status=status.HTTP_400_BAD_REQUEST)
 
-            if early_leave_count >= 2:
                 return Response({"message": "You are only allowed to leave early a maximum of 2 times a month!"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            timesheet.check_out_time = current_time
-
-            if not timesheet.status == TimeSheet.Status.LATE:
-                if minutes_early > 0:
-                    timesheet.status = TimeSheet.Status.EARLY_LEAVE
-                else:
-                    timesheet.status = TimeSheet.Status.PRESENT
 
-            timesheet.save()
+            timesheet, early_leave_count = result
             data = {}
             data['timesheet'] = TimeSheetSerializer(timesheet).data
             data['early_leave_count'] = early_leave_count
@@ -296,7 +291,7 @@ class CheckOutAPIView(APIView):
             print("check in error:", error)
             return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-class TimeSheetEmployeeMVS(viewsets.ModelViewSet):
+class TimeSheetEmployeeMVS(EmployeeRequestMixin, viewsets.ModelViewSet):
     serializer_class = ShiftDetailSerializer
     permission_classes = [IsAuthenticated, IsEmployee]
     pagination_class = TimeSheetPagination
@@ -304,75 +299,57 @@ class TimeSheetEmployeeMVS(viewsets.ModelViewSet):
     @action(methods=['GET'], detail=False, url_path='get_current_month_timesheet_employee', url_name='get_current_month_timesheet_employee')
     def get_current_month_timesheet_employee(self, request):
         try:
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             current_date = timezone.localtime(timezone.now()).date()
-            start_date = current_date.replace(day=1)
-            _, last_day = monthrange(current_date.year, current_date.month)
-            end_date = current_date.replace(day=last_day)
-
-            timesheets = TimeSheet.objects.filter(employee=employee, date__range=(start_date, end_date))
-
-            all_days = [
-                start_date + timedelta(days=n)
-                for n in range((end_date - start_date).days + 1)
-            ]
+            month = int(request.query_params.get('month', current_date.month))
+            year = int(request.query_params.get('year', current_date.year))
+            start_date = date(year, month, 1)
+            _, last_day = monthrange(year, month)
 
-            grouped_data = []
-            for single_date in all_days:
-                day_timesheets = timesheets.filter(date=single_date)
-                morning_shift = day_timesheets.filter(shift__shift_type=WorkingShift.ShiftType.MORNING).first()
-                afternoon_shift = day_timesheets.filter(shift__shift_type=WorkingShift.ShiftType.AFTERNOON).first()
-                overtime_shift = day_timesheets.filter(is_overtime=True).first()
-
-                grouped_data.append({
-                    "date": single_date,
-                    "morning_shift": self.serializer_class(morning_shift).data if morning_shift else None,
-                    "afternoon_shift": self.serializer_class(afternoon_shift).data if afternoon_shift else None,
-                    "overtime_shift": self.serializer_class(overtime_shift).data if overtime_shift else None,
-                })
+            all_days = [start_date + timedelta(days=n) for n in range(last_day)]
 
+            # Phân trang danh sách ngày trước, sau đó chỉ lấy timesheet của các ngày trong trang
             paginator = self.pagination_class()
-            paginated_data = paginator.paginate_queryset(grouped_data, request)
+            page_days = paginator.paginate_queryset(all_days, request)
+
+            timesheets = TimeSheet.objects.filter(
+                employee_id=employee_id,
+                date__range=(page_days[0], page_days[-1])
+            ).select_related('shift').order_by('id') if page_days else []
+            grouped_timesheets = group_timesheets_by_day(timesheets)
 
-            return paginator.get_paginated_response(paginated_data)
+            grouped_data = [
+                serialize_timesheet_day(single_date, grouped_timesheets.get(single_date, {}))
+                for single_date in page_days
+            ]
+            return paginator.get_paginated_response(grouped_data)
         except Employee.DoesNotExist:
             return Response({"error": "Employee not found."}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(methods=['GET'], detail=False, url_path='get_daily_timesheet_employee', url_name='get_daily_timesheet_employee')
     def get_daily_timesheet_employee(self, request):
         try:
-            employee = Employee.objects.get(user=request.user)
             current_date = timezone.localtime(timezone.now()).date()
-            timesheets = TimeSheet.objects.filter(employee=employee, date=current_date)
 
-            morning_shift = timesheets.filter(shift__shift_type=WorkingShift.ShiftType.MORNING).first()
-            afternoon_shift = timesheets.filter(shift__shift_type=WorkingShift.ShiftType.AFTERNOON).first()
-            overtime_shift = timesheets.filter(is_overtime=True).first()
-
-            start_of_month = current_date.replace(day=1)
-            end_of_month = (start_of_month + relativedelta(months=1)) - timedelta(days=1)
-
-            early_leave_count = TimeSheet.objects.filter(
-                employee=employee,
-                date__range=(start_of_month, end_of_month),
-                status=TimeSheet.Status.EARLY_LEAVE
-            ).count()
-
-            data = {
-                "date": current_date,
-                "early_leave_count": early_leave_count,
-                "morning_shift": self.serializer_class(morning_shift).data if morning_shift else None,
-                "afternoon_shift": self.serializer_class(afternoon_shift).data if afternoon_shift else None,
-                "overtime_shift": self.serializer_class(overtime_shift).data if overtime_shift else None,
-            }
+            employee_id = get_request_employee_id(request)
+            early_leave_count = get_early_leave_count(employee_id, current_date.month, current_date.year)
+            timesheets = TimeSheet.objects.filter(
+                employee_id=employee_id,
+                date=current_date
+            ).select_related('shift').order_by('id')
+            slots = group_timesheets_by_day(timesheets).get(current_date, {})
 
+            data = {"date": current_date, "early_leave_count": early_leave_count}
+            data.update(serialize_timesheet_day(current_date, slots))
             return Response(data)
         except Employee.DoesNotExist:
             return Response({"error": "Employee not found."}, status=status.HTTP_404_NOT_FOUND)
 
 
 # ============================================== Overtime request ===================================================
-class SendOvertimeRequestView(APIView):
+class SendOvertimeRequestView(EmployeeRequestMixin, APIView):
     serializer_class = SendOvertimeRequestSerializer
     permission_classes = [IsAuthenticated, IsEmployee]
 
@@ -389,7 +366,7 @@ class SendOvertimeRequestView(APIView):
             print("send overtime request error:", error)
             return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-class ListOvertimeRequestEmployeeView(viewsets.ReadOnlyModelViewSet):
+class ListOvertimeRequestEmployeeView(EmployeeRequestMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ListOvertimeRequestEmployeeSerializer
     permission_classes = [IsAuthenticated, IsEmployee]
     pagination_class = ListItemPagination
@@ -401,9 +378,9 @@ class ListOvertimeRequestEmployeeView(viewsets.ReadOnlyModelViewSet):
             start_of_month = current_date.replace(day=1)
             end_of_month = (start_of_month + relativedelta(months=1)) - timedelta(days=1)
             
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             queryset = OvertimeRequest.objects.filter(
-                employee=employee,
+                employee_id=employee_id,
                 date__range=(start_of_month, end_of_month)
             ).order_by('-created_at')
 
@@ -468,35 +445,26 @@ class ApproveOvertimeRequestMVS(viewsets.ModelViewSet):
 
 
 # ============================================ Timesheet overtime ===============================================
-class OvertimeCheckInAPIView(APIView):
+class OvertimeCheckInAPIView(EmployeeRequestMixin, APIView):
     permission_classes = [IsAuthenticated, IsEmployee]
 
     def post(self, request):
         try:
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             current_time = timezone.localtime(timezone.now()).time()
             current_date = timezone.localtime(timezone.now()).date()
 
-            overtime_request = OvertimeRequest.objects.filter(
-                employee=employee,
-                date=current_date,
-                status=OvertimeRequest.Status.APPROVED
-            ).first()
-            if not overtime_request:
-                return Response({"message": "Cannot check in with unregistered overtime."}, status=status.HTTP_400_BAD_REQUEST)
-
-            timesheet, created = TimeSheet.objects.get_or_create(
-                employee=employee,
-                date=current_date,
-                is_overtime=True
-            )
-
-            if timesheet.check_in_time:
+            # Chỉ tạo bản ghi khi có đơn tăng ca đã duyệt, trong cùng một câu INSERT
+            timesheet = upsert_overtime_check_in(employee_id, current_date, current_time)
+            if not timesheet:
+                has_overtime_request = OvertimeRequest.objects.filter(
+                    employee_id=employee_id,
+                    date=current_date,
+                    status=OvertimeRequest.Status.APPROVED
+                ).exists()
+                if not has_overtime_request:
+                    return Response({"message": "Cannot check in with unregistered overtime."}, status=status.HTTP_400_BAD_REQUEST)
                 return Response({'message': 'You already checked in for overtime!'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            timesheet.check_in_time = current_time
-            timesheet.status = TimeSheet.Status.INCOMPLETE
-            timesheet.save()
 
             return Response({'message': 'Check in overtime successfully!', 'data': TimeSheetSerializer(timesheet).data})
         except Employee.DoesNotExist:
@@ -506,37 +474,28 @@ class OvertimeCheckInAPIView(APIView):
             return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class OvertimeCheckOutAPIView(APIView):
+class OvertimeCheckOutAPIView(EmployeeRequestMixin, APIView):
     permission_classes = [IsAuthenticated, IsEmployee]
 
     def post(self, request):
         try:
-            employee = Employee.objects.get(user=request.user)
+            employee_id = get_request_employee_id(request)
             current_time = timezone.localtime(timezone.now()).time()
             current_date = timezone.localtime(timezone.now()).date()
 
-            timesheet = TimeSheet.objects.filter(
-                employee=employee,
-                date=current_date,
-                is_overtime=True
-            ).first()
-
+            # Số giờ tăng ca được tính trong câu UPDATE
+            timesheet = update_overtime_check_out(employee_id, current_date, current_time)
             if not timesheet:
-                return Response({'message': 'You have not checked in overtime today!'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if timesheet.check_out_time:
-                return Response({'message': 'You have checked out overtime today!'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            timesheet.check_out_time = current_time
+                timesheet = TimeSheet.objects.filter(
+                    employee_id=employee_id,
+                    date=current_date,
+                    is_overtime=True
+                ).first()
 
-            start_time = datetime.combine(current_date, timesheet.check_in_time)
-            end_time = datetime.combine(current_date, current_time)
-            delta = end_time - start_time
-            overtime_hours = delta.total_seconds() / 3600
+                if not timesheet or not timesheet.check_in_time:
+                    return Response({'message': 'You have not checked in overtime today!'}, status=status.HTTP_400_BAD_REQUEST)
 
-            timesheet.overtime_hours = round(overtime_hours, 2)
-            timesheet.status = TimeSheet.Status.PRESENT
-            timesheet.save()
+                return Response({'message': 'You have checked out overtime today!'}, status=status.HTTP_400_BAD_REQUEST)
 
             return Response({'message': 'Check out overtime successfully!', 'data': TimeSheetSerializer(timesheet).data})
         except Employee.DoesNotExist:
@@ -546,6 +505,59 @@ class OvertimeCheckOutAPIView(APIView):
             return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class TeamCalendarMVS(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated, IsManager]
+
+    @action(methods=['GET'], detail=False, url_path='get_team_calendar', url_name='get_team_calendar')
+    def get_team_calendar(self, request):
+        try:
+            department = request.query_params.get('department')
+            if not department:
+                return Response({"error": "department is required."}, status=status.HTTP_400_BAD_REQUEST)
+            current_date = timezone.localtime(timezone.now()).date()
+            month = int(request.query_params.get('month', current_date.month))
+            year = int(request.query_params.get('year', current_date.year))
+
+            return Response(build_team_calendar(department, month, year))
+        except Exception as error:
+            print("error_get_team_calendar:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+class AttendanceImportMVS(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated, IsManager]
+
+    @action(methods=['POST'], detail=False, url_path='import_attendance_logs', url_name='import_attendance_logs')
+    def import_attendance_logs(self, request):
+        try:
+            log_file = request.FILES.get('file')
+            if not log_file:
+                return Response({"error": "file is required."}, status=status.HTTP_400_BAD_REQUEST)
+            # Chỉ lưu file và xếp hàng, worker import_attendance_logs --process-queue sẽ import
+            attendance_import = queue_attendance_import(log_file, triggered_by=request.user)
+            return Response({
+                "message": "Attendance import queued.",
+                "data": AttendanceImportSerializer(attendance_import).data
+            }, status=status.HTTP_202_ACCEPTED)
+        except (AttendanceImportError, UnicodeDecodeError) as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as error:
+            print("error import attendance logs:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=False, url_path='get_attendance_import', url_name='get_attendance_import')
+    def get_attendance_import(self, request):
+        try:
+            import_id = request.query_params.get('id')
+            if not import_id:
+                return Response({"error": "id is required."}, status=status.HTTP_400_BAD_REQUEST)
+            attendance_import = AttendanceImport.objects.select_related('triggered_by').get(id=import_id)
+            return Response(AttendanceImportSerializer(attendance_import).data)
+        except AttendanceImport.DoesNotExist:
+            return Response({"error": "Attendance import not found."}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as error:
+            print("error_get_attendance_import:", error)
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
 class TrackingTimeEmployeeManagementMVS(viewsets.ModelViewSet):
     serializer_class = TrackingTimeEmployeeManagementSerializer
     permission_classes = [IsAuthenticated, IsManager]
@@ -571,12 +583,12 @@ class TrackingTimeEmployeeManagementMVS(viewsets.ModelViewSet):
                 'month': int(month) if month else current_date.month,
                 'year': int(year) if year else current_date.year
             }
+            queryset = annotate_tracking_time(queryset, context['month'], context['year'])
             page = self.paginate_queryset(queryset)
+            evaluations = page if page is not None else queryset
+            serializer = self.serializer_class(evaluations, many=True, context=context)
             if page is not None:
-                serializer = self.serializer_class(page, many=True, context=context)
                 return self.get_paginated_response(serializer.data)
-            
-            serializer = self.serializer_class(queryset, many=True, context=context)
             return Response(serializer.data)
         except Exception as error:
             return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,43 @@
+SATURDAY = 5
+SUNDAY = 6
+
+
+def count_workdays(start_date, end_date):
+    """
+    Count (weekdays, saturdays) in the inclusive range [start_date, end_date].
+    Sundays are not counted. Runs in constant time whatever the range length.
+    """
+    if not start_date or not end_date or end_date < start_date:
+        return 0, 0
+
+    total_days = (end_date - start_date).days + 1
+    full_weeks, remaining_days = divmod(total_days, 7)
+    weekdays = full_weeks * 5
+    saturdays = full_weeks
+
+    # Phần lẻ (tối đa 6 ngày) bắt đầu từ thứ của start_date
+    start_weekday = start_date.weekday()
+    for offset in range(remaining_days):
+        weekday = (start_weekday + offset) % 7
+        if weekday == SATURDAY:
+            saturdays += 1
+        elif weekday != SUNDAY:
+            weekdays += 1
+    return weekdays, saturdays
+
+def count_leave_days(start_date, end_date):
+    # Ngày thường tính 1 ngày, thứ 7 tính nửa ngày, chủ nhật không tính
+    weekdays, saturdays = count_workdays(start_date, end_date)
+    return weekdays + saturdays / 2
+
+def batch_count_leave_days(intervals, start_of_month, end_of_month):
+    """
+    Sum leave days per employee for (employee_id, from_date, to_date)
+    intervals, each clipped to [start_of_month, end_of_month].
+    """
+    leave_days = {}
+    for employee_id, from_date, to_date in intervals:
+        start_date = max(from_date, start_of_month)
+        end_date = min(to_date, end_of_month)
+        leave_days[employee_id] = leave_days.get(employee_id, 0) + count_leave_days(start_date, end_date)
+    return leave_days
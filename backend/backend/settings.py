@@ -143,7 +143,7 @@ DATABASES['default'] = dj_database_url.parse(
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
 }
 
@@ -153,6 +153,33 @@ GROUP_NAME = {
     'EMPLOYEE': 'employee_group'
 }
 
+# Payroll
+PAYROLL_RUN_TIMEOUT_MINUTES = int(os.getenv('PAYROLL_RUN_TIMEOUT_MINUTES', 60))
+# 'decimal' (default) or 'numpy' for large headcounts
+PAYROLL_ENGINE = os.getenv('PAYROLL_ENGINE', 'decimal')
+# Upper bound for worker processes of a multi-month payroll run
+PAYROLL_MAX_WORKERS = int(os.getenv('PAYROLL_MAX_WORKERS', os.cpu_count() or 1))
+# Số tháng lương còn mở (tháng hiện tại và các tháng trước chưa chốt) được tính lại khi đổi mức lương/vị trí
+PAYROLL_OPEN_MONTHS = int(os.getenv('PAYROLL_OPEN_MONTHS', 2))
+
+# Check-in: 'sync' ghi thẳng vào DB, 'buffered' ghi vào journal rồi flush hàng loạt (flush_check_ins)
+CHECK_IN_INGESTION_MODE = os.getenv('CHECK_IN_INGESTION_MODE', 'sync')
+CHECK_IN_JOURNAL_DIR = os.getenv('CHECK_IN_JOURNAL_DIR', os.path.join(BASE_DIR, 'journal'))
+CHECK_IN_FLUSH_BATCH_SIZE = int(os.getenv('CHECK_IN_FLUSH_BATCH_SIZE', 1000))
+# Số (nhân viên, ngày, ca) gom lại trước mỗi lần upsert khi nhập log máy chấm công
+ATTENDANCE_IMPORT_BATCH_SIZE = int(os.getenv('ATTENDANCE_IMPORT_BATCH_SIZE', 5000))
+
+# Cache (mặc định bộ nhớ tiến trình; đặt CACHE_BACKEND/CACHE_LOCATION, vd. Redis, để dùng chung giữa các worker)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Mỗi worker kiểm tra lại WorkingShift.updated_at sau chừng này giây, kể cả khi cache không dùng chung
+SHIFT_REGISTRY_TTL_SECONDS = int(os.getenv('SHIFT_REGISTRY_TTL_SECONDS', 30))
+SALARY_SUMMARY_CACHE_TIMEOUT = int(os.getenv('SALARY_SUMMARY_CACHE_TIMEOUT', 60 * 60))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 